@@ -0,0 +1,171 @@
+# backfill.py
+# Module: Historical Backfill
+# Description: Pages through months/years of OHLCV for several symbols and timeframes
+# into the local candle store. Bounded concurrency inside the shared request-weight
+# budget; resumable (only missing ranges are requested) with gap and throughput report.
+#
+# Usage:
+#   python backfill.py --symbols ETH/USDT LINK/USDT --timeframes 15m 1h --days 365
+#   python backfill.py --symbols ETH/USDT --timeframes 1m --since 2025-01-01 --concurrency 8
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timezone
+
+from candle_store import candle_store, timeframe_to_ms, plan_pages, PAGE_LIMIT
+from exchange_session import session_manager
+
+logger = logging.getLogger("backfill")
+
+DEFAULT_CONCURRENCY = 4
+FLUSH_EVERY_PAGES = 20     # Persist progress periodically (resume point after a crash)
+
+
+def missing_ranges(symbol: str, timeframe: str, since_ms: int, until_ms: int, store=None) -> list:
+    """
+    Ranges [(start_ms, end_ms), ...] (inclusive candle open times) not yet in the store
+    between since_ms and until_ms: before the first stored candle, internal gaps, after the last.
+    """
+    store = store or candle_store
+    tf_ms = timeframe_to_ms(timeframe)
+    since_ms = since_ms - since_ms % tf_ms
+    until_ms = until_ms - until_ms % tf_ms
+
+    first = store.first_timestamp(symbol, timeframe)
+    last = store.last_timestamp(symbol, timeframe)
+    if first is None:
+        return [(since_ms, until_ms)]
+
+    ranges = []
+    if since_ms < first:
+        ranges.append((since_ms, min(first - tf_ms, until_ms)))
+    for start, end, _ in store.gaps(symbol, timeframe):
+        if end >= since_ms and start <= until_ms:
+            ranges.append((max(start, since_ms), min(end, until_ms)))
+    # The last stored candle may have been the forming one: refetch it
+    if last <= until_ms:
+        ranges.append((max(last, since_ms), until_ms))
+    return [r for r in ranges if r[0] <= r[1]]
+
+
+async def backfill(symbols: list, timeframes: list, since_ms: int, until_ms: int = None,
+                   concurrency: int = DEFAULT_CONCURRENCY, page_limit: int = PAGE_LIMIT, store=None) -> dict:
+    """
+    Downloads every missing page for (symbols x timeframes) with at most `concurrency`
+    requests in flight. Returns a report per (symbol, timeframe) plus totals.
+    """
+    store = store or candle_store
+    session = session_manager.market_data_async()
+    until_ms = until_ms or int(time.time() * 1000)
+    semaphore = asyncio.Semaphore(concurrency)
+    weight_before = session_manager.budget.used_total
+    started = time.monotonic()
+
+    report = {'pairs': {}, 'requests': 0, 'candles': 0, 'errors': 0}
+    pages_since_flush = 0
+
+    async def _fetch(symbol, timeframe, page, entry):
+        nonlocal pages_since_flush
+        async with semaphore:
+            try:
+                rows = await session.call('fetch_ohlcv', symbol, timeframe, **page)
+            except Exception as e:
+                logger.error(f"Page failed for {symbol} ({timeframe}) since {page['since']}: {e}")
+                report['errors'] += 1
+                entry['errors'] += 1
+                return
+        report['requests'] += 1
+        rows = [r for r in rows if r[0] <= until_ms]
+        added = store.merge(symbol, timeframe, rows, save=False)
+        entry['added'] += added
+        report['candles'] += len(rows)
+        pages_since_flush += 1
+        if pages_since_flush >= FLUSH_EVERY_PAGES:
+            pages_since_flush = 0
+            store.flush()
+
+    jobs = []
+    for symbol in symbols:
+        for timeframe in timeframes:
+            ranges = missing_ranges(symbol, timeframe, since_ms, until_ms, store)
+            pages = plan_pages(ranges, timeframe, page_limit)
+            entry = {'pages': len(pages), 'added': 0, 'errors': 0}
+            report['pairs'][(symbol, timeframe)] = entry
+            logger.info(f"📥 {symbol} ({timeframe}): {len(ranges)} missing range(s), {len(pages)} page(s)")
+            jobs.extend(_fetch(symbol, timeframe, page, entry) for page in pages)
+
+    try:
+        await asyncio.gather(*jobs)
+    finally:
+        store.flush()
+        await session_manager.close_async()
+
+    for (symbol, timeframe), entry in report['pairs'].items():
+        entry['stored'] = store.count(symbol, timeframe)
+        entry['first'] = store.first_timestamp(symbol, timeframe)
+        entry['last'] = store.last_timestamp(symbol, timeframe)
+        entry['gaps'] = store.gaps(symbol, timeframe)
+
+    elapsed = time.monotonic() - started
+    report['seconds'] = round(elapsed, 2)
+    report['candles_per_sec'] = round(report['candles'] / elapsed, 1) if elapsed > 0 else 0.0
+    report['weight_used'] = session_manager.budget.used_total - weight_before
+    return report
+
+
+def _fmt_ms(ms) -> str:
+    if ms is None:
+        return "-"
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+
+def print_report(report: dict, max_gaps: int = 5):
+    print("\n=== BACKFILL REPORT ===")
+    for (symbol, timeframe), entry in report['pairs'].items():
+        print(f"{symbol} ({timeframe}): +{entry['added']} new | {entry['stored']} stored "
+              f"[{_fmt_ms(entry['first'])} -> {_fmt_ms(entry['last'])}] | "
+              f"{entry['pages']} pages | {entry['errors']} errors | {len(entry['gaps'])} gaps")
+        for start, end, missing in entry['gaps'][:max_gaps]:
+            print(f"   ⚠️ Gap: {_fmt_ms(start)} -> {_fmt_ms(end)} ({missing} candles)")
+        if len(entry['gaps']) > max_gaps:
+            print(f"   ... {len(entry['gaps']) - max_gaps} more")
+    print(f"Requests: {report['requests']} | Candles: {report['candles']} | Errors: {report['errors']} | "
+          f"Weight: {report['weight_used']} | {report['seconds']}s ({report['candles_per_sec']} candles/s)")
+
+
+def _parse_date(value: str) -> int:
+    return int(datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill historical OHLCV into the local candle store")
+    parser.add_argument('--symbols', nargs='+', default=['ETH/USDT'])
+    parser.add_argument('--timeframes', nargs='+', default=['15m'])
+    parser.add_argument('--days', type=float, default=90.0, help="History depth (ignored if --since is set)")
+    parser.add_argument('--since', help="Start date YYYY-MM-DD (UTC)")
+    parser.add_argument('--until', help="End date YYYY-MM-DD (UTC, default: now)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--page-limit', type=int, default=PAGE_LIMIT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    until_ms = _parse_date(args.until) if args.until else int(time.time() * 1000)
+    since_ms = _parse_date(args.since) if args.since else until_ms - int(args.days * 86_400_000)
+
+    try:
+        report = asyncio.run(backfill(args.symbols, args.timeframes, since_ms, until_ms,
+                                      concurrency=args.concurrency, page_limit=args.page_limit))
+    except KeyboardInterrupt:
+        print("Interrupted. Progress is saved: run the same command again to resume.")
+        return 1
+
+    print_report(report)
+    return 0 if report['errors'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
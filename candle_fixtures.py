@@ -0,0 +1,30 @@
+# candle_fixtures.py
+# Module: Candle Fixtures
+# Description: Synthetic OHLCV frames shared by the test suite.
+# One seeded random walk, shaped per test through keyword arguments.
+
+import numpy as np
+import pandas as pd
+
+
+def make_frame(n=None, seed=0, base=100.0, step=1.0, wick=1.0, min_volume=10.0,
+               freq='15min', start='2026-01-01', flat_open=False, decimals=None, close=None):
+    """
+    Seeded random-walk candles: open is the previous close (or the close itself with flat_open),
+    high/low add up to 'wick' beyond the body, volume is uniform in [min_volume, min_volume + 100).
+    'decimals' rounds prices to coarse ticks (equal highs/lows); 'close' replaces the walk.
+    """
+    rng = np.random.default_rng(seed)
+    if close is None:
+        close = base + np.cumsum(rng.normal(0, step, n))
+    n = len(close)
+    open_ = close.copy() if flat_open else np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + rng.random(n) * wick
+    low = np.minimum(open_, close) - rng.random(n) * wick
+    if decimals is not None:
+        open_, high, low, close = (a.round(decimals) for a in (open_, high, low, close))
+    return pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=n, freq=freq),
+        'open': open_, 'high': high, 'low': low, 'close': close,
+        'volume': rng.random(n) * 100 + min_volume
+    })
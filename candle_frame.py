@@ -0,0 +1,233 @@
+# candle_frame.py
+# Module: Candle Frame
+# Description: Lightweight array-backed candle container for the hot path.
+# Contiguous NumPy columns with named access, zero-copy tail windows and cheap
+# conversion to/from DataFrame. The analysis functions in trading_tools, order_flow
+# and market_profile accept either a CandleFrame or a DataFrame.
+#
+# Usage (memory / latency benchmark on synthetic candles):
+#   python candle_frame.py --candles 100
+
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from candle_store import candle_store, COLUMNS
+
+
+def _to_ms(ts) -> int:
+    """pd.Timestamp / datetime / str / int(ms) -> epoch milliseconds."""
+    if isinstance(ts, (int, np.integer)):
+        return int(ts)
+    return int(pd.Timestamp(ts).value // 1_000_000)
+
+
+class CandleFrame:
+    """
+    Columns: 'timestamp' (int64 epoch ms) plus float columns (float64 by default,
+    float32 to halve memory). Slicing methods return views, never copies.
+    """
+
+    __slots__ = ('_cols', '_n')
+
+    def __init__(self, columns: dict, dtype=np.float64):
+        cols = {}
+        n = None
+        for name, values in columns.items():
+            if name == 'timestamp':
+                arr = np.asarray(values, dtype=np.int64)
+            else:
+                arr = np.asarray(values, dtype=dtype)
+            if n is None:
+                n = len(arr)
+            elif len(arr) != n:
+                raise ValueError(f"Column '{name}' has {len(arr)} rows, expected {n}")
+            cols[name] = arr
+        self._cols = cols
+        self._n = n or 0
+
+    # --- Construction / conversion ---
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, dtype=np.float64) -> 'CandleFrame':
+        columns = {}
+        for name in df.columns:
+            if name == 'timestamp':
+                columns[name] = pd.to_datetime(df[name]).to_numpy().astype('datetime64[ms]').astype(np.int64)
+            elif pd.api.types.is_numeric_dtype(df[name]):
+                columns[name] = df[name].to_numpy(dtype=dtype)
+        return cls(columns, dtype)
+
+    @classmethod
+    def from_store(cls, symbol: str, timeframe: str, limit: int = None, store=None) -> 'CandleFrame':
+        """Zero-copy view over the newest `limit` candles of the store (do not mutate)."""
+        cols = (store or candle_store).load(symbol, timeframe)
+        start = max(len(cols['timestamp']) - limit, 0) if limit else 0
+        return cls({name: cols[name][start:] for name in COLUMNS})
+
+    def to_dataframe(self) -> pd.DataFrame:
+        data = {}
+        for name, values in self._cols.items():
+            data[name] = pd.to_datetime(values, unit='ms') if name == 'timestamp' else values
+        return pd.DataFrame(data)
+
+    # --- Access ---
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._cols[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._cols
+
+    @property
+    def columns(self) -> list:
+        return list(self._cols)
+
+    @property
+    def empty(self) -> bool:
+        return self._n == 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self._cols.values())
+
+    def get(self, name: str, default=None):
+        return self._cols.get(name, default)
+
+    def last(self, name: str, default=None):
+        """Value of `name` on the newest candle (default if missing or empty)."""
+        values = self._cols.get(name)
+        if values is None or self._n == 0:
+            return default
+        return values[-1].item()
+
+    def row(self, i: int = -1) -> dict:
+        """One candle as a dict (supports row['close'] and row.get())."""
+        return {name: values[i].item() for name, values in self._cols.items()}
+
+    def timestamp_at(self, i: int = -1) -> pd.Timestamp:
+        return pd.Timestamp(int(self._cols['timestamp'][i]), unit='ms')
+
+    # --- Zero-copy windows ---
+
+    def slice(self, start: int = None, stop: int = None) -> 'CandleFrame':
+        frame = CandleFrame.__new__(CandleFrame)
+        frame._cols = {name: values[start:stop] for name, values in self._cols.items()}
+        frame._n = len(next(iter(frame._cols.values()))) if frame._cols else 0
+        return frame
+
+    def tail(self, n: int) -> 'CandleFrame':
+        return self.slice(max(self._n - n, 0), None)
+
+    def since(self, ts) -> 'CandleFrame':
+        """Candles opened at or after `ts` (sorted timestamps -> binary search). NaT -> empty."""
+        if pd.isna(ts):
+            return self.slice(self._n, None)
+        start = int(np.searchsorted(self._cols['timestamp'], _to_ms(ts), side='left'))
+        return self.slice(start, None)
+
+    def until(self, ts) -> 'CandleFrame':
+        """Candles opened at or before `ts`. NaT -> empty."""
+        if pd.isna(ts):
+            return self.slice(0, 0)
+        stop = int(np.searchsorted(self._cols['timestamp'], _to_ms(ts), side='right'))
+        return self.slice(0, stop)
+
+    def with_columns(self, **columns) -> 'CandleFrame':
+        """New frame sharing the existing arrays plus extra columns."""
+        frame = CandleFrame.__new__(CandleFrame)
+        frame._cols = dict(self._cols)
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if len(values) != self._n:
+                raise ValueError(f"Column '{name}' has {len(values)} rows, expected {self._n}")
+            frame._cols[name] = values
+        frame._n = self._n
+        return frame
+
+
+# =============================================================================
+# HELPERS (DataFrame or CandleFrame)
+# =============================================================================
+
+def col(data, name: str) -> np.ndarray:
+    """Column as a float64 ndarray (no copy for CandleFrame float64 columns)."""
+    return np.asarray(data[name], dtype=np.float64)
+
+
+def row_at(data, i: int = -1):
+    """Row `i` of a DataFrame (Series) or CandleFrame (dict)."""
+    if isinstance(data, CandleFrame):
+        return data.row(i)
+    return data.iloc[i]
+
+
+def _timeit(func, repeat: int) -> float:
+    """Mean wall time of func() in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CandleFrame vs DataFrame on the hot path")
+    parser.add_argument('--candles', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    import tempfile
+    import logging
+    import order_flow as flow
+    import market_profile as mp
+    import trading_tools as tools
+    from candle_store import CandleStore
+    logging.disable(logging.CRITICAL)
+
+    rng = np.random.default_rng(0)
+    n = args.candles
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    ohlcv = np.column_stack([
+        np.arange(n, dtype=np.int64) * 900_000 + 1_767_225_600_000,
+        close, close + rng.random(n), close - rng.random(n), close, rng.random(n) * 100
+    ]).tolist()
+    store = CandleStore(root=tempfile.mkdtemp())
+    store.merge('BENCH/USDT', '15m', ohlcv, save=False)
+
+    df = store.window('BENCH/USDT', '15m', n)
+    frame = CandleFrame.from_store('BENCH/USDT', '15m', n, store=store)
+    frame32 = CandleFrame.from_dataframe(df, dtype=np.float32)
+    entry = df['timestamp'].iloc[n // 2]
+
+    print(f"{n} candles")
+    print(f"Memory: DataFrame {df.memory_usage(deep=True).sum():,} B | "
+          f"CandleFrame f64 {frame.nbytes:,} B | f32 {frame32.nbytes:,} B")
+
+    rows = [
+        ("window / from_store",
+         lambda: store.window('BENCH/USDT', '15m', n),
+         lambda: CandleFrame.from_store('BENCH/USDT', '15m', n, store=store)),
+        ("micro-tick access",
+         lambda: (df.iloc[-1]['close'], df[df['timestamp'] >= entry]['high'].max()),
+         lambda: (frame.last('close'), frame.since(entry)['high'].max())),
+        ("calculate_vpin_pro", lambda: flow.calculate_vpin_pro(df), lambda: flow.calculate_vpin_pro(frame)),
+        ("calculate_volume_profile", lambda: mp.calculate_volume_profile(df),
+         lambda: mp.calculate_volume_profile(frame)),
+        ("calculate_smart_money", lambda: tools.calculate_smart_money(df),
+         lambda: tools.calculate_smart_money(frame)),
+        ("calculate_hurst", lambda: tools.calculate_hurst(df), lambda: tools.calculate_hurst(frame)),
+    ]
+    for label, with_df, with_frame in rows:
+        t_df = _timeit(with_df, args.repeat)
+        t_frame = _timeit(with_frame, args.repeat)
+        print(f"{label:<26} DataFrame {t_df:8.1f} us | CandleFrame {t_frame:8.1f} us ({t_df / t_frame:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# candle_patterns.py
+# Module: Candle Pattern Engine
+# Description: Vectorized price-action pattern kernel. scan() emits one boolean event
+# column per pattern over a whole candle array (engulfing, hammer, shooting star, doji,
+# morning/evening star, inside bar). The live prompt (describe) and the historical
+# outcome backtest (pattern_stats) both run this same kernel.
+#
+# Usage (pattern frequency and forward returns over the local candle store):
+#   python candle_patterns.py --symbol ETH/USDT --timeframe 15m --horizons 1 4 16
+
+import sys
+import argparse
+import numpy as np
+
+from candle_frame import CandleFrame, col
+from candle_store import candle_store
+from resample import BASE_TIMEFRAME, resample_columns
+
+# Pattern -> (expected direction, prompt label). Order is the prompt order.
+PATTERNS = {
+    'bullish_engulfing': (1, "🔥 BULLISH ENGULFING (Strong Reversal)"),
+    'bearish_engulfing': (-1, "🩸 BEARISH ENGULFING (Strong Reversal)"),
+    'hammer': (1, "🔨 HAMMER / PINBAR (Bullish Rejection)"),
+    'shooting_star': (-1, "☄️ SHOOTING STAR (Bearish Rejection)"),
+    'doji': (0, "✨ DOJI (Indecision)"),
+    'morning_star': (1, "🌅 MORNING STAR (Bullish Reversal)"),
+    'evening_star': (-1, "🌆 EVENING STAR (Bearish Reversal)"),
+    'inside_bar': (0, "📦 INSIDE BAR (Compression)"),
+}
+
+STAR_BODY_RATIO = 0.3   # Star candle body <= 30% of the first candle's body
+DOJI_BODY_RATIO = 0.1   # Doji body <= 10% of its range
+MAX_LOOKBACK = 3        # Candles a pattern can span (live scans only need the tail)
+
+
+def _shift(values: np.ndarray, k: int, fill) -> np.ndarray:
+    """values[i - k] aligned at i (first k slots = fill)."""
+    out = np.empty_like(values, dtype=np.result_type(values, type(fill)))
+    out[:k] = fill
+    out[k:] = values[:len(values) - k]
+    return out
+
+
+def scan(data) -> dict:
+    """
+    Boolean event column per pattern over every candle of `data` (DataFrame,
+    CandleFrame or dict of arrays). Row i flags a pattern completed by candle i.
+    """
+    o, h, l, c = (col(data, name) for name in ('open', 'high', 'low', 'close'))
+    body = np.abs(c - o)
+    rng = h - l
+    green, red = c > o, c < o
+    lower_wick = np.minimum(o, c) - l
+    upper_wick = h - np.maximum(o, c)
+
+    o1, c1, h1, l1 = _shift(o, 1, np.nan), _shift(c, 1, np.nan), _shift(h, 1, np.nan), _shift(l, 1, np.nan)
+    green1, red1 = _shift(green, 1, False), _shift(red, 1, False)
+    body1 = _shift(body, 1, np.nan)
+    o2, c2, body2 = _shift(o, 2, np.nan), _shift(c, 2, np.nan), _shift(body, 2, np.nan)
+    green2, red2 = _shift(green, 2, False), _shift(red, 2, False)
+
+    with np.errstate(invalid='ignore'):
+        small_star = body1 <= body2 * STAR_BODY_RATIO
+        return {
+            'bullish_engulfing': red1 & green & (c > o1) & (o < c1),
+            'bearish_engulfing': green1 & red & (c < o1) & (o > c1),
+            'hammer': (lower_wick > body * 2) & (upper_wick < body * 0.5),
+            'shooting_star': (upper_wick > body * 2) & (lower_wick < body * 0.5),
+            'doji': (rng > 0) & (body <= rng * DOJI_BODY_RATIO),
+            'morning_star': red2 & small_star & green & (c > (o2 + c2) / 2),
+            'evening_star': green2 & small_star & red & (c < (o2 + c2) / 2),
+            'inside_bar': (h < h1) & (l > l1),
+        }
+
+
+def signal(events: dict) -> np.ndarray:
+    """Net directional vote per candle (int8): bullish patterns +1, bearish -1."""
+    n = len(next(iter(events.values()))) if events else 0
+    net = np.zeros(n, dtype=np.int8)
+    for name, flags in events.items():
+        direction = PATTERNS[name][0]
+        if direction:
+            net += flags.astype(np.int8) * direction
+    return net
+
+
+def describe(data) -> str:
+    """Prompt string for the last candle. Scans only the last MAX_LOOKBACK candles."""
+    if len(data) == 0:
+        return "No Data"
+    tail = {name: col(data, name)[-MAX_LOOKBACK:] for name in ('open', 'high', 'low', 'close')}
+    events = scan(tail)
+    labels = [PATTERNS[name][1] for name, flags in events.items() if flags[-1]]
+    return "\n".join(labels) if labels else "No clear patterns."
+
+
+def pattern_stats(data, horizons=(1, 4, 16)) -> dict:
+    """
+    Historical outcome per pattern: count, frequency and, per horizon h, the mean
+    forward return close[i+h]/close[i]-1 and the hit rate (share of events moving in
+    the pattern's direction; for neutral patterns, share with |return| above median).
+    """
+    close = col(data, 'close')
+    n = len(close)
+    events = scan(data)
+    stats = {}
+    for name, flags in events.items():
+        direction = PATTERNS[name][0]
+        idx = np.flatnonzero(flags)
+        row = {'count': int(len(idx)), 'frequency': len(idx) / n if n else 0.0}
+        for h in horizons:
+            valid = idx[idx + h < n]
+            fwd = close[valid + h] / close[valid] - 1 if len(valid) else np.empty(0)
+            if direction:
+                hits = np.sign(fwd) == direction
+            else:
+                all_moves = np.abs(close[h:] / close[:-h] - 1) if n > h else np.empty(0)
+                hits = np.abs(fwd) > (np.median(all_moves) if len(all_moves) else 0)
+            row[f'ret_{h}'] = float(fwd.mean()) if len(fwd) else np.nan
+            row[f'hit_{h}'] = float(hits.mean()) if len(fwd) else np.nan
+        stats[name] = row
+    return stats
+
+
+def load_history(symbol: str, timeframe: str, store=None) -> CandleFrame:
+    """Full stored history of (symbol, timeframe), resampled from the base timeframe if needed."""
+    store = store or candle_store
+    cols = store.load(symbol, timeframe)
+    if len(cols['timestamp']) == 0 and timeframe != BASE_TIMEFRAME:
+        cols = resample_columns(store.load(symbol, BASE_TIMEFRAME), timeframe)
+    return CandleFrame(cols)
+
+
+def print_stats(stats: dict, horizons) -> None:
+    header = f"{'PATTERN':<20}{'COUNT':>8}{'FREQ':>8}" + "".join(f"{'RET+' + str(h):>10}{'HIT+' + str(h):>8}" for h in horizons)
+    print(header)
+    print("-" * len(header))
+    for name, row in stats.items():
+        line = f"{name:<20}{row['count']:>8}{row['frequency']:>8.2%}"
+        for h in horizons:
+            line += f"{row[f'ret_{h}']:>10.3%}{row[f'hit_{h}']:>8.1%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Candle pattern frequency and forward outcomes")
+    parser.add_argument('--symbol', default='ETH/USDT')
+    parser.add_argument('--timeframe', default=BASE_TIMEFRAME)
+    parser.add_argument('--horizons', nargs='+', type=int, default=[1, 4, 16])
+    args = parser.parse_args()
+
+    frame = load_history(args.symbol, args.timeframe)
+    if frame.empty:
+        print(f"No stored candles for {args.symbol} {args.timeframe}. Run backfill.py first.")
+        return 1
+
+    print(f"{args.symbol} {args.timeframe}: {len(frame)} candles")
+    print_stats(pattern_stats(frame, args.horizons), args.horizons)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+# candle_store.py
+# Module: Candle Store
+# Description: On-disk columnar OHLCV store keyed by (symbol, timeframe).
+# Lets fetch_market_data download only the candles that closed since the last pass.
+
+import os
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("candle_store")
+
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", "data/candles")
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+PRICE_COLUMNS = COLUMNS[1:]
+
+PAGE_LIMIT = 1500  # Binance Futures klines page cap
+
+TIMEFRAME_MS = {
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 60 * 60_000,
+    '2h': 2 * 60 * 60_000,
+    '4h': 4 * 60 * 60_000,
+    '6h': 6 * 60 * 60_000,
+    '8h': 8 * 60 * 60_000,
+    '12h': 12 * 60 * 60_000,
+    '1d': 24 * 60 * 60_000,
+    '3d': 3 * 24 * 60 * 60_000,
+    '1w': 7 * 24 * 60 * 60_000,
+}
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """Duration of one candle in milliseconds (Binance timeframe notation)."""
+    if timeframe not in TIMEFRAME_MS:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return TIMEFRAME_MS[timeframe]
+
+
+def plan_pages(ranges: list, timeframe: str, page_limit: int = PAGE_LIMIT) -> list:
+    """Splits ranges into fetch_ohlcv pages: [{'since': ms, 'limit': n}, ...]."""
+    tf_ms = timeframe_to_ms(timeframe)
+    pages = []
+    for start, end in ranges:
+        total = (end - start) // tf_ms + 1
+        for offset in range(0, total, page_limit):
+            pages.append({'since': start + offset * tf_ms, 'limit': min(page_limit, total - offset)})
+    return pages
+
+
+def _empty_columns() -> dict:
+    cols = {'timestamp': np.empty(0, dtype=np.int64)}
+    for name in PRICE_COLUMNS:
+        cols[name] = np.empty(0, dtype=np.float64)
+    return cols
+
+
+class CandleStore:
+    """
+    Columnar candle storage: one .npz file per (symbol, timeframe) holding
+    one contiguous array per OHLCV column, sorted by timestamp (ms, UTC).
+
+    Arrays are kept in memory after the first load, so reads never touch disk.
+    The file is rewritten only when new candle timestamps arrive; updates to the
+    still-forming candle stay in memory until the next candle opens.
+    """
+
+    def __init__(self, root: str = CANDLE_STORE_DIR):
+        self.root = root
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def _path(self, symbol: str, timeframe: str) -> str:
+        safe_symbol = symbol.replace('/', '_').replace(':', '_')
+        return os.path.join(self.root, f"{safe_symbol}_{timeframe}.npz")
+
+    def load(self, symbol: str, timeframe: str) -> dict:
+        """Returns the column arrays for (symbol, timeframe). Do not mutate them."""
+        key = (symbol, timeframe)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+
+            cols = _empty_columns()
+            path = self._path(symbol, timeframe)
+            if os.path.exists(path):
+                try:
+                    with np.load(path) as data:
+                        cols = {name: data[name].copy() for name in COLUMNS}
+                except Exception as e:
+                    logger.error(f"Candle store corrupted for {symbol} ({timeframe}): {e}. Starting empty.")
+                    cols = _empty_columns()
+
+            self._cache[key] = cols
+            return cols
+
+    def count(self, symbol: str, timeframe: str) -> int:
+        return len(self.load(symbol, timeframe)['timestamp'])
+
+    def last_timestamp(self, symbol: str, timeframe: str):
+        """Open time (ms) of the newest stored candle, or None if empty."""
+        ts = self.load(symbol, timeframe)['timestamp']
+        return int(ts[-1]) if len(ts) else None
+
+    def first_timestamp(self, symbol: str, timeframe: str):
+        """Open time (ms) of the oldest stored candle, or None if empty."""
+        ts = self.load(symbol, timeframe)['timestamp']
+        return int(ts[0]) if len(ts) else None
+
+    def gaps(self, symbol: str, timeframe: str) -> list:
+        """
+        Holes inside the stored range: [(first_missing_ts, last_missing_ts, n_missing), ...].
+        """
+        ts = self.load(symbol, timeframe)['timestamp']
+        if len(ts) < 2:
+            return []
+        tf_ms = timeframe_to_ms(timeframe)
+        steps = np.diff(ts)
+        holes = np.flatnonzero(steps > tf_ms)
+        return [(int(ts[i]) + tf_ms, int(ts[i + 1]) - tf_ms, int(steps[i] // tf_ms) - 1) for i in holes]
+
+    def merge(self, symbol: str, timeframe: str, ohlcv: list, save: bool = True) -> int:
+        """
+        Merges raw CCXT OHLCV rows ([ts, o, h, l, c, v], ...) into the store.
+        Rows with an existing timestamp overwrite the stored candle (forming-candle refresh).
+        save=False keeps the result in memory only (bulk loaders call flush() themselves).
+
+        Returns: number of new candle timestamps added.
+        """
+        if ohlcv is None or len(ohlcv) == 0:
+            return 0
+
+        rows = np.asarray(ohlcv, dtype=np.float64)
+        if rows.ndim != 2 or rows.shape[1] < len(COLUMNS):
+            raise ValueError(f"Malformed OHLCV rows for {symbol} ({timeframe})")
+
+        new_ts = rows[:, 0].astype(np.int64)
+
+        with self._lock:
+            cols = self.load(symbol, timeframe)
+            old_ts = cols['timestamp']
+
+            if len(old_ts) and new_ts[0] > old_ts[-1] and np.all(np.diff(new_ts) > 0):
+                # Fast path: pure append
+                merged = {'timestamp': np.concatenate([old_ts, new_ts])}
+                for i, name in enumerate(PRICE_COLUMNS, start=1):
+                    merged[name] = np.concatenate([cols[name], rows[:, i]])
+            else:
+                # General path: stable sort, keep the LAST occurrence of each timestamp (new data wins)
+                all_ts = np.concatenate([old_ts, new_ts])
+                order = np.argsort(all_ts, kind='stable')
+                sorted_ts = all_ts[order]
+                keep = np.ones(len(sorted_ts), dtype=bool)
+                keep[:-1] = sorted_ts[1:] != sorted_ts[:-1]
+                order = order[keep]
+
+                merged = {'timestamp': all_ts[order]}
+                for i, name in enumerate(PRICE_COLUMNS, start=1):
+                    merged[name] = np.concatenate([cols[name], rows[:, i]])[order]
+
+            added = len(merged['timestamp']) - len(old_ts)
+            self._cache[(symbol, timeframe)] = merged
+
+            if added > 0 and save:
+                self._save(symbol, timeframe, merged)
+
+        return added
+
+    def flush(self, symbol: str = None, timeframe: str = None):
+        """Persists cached arrays (all keys, or one) including the forming candle."""
+        with self._lock:
+            for (sym, tf), cols in list(self._cache.items()):
+                if symbol and sym != symbol:
+                    continue
+                if timeframe and tf != timeframe:
+                    continue
+                if len(cols['timestamp']):
+                    self._save(sym, tf, cols)
+
+    def _save(self, symbol: str, timeframe: str, cols: dict):
+        path = self._path(symbol, timeframe)
+        tmp_path = path + ".tmp.npz"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            np.savez(tmp_path, **cols)
+            os.replace(tmp_path, path)  # Atomic swap: a crash never leaves a half-written store
+        except Exception as e:
+            logger.error(f"Failed to persist candles for {symbol} ({timeframe}): {e}")
+
+    def window(self, symbol: str, timeframe: str, limit: int = None) -> pd.DataFrame:
+        """
+        Returns the newest `limit` stored candles as a DataFrame with columns
+        ['timestamp', 'open', 'high', 'low', 'close', 'volume'] (timestamp as datetime).
+        """
+        cols = self.load(symbol, timeframe)
+        start = max(len(cols['timestamp']) - limit, 0) if limit else 0
+
+        data = {'timestamp': pd.to_datetime(cols['timestamp'][start:], unit='ms')}
+        for name in PRICE_COLUMNS:
+            data[name] = cols[name][start:].copy()
+        return pd.DataFrame(data, columns=COLUMNS)
+
+
+# Global Store Instance (shared by every fetch in the process)
+candle_store = CandleStore()
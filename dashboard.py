@@ -413,15 +413,36 @@ if state:
             st.error("KILL SIGNAL SENT! Closing positions...")
 
         st.markdown("---")
-        
-        # 4. LIVE LOGS (Hidden by default to avoid flickering)
+
+        # 4. MARKET STRUCTURE (BOS/CHoCH timeline persisted by the structure tracker)
+        st.subheader("🏗️ Market Structure")
+        structures = state.get("market_structure", {})
+        if structures:
+            for key, tracked in structures.items():
+                bias = tracked.get("bias", "NEUTRAL")
+                bias_emoji = "🔼" if bias == "BULLISH" else "🔽" if bias == "BEARISH" else "➡️"
+                st.markdown(f"**{key.replace('|', ' · ')}**: {bias_emoji} {bias}")
+                events = tracked.get("events", [])
+                if events:
+                    df_events = pd.DataFrame(events[::-1][:10])
+                    st.dataframe(
+                        df_events[["time", "type", "direction", "level", "close"]],
+                        width="stretch",
+                        hide_index=True
+                    )
+        else:
+            st.text("No structure tracked yet.")
+
+        st.markdown("---")
+
+        # 5. LIVE LOGS (Hidden by default to avoid flickering)
         with st.expander("📟 Live Logs", expanded=False):
             logs = tail_logs(20)
             st.code("".join(logs), language="text")
         
         st.markdown("---")
         
-        # 5. STRATEGY (Folded)
+        # 6. STRATEGY (Folded)
         with st.expander("👀 View Active Strategy"):
             strategy_content = load_strategy()
             st.text_area("Strategy Rules", strategy_content, height=300, disabled=True)
@@ -0,0 +1,276 @@
+# exchange_session.py
+# Module: Exchange Session Manager
+# Description: One pooled CCXT client per (venue, mode), cached market metadata
+# and a single request-weight budget shared by every exchange call in the process.
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import ccxt
+import ccxt.async_support as ccxt_async
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("exchange_session")
+
+# Binance USD-M Futures: 2400 request weight per minute per IP.
+# We keep a safety margin so other tools (dashboard, backfill) never push us into a 418 ban.
+WEIGHT_LIMIT_PER_MINUTE = int(os.getenv("EXCHANGE_WEIGHT_LIMIT", "2000"))
+MARKETS_TTL_SECONDS = 6 * 60 * 60  # exchangeInfo changes rarely (listings, tick sizes)
+HTTP_POOL_SIZE = 16
+
+MODES = ('paper', 'testnet', 'live')
+
+# Request weight per CCXT method (Binance Futures docs). Callables receive the call kwargs.
+ENDPOINT_WEIGHTS = {
+    'load_markets': 1,
+    'fetch_ticker': 1,
+    'fetch_tickers': 40,
+    'fetch_balance': 5,
+    'fetch_positions': 5,
+    'create_order': 1,
+    'cancel_order': 1,
+    'fetch_ohlcv': lambda kwargs: _klines_weight(kwargs.get('limit')),
+}
+
+
+def _klines_weight(limit) -> int:
+    """Binance /fapi/v1/klines weight depends on the page size."""
+    limit = limit or 500
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def mode_from_env() -> str:
+    """Maps TRADING_MODE (PAPER | TESTNET | LIVE_TESTNET | LIVE) to a session mode."""
+    raw = os.getenv("TRADING_MODE", "PAPER").upper()
+    if raw in ("TESTNET", "LIVE_TESTNET"):
+        return 'testnet'
+    if raw == "LIVE":
+        return 'live'
+    return 'paper'
+
+
+class WeightBudget:
+    """
+    Token bucket over request weight. Refills continuously at limit/60 per second.
+    acquire() blocks the calling thread until the weight is available.
+    """
+
+    def __init__(self, limit_per_minute: int = WEIGHT_LIMIT_PER_MINUTE):
+        self.capacity = float(limit_per_minute)
+        self.refill_per_sec = limit_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.used_total = 0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_sec)
+        self.updated = now
+
+    def try_acquire(self, weight: float) -> float:
+        """Takes `weight` if available. Returns 0.0 on success, else seconds to wait."""
+        with self._lock:
+            self._refill()
+            if self.tokens >= weight:
+                self.tokens -= weight
+                self.used_total += weight
+                return 0.0
+            return (weight - self.tokens) / self.refill_per_sec
+
+    def acquire(self, weight: float):
+        weight = min(weight, self.capacity)
+        while True:
+            wait = self.try_acquire(weight)
+            if wait <= 0:
+                return
+            logger.debug(f"Weight budget exhausted. Waiting {wait:.2f}s for {weight} weight")
+            time.sleep(wait)
+
+    async def acquire_async(self, weight: float):
+        """Same as acquire() but yields to the event loop while waiting."""
+        weight = min(weight, self.capacity)
+        while True:
+            wait = self.try_acquire(weight)
+            if wait <= 0:
+                return
+            logger.debug(f"Weight budget exhausted. Waiting {wait:.2f}s for {weight} weight")
+            await asyncio.sleep(wait)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+
+def _build_client(venue: str, mode: str, use_async: bool = False):
+    """
+    Creates the CCXT client for a venue/mode.
+    PAPER uses public mainnet data; TESTNET enables sandbox; keys attached when present.
+    use_async=True builds the ccxt.async_support client (aiohttp, pooled by CCXT itself).
+    """
+    api_key = os.getenv("BINANCE_API_KEY")
+    secret = os.getenv("BINANCE_SECRET")
+
+    config = {
+        'options': {'defaultType': 'future'},
+        'enableRateLimit': True
+    }
+
+    if api_key and secret and mode != 'paper':
+        config['apiKey'] = api_key
+        config['secret'] = secret
+
+    client = getattr(ccxt_async if use_async else ccxt, venue)(config)
+
+    if mode == 'testnet':
+        client.set_sandbox_mode(True)
+        logger.info("⚠️ RUNNING IN BINANCE FUTURES TESTNET MODE ⚠️")
+
+    if use_async:
+        return client
+
+    # Keep-alive pool: reuse TCP/TLS connections across calls and threads
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    client.session.mount('https://', adapter)
+    client.session.mount('http://', adapter)
+
+    return client
+
+
+class ExchangeSession:
+    """A pooled client for one (venue, mode) plus its market metadata cache."""
+
+    def __init__(self, venue: str, mode: str, budget: WeightBudget, markets_ttl: float = MARKETS_TTL_SECONDS):
+        self.venue = venue
+        self.mode = mode
+        self.budget = budget
+        self.markets_ttl = markets_ttl
+        self.client = _build_client(venue, mode)
+        self._markets_loaded_at = 0.0
+        self._markets_lock = threading.Lock()
+
+    def markets(self) -> dict:
+        """Cached load_markets() with TTL."""
+        with self._markets_lock:
+            if self.client.markets and (time.monotonic() - self._markets_loaded_at) < self.markets_ttl:
+                return self.client.markets
+            self.budget.acquire(ENDPOINT_WEIGHTS['load_markets'])
+            markets = self.client.load_markets(reload=bool(self.client.markets))
+            self._markets_loaded_at = time.monotonic()
+            logger.info(f"Loaded {len(markets)} markets for {self.venue} ({self.mode})")
+            return markets
+
+    def call(self, method: str, *args, **kwargs):
+        """
+        Runs a CCXT method through the shared weight budget.
+        Markets are loaded (or refreshed after TTL) before the first call.
+        """
+        self.markets()
+        weight = ENDPOINT_WEIGHTS.get(method, 1)
+        if callable(weight):
+            weight = weight(kwargs)
+        self.budget.acquire(weight)
+        return getattr(self.client, method)(*args, **kwargs)
+
+
+class AsyncExchangeSession:
+    """Async twin of ExchangeSession (ccxt.async_support), sharing the same weight budget."""
+
+    def __init__(self, venue: str, mode: str, budget: WeightBudget, markets_ttl: float = MARKETS_TTL_SECONDS):
+        self.venue = venue
+        self.mode = mode
+        self.budget = budget
+        self.markets_ttl = markets_ttl
+        self.client = _build_client(venue, mode, use_async=True)
+        self._markets_loaded_at = 0.0
+        self._markets_lock = asyncio.Lock()
+
+    async def markets(self) -> dict:
+        async with self._markets_lock:
+            if self.client.markets and (time.monotonic() - self._markets_loaded_at) < self.markets_ttl:
+                return self.client.markets
+            await self.budget.acquire_async(ENDPOINT_WEIGHTS['load_markets'])
+            markets = await self.client.load_markets(reload=bool(self.client.markets))
+            self._markets_loaded_at = time.monotonic()
+            logger.info(f"Loaded {len(markets)} markets for {self.venue} ({self.mode}, async)")
+            return markets
+
+    async def call(self, method: str, *args, **kwargs):
+        await self.markets()
+        weight = ENDPOINT_WEIGHTS.get(method, 1)
+        if callable(weight):
+            weight = weight(kwargs)
+        await self.budget.acquire_async(weight)
+        return await getattr(self.client, method)(*args, **kwargs)
+
+    async def close(self):
+        await self.client.close()
+
+
+class SessionManager:
+    """Owns every ExchangeSession; sessions are created lazily and reused forever."""
+
+    def __init__(self, weight_limit: int = WEIGHT_LIMIT_PER_MINUTE):
+        self.budget = WeightBudget(weight_limit)
+        self._sessions = {}
+        self._async_sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, venue: str = 'binance', mode: str = None) -> ExchangeSession:
+        mode = (mode or mode_from_env()).lower()
+        if mode not in MODES:
+            raise ValueError(f"Unknown exchange mode: {mode}")
+        key = (venue, mode)
+        with self._lock:
+            if key not in self._sessions:
+                self._sessions[key] = ExchangeSession(venue, mode, self.budget)
+            return self._sessions[key]
+
+    def get_async(self, venue: str = 'binance', mode: str = None) -> AsyncExchangeSession:
+        """Async session for (venue, mode). Must be created and used inside one running event loop."""
+        mode = (mode or mode_from_env()).lower()
+        if mode not in MODES:
+            raise ValueError(f"Unknown exchange mode: {mode}")
+        key = (venue, mode)
+        with self._lock:
+            if key not in self._async_sessions:
+                self._async_sessions[key] = AsyncExchangeSession(venue, mode, self.budget)
+            return self._async_sessions[key]
+
+    async def close_async(self):
+        """Closes every async client (call before the event loop ends)."""
+        with self._lock:
+            sessions = list(self._async_sessions.values())
+            self._async_sessions.clear()
+        for session in sessions:
+            try:
+                await session.close()
+            except Exception as e:
+                logger.warning(f"Error closing async session {session.venue} ({session.mode}): {e}")
+
+    def market_data(self, venue: str = 'binance') -> ExchangeSession:
+        """Public mainnet data (candles) regardless of TRADING_MODE: testnet books are not representative."""
+        return self.get(venue, 'paper')
+
+    def trading(self, venue: str = 'binance') -> ExchangeSession:
+        """Session for the configured TRADING_MODE (tickers for execution, orders)."""
+        return self.get(venue, mode_from_env())
+
+    def market_data_async(self, venue: str = 'binance') -> AsyncExchangeSession:
+        return self.get_async(venue, 'paper')
+
+    def trading_async(self, venue: str = 'binance') -> AsyncExchangeSession:
+        return self.get_async(venue, mode_from_env())
+
+
+# Global Session Manager (shared by every exchange call in the process)
+session_manager = SessionManager()
@@ -0,0 +1,146 @@
+# feature_cache.py
+# Module: Feature Cache
+# Description: Candle-close-aware feature recomputation. Features built from closed
+# candles are computed once per (symbol, timeframe, last closed candle) and reused
+# until the next close; only values that depend on the forming bar are refreshed per pass.
+
+import logging
+import threading
+import pandas as pd
+
+import trading_tools as tools
+import order_flow as flow
+import market_profile as mp
+import smart_money
+import hurst
+from indicator_engine import IndicatorEngine, indicator_engine
+
+logger = logging.getLogger("feature_cache")
+
+
+def last_closed_ts(df: pd.DataFrame):
+    """Open time of the last CLOSED candle (iloc[-2]; iloc[-1] is the forming bar)."""
+    if df is None or len(df) < 2:
+        return None
+    return pd.Timestamp(df['timestamp'].iloc[-2])
+
+
+class FeatureCache:
+    """
+    Keeps one entry per (symbol, timeframe, feature), versioned by the last closed
+    candle time. A pass with the same closed candle is a hit; a new close is a miss.
+    """
+
+    def __init__(self):
+        self._entries = {}  # (symbol, timeframe, feature) -> (closed_ts, value)
+        self._stats = {}    # feature -> {'hits': int, 'misses': int}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, symbol: str, timeframe: str, feature: str, closed_ts, compute):
+        key = (symbol, timeframe, feature)
+        with self._lock:
+            stats = self._stats.setdefault(feature, {'hits': 0, 'misses': 0})
+            entry = self._entries.get(key)
+            if closed_ts is not None and entry and entry[0] == closed_ts:
+                stats['hits'] += 1
+                return entry[1]
+            stats['misses'] += 1
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = (closed_ts, value)
+        return value
+
+    def invalidate(self, symbol: str = None):
+        with self._lock:
+            for key in [k for k in self._entries if symbol is None or k[0] == symbol]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        """{'hits', 'misses', 'hit_rate', 'features': {feature: {'hits', 'misses'}}}"""
+        with self._lock:
+            features = {name: dict(values) for name, values in self._stats.items()}
+        hits = sum(v['hits'] for v in features.values())
+        misses = sum(v['misses'] for v in features.values())
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else 0.0,
+            'features': features
+        }
+
+    def stats_str(self) -> str:
+        s = self.stats()
+        return f"Feature cache: {s['hits']} hits / {s['misses']} misses ({s['hit_rate']:.0%})"
+
+
+# Global Feature Cache (shared by every pair worker)
+feature_cache = FeatureCache()
+
+
+# =============================================================================
+# CACHED FEATURES
+# =============================================================================
+
+def cached_indicators(symbol: str, timeframe: str, df: pd.DataFrame, cache: FeatureCache = None,
+                      engine: IndicatorEngine = None) -> pd.DataFrame:
+    """
+    Indicator frame from the incremental engine: closed candles are fed once per close
+    (O(1) each), the forming bar is appended with a peeked row on every pass.
+    """
+    cache = cache or feature_cache
+    engine = engine or indicator_engine
+    if len(df) < 2:
+        return tools.calculate_indicators(df)
+
+    def _closed_pass():
+        closed = df.iloc[:-1]
+        engine.advance(symbol, timeframe, closed)
+        return engine.closed_frame(symbol, timeframe, closed)
+
+    closed = cache.get_or_compute(symbol, timeframe, 'indicators', last_closed_ts(df), _closed_pass)
+    return engine.with_forming(symbol, timeframe, closed, df.iloc[-1])
+
+
+def cached_smart_money(symbol: str, timeframe: str, df: pd.DataFrame, cache: FeatureCache = None) -> dict:
+    """
+    SMC records (FVGs with fill tracking, pivots, liquidity pools; see smart_money.analyze)
+    from closed candles, cached per close. Strings are rendered at prompt time.
+    Candle patterns read the forming bar, so they are refreshed on every pass.
+    """
+    cache = cache or feature_cache
+    closed = cache.get_or_compute(symbol, timeframe, 'smart_money', last_closed_ts(df),
+                                  lambda: smart_money.analyze(df.iloc[:-1]))
+    return dict(closed, patterns_str=tools.detect_candle_patterns(df))
+
+
+def cached_vpin(symbol: str, timeframe: str, df: pd.DataFrame, cache: FeatureCache = None) -> float:
+    """VPIN over closed candles (the forming bar's volume split is still incomplete)."""
+    cache = cache or feature_cache
+    return cache.get_or_compute(symbol, timeframe, 'vpin', last_closed_ts(df),
+                                lambda: flow.calculate_vpin_pro(df.iloc[:-1]))
+
+
+def cached_volume_profile(symbol: str, timeframe: str, df: pd.DataFrame, cache: FeatureCache = None) -> dict:
+    """Volume Profile (POC/VAH/VAL) over closed candles, rolled incrementally once per close."""
+    cache = cache or feature_cache
+    return cache.get_or_compute(symbol, timeframe, 'volume_profile', last_closed_ts(df),
+                                lambda: mp.profile_book.rolling(symbol, timeframe).update(df.iloc[:-1]).summary())
+
+
+def cached_hurst_profile(symbol: str, timeframe: str, df: pd.DataFrame, cache: FeatureCache = None,
+                         book: hurst.HurstBook = None) -> dict:
+    """
+    Hurst estimators (variance scaling, R/S, DFA, variance ratio) over closed candles.
+    The symbol's rolling series is advanced once per close (see hurst.HurstTracker).
+    """
+    cache = cache or feature_cache
+    book = book or hurst.hurst_book
+    return cache.get_or_compute(symbol, timeframe, 'hurst', last_closed_ts(df),
+                                lambda: book.update(symbol, timeframe, df.iloc[:-1]))
+
+
+def cached_hurst(symbol: str, timeframe: str, df: pd.DataFrame, cache: FeatureCache = None) -> float:
+    """Hurst exponent over closed candles (a regime statistic: one value per close)."""
+    return cached_hurst_profile(symbol, timeframe, df, cache)['hurst']
@@ -0,0 +1,254 @@
+# feature_graph.py
+# Module: Lazy Feature Graph
+# Description: Declarative indicator graph. Every feature lists its inputs; callers ask
+# for named columns and only the required subgraph is evaluated. Intermediates (true
+# range, ATR, smoothed DM...) are shared between features and between stages, and
+# each stage records which features it pulled.
+#
+# Arrays are (N, T): one row per symbol (N=1 for a single DataFrame), axis 1 = time.
+
+import logging
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+logger = logging.getLogger("feature_graph")
+
+SOURCES = ('open', 'high', 'low', 'close', 'volume')
+
+
+# =============================================================================
+# 2-D PRIMITIVES (axis 1 = time)
+# =============================================================================
+
+def ewm_2d(x: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    Row-wise EWM with adjust=False semantics (pandas): seeded with each row's first
+    valid value, leading NaNs stay NaN. Interior NaNs are not supported.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    valid = ~np.isnan(x)
+    has_valid = valid.any(axis=1)
+    first = np.where(has_valid, valid.argmax(axis=1), x.shape[1])
+
+    # Leading NaNs -> first valid value: the recursion stays constant until real data starts
+    seed = np.where(has_valid, x[np.arange(len(x)), np.minimum(first, x.shape[1] - 1)], 0.0)
+    filled = np.where(np.arange(x.shape[1])[None, :] < first[:, None], seed[:, None], x)
+
+    zi = ((1 - alpha) * seed)[:, None]
+    y, _ = lfilter([alpha], [1.0, -(1 - alpha)], filled, axis=1, zi=zi)
+    y[np.arange(x.shape[1])[None, :] < first[:, None]] = np.nan
+    return y
+
+
+def rolling_2d(x: np.ndarray, window: int, func) -> np.ndarray:
+    """Row-wise rolling reduction; the first window-1 columns (and windows with NaN) are NaN."""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        out[:, window - 1:] = func(sliding_window_view(x, window, axis=1), axis=-1)
+    return out
+
+
+def shift_2d(x: np.ndarray, periods: int = 1) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    out[:, periods:] = x[:, :-periods]
+    return out
+
+
+def _std_ddof1(w, axis):
+    return np.std(w, axis=axis, ddof=1)
+
+
+# =============================================================================
+# FEATURE REGISTRY
+# =============================================================================
+
+FEATURES = {}  # name -> (inputs, func)
+
+
+def feature(name: str, inputs: tuple):
+    """Registers `func(*inputs) -> (N, T) array` as feature `name`."""
+    def _register(func):
+        FEATURES[name] = (tuple(inputs), func)
+        return func
+    return _register
+
+
+@feature('prev_close', ('close',))
+def _prev_close(close):
+    return shift_2d(close)
+
+
+@feature('delta', ('close', 'prev_close'))
+def _delta(close, prev_close):
+    return close - prev_close
+
+
+@feature('ema_up', ('delta',))
+def _ema_up(delta):
+    return ewm_2d(np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None)), 1 / 14)
+
+
+@feature('ema_down', ('delta',))
+def _ema_down(delta):
+    return ewm_2d(np.where(np.isnan(delta), np.nan, np.clip(-delta, 0, None)), 1 / 14)
+
+
+@feature('RSI_14', ('ema_up', 'ema_down'))
+def _rsi(ema_up, ema_down):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - (100 / (1 + ema_up / ema_down))
+
+
+@feature('EMA_200', ('close',))
+def _ema_200(close):
+    return ewm_2d(close, 2 / 201)
+
+
+@feature('EMA_50', ('close',))
+def _ema_50(close):
+    return ewm_2d(close, 2 / 51)
+
+
+@feature('BB_MID', ('close',))
+def _bb_mid(close):
+    return rolling_2d(close, 20, np.mean)
+
+
+@feature('std_20', ('close',))
+def _std_20(close):
+    return rolling_2d(close, 20, _std_ddof1)
+
+
+@feature('BB_UPPER', ('BB_MID', 'std_20'))
+def _bb_upper(sma_20, std_20):
+    return sma_20 + 2 * std_20
+
+
+@feature('BB_LOWER', ('BB_MID', 'std_20'))
+def _bb_lower(sma_20, std_20):
+    return sma_20 - 2 * std_20
+
+
+@feature('tr', ('high', 'low', 'prev_close'))
+def _true_range(high, low, prev_close):
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+@feature('ATR_14', ('tr',))
+def _atr(tr):
+    return rolling_2d(tr, 14, np.mean)
+
+
+def _directional(move, other, close):
+    dm = np.where((move > other) & (move > 0), move, 0.0)
+    dm[np.isnan(close)] = np.nan  # Padded (pre-listing) cells are not candles
+    return ewm_2d(dm, 1 / 14)
+
+
+@feature('plus_dm_ewm', ('high', 'low', 'close'))
+def _plus_dm_ewm(high, low, close):
+    return _directional(high - shift_2d(high), shift_2d(low) - low, close)
+
+
+@feature('minus_dm_ewm', ('high', 'low', 'close'))
+def _minus_dm_ewm(high, low, close):
+    return _directional(shift_2d(low) - low, high - shift_2d(high), close)
+
+
+@feature('dx', ('plus_dm_ewm', 'minus_dm_ewm', 'ATR_14'))
+def _dx(plus_dm_ewm, minus_dm_ewm, atr):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = 100 * plus_dm_ewm / atr
+        minus_di = 100 * minus_dm_ewm / atr
+        return 100 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+
+
+@feature('ADX_14', ('dx',))
+def _adx(dx):
+    return ewm_2d(dx, 1 / 14)
+
+
+@feature('RES_20', ('high',))
+def _res_20(high):
+    return rolling_2d(high, 20, np.max)
+
+
+@feature('SUP_20', ('low',))
+def _sup_20(low):
+    return rolling_2d(low, 20, np.min)
+
+
+@feature('MACD_12_26_9', ('close',))
+def _macd(close):
+    return ewm_2d(close, 2 / 13) - ewm_2d(close, 2 / 27)
+
+
+@feature('MACDs_12_26_9', ('MACD_12_26_9',))
+def _macd_signal(macd):
+    return ewm_2d(macd, 2 / 10)
+
+
+# Public column sets
+INDICATOR_COLUMNS = ['RSI_14', 'EMA_200', 'EMA_50', 'BB_UPPER', 'BB_LOWER', 'BB_MID', 'ADX_14',
+                     'ATR_14', 'RES_20', 'SUP_20', 'MACD_12_26_9', 'MACDs_12_26_9']
+GATEKEEPER_COLUMNS = ['ADX_14', 'RSI_14', 'BB_UPPER', 'BB_LOWER']
+
+
+def plan(targets, available=()) -> list:
+    """Topologically ordered features needed for `targets`, skipping what is `available`."""
+    order, seen = [], set(available) | set(SOURCES)
+
+    def _visit(name):
+        if name in seen:
+            return
+        if name not in FEATURES:
+            raise KeyError(f"Unknown feature: {name}")
+        seen.add(name)
+        for dep in FEATURES[name][0]:
+            _visit(dep)
+        order.append(name)
+
+    for target in targets:
+        _visit(target)
+    return order
+
+
+class LazyFeatures:
+    """
+    Memoized evaluation over one set of (N, T) source arrays.
+    require() computes only the missing subgraph; pulled[stage] lists what each stage computed.
+    """
+
+    def __init__(self, arrays: dict):
+        self.arrays = dict(arrays)
+        self.pulled = {}
+        self.df = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'LazyFeatures':
+        lazy = cls({name: df[name].to_numpy(dtype=np.float64)[None, :] for name in SOURCES})
+        lazy.df = df
+        return lazy
+
+    def require(self, columns, stage: str = 'default') -> dict:
+        steps = plan(columns, available=self.arrays)
+        for name in steps:
+            inputs, func = FEATURES[name]
+            self.arrays[name] = func(*[self.arrays[dep] for dep in inputs])
+        self.pulled.setdefault(stage, []).extend(steps)
+        if steps:
+            logger.debug(f"Stage '{stage}' pulled {len(steps)} features: {', '.join(steps)}")
+        return {name: self.arrays[name] for name in columns}
+
+    def frame(self, columns, stage: str = 'default') -> pd.DataFrame:
+        """Copy of the source DataFrame (from_frame) with the requested columns added."""
+        values = self.require(columns, stage)
+        out = self.df.copy()
+        for name in columns:
+            out[name] = values[name][0]
+        return out
+
+    def pulled_str(self) -> str:
+        return " | ".join(f"{stage}: {len(names)}" for stage, names in self.pulled.items())
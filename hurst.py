@@ -0,0 +1,280 @@
+# hurst.py
+# Module: Hurst Engine
+# Description: Hurst exponent estimators on log prices, vectorized over rows so one
+# call serves a single window or every rolling window of a history:
+#   - variance scaling (std of q-period log returns ~ q^H; the regime thresholds' H)
+#   - rescaled range (R/S over end-anchored blocks)
+#   - DFA-1 (detrended fluctuation of the cumulative return profile)
+#   - Lo-MacKinlay variance ratio VR(q) with its z statistic
+# HurstBook keeps a rolling series per (symbol, timeframe) and advances it only on
+# new closed candles; feature_cache serves it once per close.
+#
+# Usage (rolling estimates over the local candle store):
+#   python hurst.py --symbol ETH/USDT --timeframe 4h --last 10
+
+import sys
+import argparse
+import logging
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from candle_frame import CandleFrame, col
+
+logger = logging.getLogger("hurst")
+
+HURST_WINDOW = 100      # Closed candles per estimate (~16 days of 4h)
+HURST_MIN = 32          # Fewer candles: no estimate (H = 0.5, random walk)
+HURST_HISTORY = 500     # Rolling estimates kept per (symbol, timeframe)
+VS_LAGS = tuple(range(2, 20))
+VR_Q = 4                # Variance ratio horizon (4 candles = 16h on 4h)
+MIN_BLOCK = 8           # Smallest R/S block / DFA scale
+N_SCALES = 8            # Block sizes / scales, log-spaced
+
+
+def log_prices(data) -> np.ndarray:
+    """log(close) of a DataFrame / CandleFrame (non-positive closes -> NaN)."""
+    close = col(data, 'close')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log(np.where(close > 0, close, np.nan))
+
+
+def _slope(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Least-squares slope of each row of y (..., k) against x (k,). NaN rows stay NaN."""
+    xc = x - x.mean()
+    return (y - y.mean(axis=-1, keepdims=True)) @ xc / (xc @ xc)
+
+
+def _scales(largest: int) -> np.ndarray:
+    """Log-spaced integer sizes between MIN_BLOCK and `largest`."""
+    if largest < MIN_BLOCK:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(np.geomspace(MIN_BLOCK, largest, N_SCALES).astype(np.int64))
+
+
+def _blocks(x: np.ndarray, n: int) -> np.ndarray:
+    """(..., T) -> (..., T // n, n): the newest whole blocks (end-anchored)."""
+    k = x.shape[-1] // n
+    return x[..., x.shape[-1] - k * n:].reshape(x.shape[:-1] + (k, n))
+
+
+def variance_scaling(logp, lags=VS_LAGS) -> np.ndarray:
+    """
+    H from the scaling of the std of q-period log returns with q (std ~ q^H).
+    All lags in one masked pass: the (..., lags, T) difference matrix.
+    """
+    logp = np.asarray(logp, dtype=np.float64)
+    q = np.asarray(lags, dtype=np.int64)
+    end = np.arange(logp.shape[-1])
+    start = end - q[:, None]
+    valid = start >= 0
+    diffs = logp[..., None, :] - logp[..., np.maximum(start, 0)]
+    count = valid.sum(axis=-1)
+    mean = np.where(valid, diffs, 0.0).sum(axis=-1) / count
+    var = np.where(valid, (diffs - mean[..., None]) ** 2, 0.0).sum(axis=-1) / count
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _slope(np.log(q), 0.5 * np.log(var))
+
+
+def rescaled_range(returns) -> np.ndarray:
+    """H from the rescaled range: mean R/S of blocks of size n ~ n^H."""
+    returns = np.asarray(returns, dtype=np.float64)
+    sizes = _scales(returns.shape[-1] // 2)
+    if len(sizes) < 2:
+        return np.full(returns.shape[:-1], np.nan)
+    log_rs = []
+    for n in sizes.tolist():  # One vectorized pass per block size
+        blocks = _blocks(returns, n)
+        deviation = np.cumsum(blocks - blocks.mean(axis=-1, keepdims=True), axis=-1)
+        spread = deviation.max(axis=-1) - deviation.min(axis=-1)
+        std = blocks.std(axis=-1)
+        valid = std > 0
+        ratio = np.where(valid, spread / np.where(valid, std, 1.0), 0.0).sum(axis=-1) / valid.sum(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_rs.append(np.log(ratio))
+    return _slope(np.log(sizes), np.stack(log_rs, axis=-1))
+
+
+def dfa(returns) -> np.ndarray:
+    """H from first-order detrended fluctuation analysis: F(n) ~ n^H."""
+    returns = np.asarray(returns, dtype=np.float64)
+    sizes = _scales(returns.shape[-1] // 4)
+    if len(sizes) < 2:
+        return np.full(returns.shape[:-1], np.nan)
+    profile = np.cumsum(returns - returns.mean(axis=-1, keepdims=True), axis=-1)
+    log_f = []
+    for n in sizes.tolist():
+        blocks = _blocks(profile, n)
+        t = np.arange(n) - (n - 1) / 2
+        centred = blocks - blocks.mean(axis=-1, keepdims=True)
+        residual = centred - (centred @ t / (t @ t))[..., None] * t  # Least-squares line per block
+        with np.errstate(divide='ignore'):
+            log_f.append(0.5 * np.log((residual ** 2).mean(axis=(-2, -1))))
+    return _slope(np.log(sizes), np.stack(log_f, axis=-1))
+
+
+def variance_ratio(logp, q: int = VR_Q) -> tuple:
+    """
+    Lo-MacKinlay variance ratio VR(q) (overlapping q-period returns, bias-corrected)
+    and its homoskedastic z statistic. VR > 1: trending; VR < 1: mean reverting.
+    """
+    logp = np.asarray(logp, dtype=np.float64)
+    returns = np.diff(logp, axis=-1)
+    n = returns.shape[-1]
+    if n <= q:
+        nan = np.full(logp.shape[:-1], np.nan)
+        return nan, nan
+    mu = returns.mean(axis=-1, keepdims=True)
+    var_1 = ((returns - mu) ** 2).sum(axis=-1) / (n - 1)
+    var_q = ((logp[..., q:] - logp[..., :-q] - q * mu) ** 2).sum(axis=-1) / (q * (n - q + 1) * (1 - q / n))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = var_q / var_1
+    z = (ratio - 1) / np.sqrt(2 * (2 * q - 1) * (q - 1) / (3 * q * n))
+    return ratio, z
+
+
+def estimate(logp) -> dict:
+    """All estimators over each row of `logp` (..., T)."""
+    logp = np.asarray(logp, dtype=np.float64)
+    returns = np.diff(logp, axis=-1)
+    ratio, z = variance_ratio(logp)
+    return {'vs': variance_scaling(logp), 'rs': rescaled_range(returns), 'dfa': dfa(returns),
+            'vr': ratio, 'vr_z': z}
+
+
+def rolling(logp, window: int = HURST_WINDOW) -> dict:
+    """Estimators over every `window`-candle window (value i covers logp[i-window+1:i+1]); NaN before."""
+    logp = np.asarray(logp, dtype=np.float64)
+    out = {key: np.full(len(logp), np.nan) for key in ('vs', 'rs', 'dfa', 'vr', 'vr_z')}
+    if len(logp) >= window:
+        for key, values in estimate(sliding_window_view(logp, window)).items():
+            out[key][window - 1:] = values
+    return out
+
+
+class HurstTracker:
+    """
+    Rolling Hurst estimates of one (symbol, timeframe). update() computes only the
+    windows ending on candles closed since the last call (all of them batched).
+    """
+
+    def __init__(self, window: int = HURST_WINDOW):
+        self.window = window
+        self.closes = deque(maxlen=max(HURST_HISTORY, window))  # (ts, log close)
+        self.series = deque(maxlen=HURST_HISTORY)                # {'time', 'vs', 'rs', 'dfa', 'vr', 'vr_z'}
+        self.last_ts = None
+        self._snapshot = self._summary({}, 0)
+        self._lock = threading.Lock()
+
+    def update(self, df_closed) -> dict:
+        frame = df_closed if isinstance(df_closed, CandleFrame) else CandleFrame.from_dataframe(df_closed)
+        with self._lock:
+            if frame.empty:
+                return self._snapshot
+            ts = frame['timestamp']
+            start = int(np.searchsorted(ts, self.last_ts, side='right')) if self.last_ts is not None else 0
+            if start == len(ts):
+                return self._snapshot  # Same closed candle: cached
+            if self.last_ts is None or start == 0 or ts[start - 1] != self.last_ts:
+                self.closes.clear()    # Gap or first call: reseed from this frame
+                self.series.clear()
+                start = 0
+
+            logp = log_prices(frame)
+            self.closes.extend(zip(ts[start:].tolist(), logp[start:].tolist()))
+            self.last_ts = int(ts[-1])
+            self._advance(len(ts) - start)
+            return self._snapshot
+
+    def _advance(self, new: int):
+        held = np.fromiter((c for _, c in self.closes), dtype=np.float64, count=len(self.closes))
+        times = [t for t, _ in self.closes]
+        if len(held) >= self.window:
+            first_end = max(len(held) - new, self.window - 1)
+            windows = sliding_window_view(held, self.window)[first_end - self.window + 1:]
+            values = estimate(windows)
+            for i, end in enumerate(range(first_end, len(held))):
+                point = {key: round(float(v[i]), 4) for key, v in values.items()}
+                self.series.append(dict(point, time=pd.Timestamp(times[end], unit='ms').strftime('%Y-%m-%d %H:%M')))
+            current = {key: self.series[-1][key] for key in values}
+        elif len(held) >= HURST_MIN:
+            current = {key: round(float(v), 4) for key, v in estimate(held).items()}
+        else:
+            current = {}
+        self._snapshot = self._summary(current, min(len(held), self.window))
+
+    @staticmethod
+    def _summary(current: dict, candles: int) -> dict:
+        """'hurst' is the variance-scaling H (what the regime thresholds were tuned on)."""
+        if not current or not np.isfinite(current.get('vs', np.nan)):
+            return {'hurst': 0.5, 'rs': None, 'dfa': None, 'vr': None, 'vr_z': None, 'candles': candles}
+        clean = {key: (value if np.isfinite(value) else None) for key, value in current.items()}
+        return {'hurst': round(clean['vs'], 3), 'rs': clean['rs'], 'dfa': clean['dfa'],
+                'vr': clean['vr'], 'vr_z': clean['vr_z'], 'candles': candles}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot
+
+    def history(self, limit: int = None) -> list:
+        with self._lock:
+            series = list(self.series)
+        return series[-limit:] if limit else series
+
+
+class HurstBook:
+    """One HurstTracker per (symbol, timeframe)."""
+
+    def __init__(self, window: int = HURST_WINDOW):
+        self.window = window
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def tracker(self, symbol: str, timeframe: str) -> HurstTracker:
+        with self._lock:
+            return self._trackers.setdefault((symbol, timeframe), HurstTracker(self.window))
+
+    def update(self, symbol: str, timeframe: str, df_closed) -> dict:
+        return self.tracker(symbol, timeframe).update(df_closed)
+
+
+# Global Hurst Book (advanced once per closed 4h candle through feature_cache)
+hurst_book = HurstBook()
+
+
+def render_hurst(snapshot: dict) -> str:
+    """Prompt line: the three H estimators plus the variance ratio."""
+    if not snapshot or snapshot.get('rs') is None:
+        return "Hurst Estimators: insufficient history"
+    return (f"Hurst Estimators ({snapshot['candles']} candles): VS {snapshot['hurst']:.2f} | "
+            f"R/S {snapshot['rs']:.2f} | DFA {snapshot['dfa']:.2f} | "
+            f"VR({VR_Q}) {snapshot['vr']:.2f} (z {snapshot['vr_z']:+.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling Hurst estimates over the local candle store")
+    parser.add_argument('--symbol', default='ETH/USDT')
+    parser.add_argument('--timeframe', default='4h')
+    parser.add_argument('--window', type=int, default=HURST_WINDOW)
+    parser.add_argument('--last', type=int, default=10)
+    args = parser.parse_args()
+
+    from candle_patterns import load_history
+    frame = load_history(args.symbol, args.timeframe)
+    if len(frame) < args.window:
+        print(f"{args.symbol} {args.timeframe}: {len(frame)} candles, need {args.window}. Run backfill.py first.")
+        return 1
+
+    series = rolling(log_prices(frame), args.window)
+    times = pd.to_datetime(frame['timestamp'], unit='ms')
+    table = pd.DataFrame(series, index=times).dropna().round(3)
+    print(f"{args.symbol} {args.timeframe}: {len(frame)} candles, window {args.window}")
+    print(table.tail(args.last).to_string())
+    print(table.describe().loc[['mean', 'std', 'min', 'max']].to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+# indicator_engine.py
+# Module: Incremental Indicator Engine
+# Description: Streaming version of calculate_indicators. Keeps the recursive state
+# (EWMAs, Wilder smoothing, MACD signal, rolling-window tails) per (symbol, timeframe)
+# and advances it in O(1) per closed candle. State persists across restarts
+# (one JSON file per series: a close rewrites only its own file).
+
+import os
+import json
+import logging
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+
+from candle_store import timeframe_to_ms
+
+logger = logging.getLogger("indicator_engine")
+
+INDICATOR_STATE_DIR = os.getenv("INDICATOR_STATE_DIR", "data/indicator_state")
+HISTORY_ROWS = 300   # Indicator rows kept per key (covers the 100/252-candle windows)
+
+INDICATOR_COLUMNS = ['RSI_14', 'EMA_200', 'EMA_50', 'BB_UPPER', 'BB_LOWER', 'BB_MID', 'ADX_14',
+                     'ATR_14', 'RES_20', 'SUP_20', 'MACD_12_26_9', 'MACDs_12_26_9']
+
+# Smoothing factors (pandas ewm adjust=False equivalents)
+ALPHA_RSI = 1 / 14       # com=13
+ALPHA_WILDER = 1 / 14    # DI / ADX
+ALPHA_EMA_200 = 2 / 201
+ALPHA_EMA_50 = 2 / 51
+ALPHA_FAST = 2 / 13      # MACD 12
+ALPHA_SLOW = 2 / 27      # MACD 26
+ALPHA_SIGNAL = 2 / 10    # MACD signal 9
+
+RECURSIVE_FIELDS = ['ema_up', 'ema_down', 'ema_200', 'ema_50', 'exp1', 'exp2', 'signal',
+                    'plus_ewm', 'minus_ewm', 'adx']
+
+
+def _ewm(prev, value, alpha):
+    """One adjust=False EWM step; a missing previous value seeds with the first observation."""
+    if value is None or np.isnan(value):
+        return prev
+    if prev is None:
+        return value
+    return (1 - alpha) * prev + alpha * value
+
+
+def _nan(value):
+    return np.nan if value is None else value
+
+
+class IndicatorState:
+    """
+    Recursive state of every indicator for one (symbol, timeframe) after `last_ts`.
+    step() is pure (used for the forming candle); update() commits a closed candle.
+    """
+
+    def __init__(self):
+        self.last_ts = None
+        self.n = 0
+        for field in RECURSIVE_FIELDS:
+            setattr(self, field, None)
+        self.closes = deque(maxlen=20)
+        self.highs = deque(maxlen=20)
+        self.lows = deque(maxlen=20)
+        self.trs = deque(maxlen=14)
+
+    def step(self, candle: dict) -> tuple:
+        """Returns (new recursive values, tr, indicator row) for `candle` without mutating."""
+        c, h, l = float(candle['close']), float(candle['high']), float(candle['low'])
+        new = {}
+
+        if self.closes:
+            prev_c, prev_h, prev_l = self.closes[-1], self.highs[-1], self.lows[-1]
+            delta = c - prev_c
+            new['ema_up'] = _ewm(self.ema_up, max(delta, 0.0), ALPHA_RSI)
+            new['ema_down'] = _ewm(self.ema_down, max(-delta, 0.0), ALPHA_RSI)
+            tr = max(h - l, abs(h - prev_c), abs(l - prev_c))
+            up_move, down_move = h - prev_h, prev_l - l
+            plus_dm = up_move if (up_move > down_move and up_move > 0) else 0.0
+            minus_dm = down_move if (down_move > up_move and down_move > 0) else 0.0
+        else:
+            new['ema_up'], new['ema_down'] = None, None
+            tr = h - l
+            plus_dm = minus_dm = 0.0
+
+        new['ema_200'] = _ewm(self.ema_200, c, ALPHA_EMA_200)
+        new['ema_50'] = _ewm(self.ema_50, c, ALPHA_EMA_50)
+        new['exp1'] = _ewm(self.exp1, c, ALPHA_FAST)
+        new['exp2'] = _ewm(self.exp2, c, ALPHA_SLOW)
+        macd = new['exp1'] - new['exp2']
+        new['signal'] = _ewm(self.signal, macd, ALPHA_SIGNAL)
+        new['plus_ewm'] = _ewm(self.plus_ewm, plus_dm, ALPHA_WILDER)
+        new['minus_ewm'] = _ewm(self.minus_ewm, minus_dm, ALPHA_WILDER)
+
+        # RSI
+        rsi = np.nan
+        if new['ema_up'] is not None:
+            if new['ema_down'] > 0:
+                rsi = 100 - (100 / (1 + new['ema_up'] / new['ema_down']))
+            elif new['ema_up'] > 0:
+                rsi = 100.0
+
+        # Rolling windows: 19 stored + this candle
+        closes = list(self.closes)[-19:] + [c]
+        highs = list(self.highs)[-19:] + [h]
+        lows = list(self.lows)[-19:] + [l]
+        trs = list(self.trs)[-13:] + [tr]
+        full_20 = len(closes) == 20
+        sma_20 = np.mean(closes) if full_20 else np.nan
+        std_20 = np.std(closes, ddof=1) if full_20 else np.nan
+        atr = np.mean(trs) if len(trs) == 14 else np.nan
+
+        # ADX (Wilder-smoothed DX)
+        dx = np.nan
+        if not np.isnan(atr):
+            plus_di = 100 * new['plus_ewm'] / atr
+            minus_di = 100 * new['minus_ewm'] / atr
+            if plus_di + minus_di > 0:
+                dx = 100 * abs(plus_di - minus_di) / (plus_di + minus_di)
+        new['adx'] = _ewm(self.adx, dx, ALPHA_WILDER)
+
+        row = {
+            'RSI_14': rsi,
+            'EMA_200': new['ema_200'],
+            'EMA_50': new['ema_50'],
+            'BB_UPPER': sma_20 + 2 * std_20,
+            'BB_LOWER': sma_20 - 2 * std_20,
+            'BB_MID': sma_20,
+            'ADX_14': _nan(new['adx']),
+            'ATR_14': atr,
+            'RES_20': max(highs) if full_20 else np.nan,
+            'SUP_20': min(lows) if full_20 else np.nan,
+            'MACD_12_26_9': macd,
+            'MACDs_12_26_9': new['signal']
+        }
+        return new, tr, row
+
+    def update(self, ts: int, candle: dict) -> dict:
+        """Commits a CLOSED candle. O(1). Returns its indicator row."""
+        new, tr, row = self.step(candle)
+        for field, value in new.items():
+            setattr(self, field, value)
+        self.closes.append(float(candle['close']))
+        self.highs.append(float(candle['high']))
+        self.lows.append(float(candle['low']))
+        self.trs.append(tr)
+        self.last_ts = int(ts)
+        self.n += 1
+        return row
+
+    def to_dict(self) -> dict:
+        data = {field: getattr(self, field) for field in RECURSIVE_FIELDS}
+        data.update({'last_ts': self.last_ts, 'n': self.n, 'closes': list(self.closes),
+                     'highs': list(self.highs), 'lows': list(self.lows), 'trs': list(self.trs)})
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'IndicatorState':
+        state = cls()
+        for field in RECURSIVE_FIELDS:
+            setattr(state, field, data.get(field))
+        state.last_ts = data.get('last_ts')
+        state.n = data.get('n', 0)
+        state.closes.extend(data.get('closes', []))
+        state.highs.extend(data.get('highs', []))
+        state.lows.extend(data.get('lows', []))
+        state.trs.extend(data.get('trs', []))
+        return state
+
+
+def _ts_ms(values) -> np.ndarray:
+    return pd.to_datetime(values).to_numpy().astype('datetime64[ms]').astype(np.int64)
+
+
+class IndicatorEngine:
+    """
+    One IndicatorState (+ the last HISTORY_ROWS indicator rows) per (symbol, timeframe).
+    frame() advances the state with the candles that closed since the last call and
+    appends the forming candle, so per-pass cost does not grow with history length.
+    """
+
+    def __init__(self, root: str = INDICATOR_STATE_DIR, history: int = HISTORY_ROWS):
+        self.root = root    # None: in-memory only
+        self.history = history
+        self._states = {}   # (symbol, timeframe) -> IndicatorState
+        self._rows = {}     # (symbol, timeframe) -> deque of (ts, row)
+        self._lock = threading.RLock()
+        self._loaded = set()  # Keys already looked up on disk
+
+    def _path(self, symbol: str, timeframe: str) -> str:
+        safe_symbol = symbol.replace('/', '_').replace(':', '_')
+        return os.path.join(self.root, f"{safe_symbol}_{timeframe}.json")
+
+    def load(self, symbol: str, timeframe: str):
+        """Restores one series from disk the first time it is used."""
+        key = (symbol, timeframe)
+        with self._lock:
+            if key in self._loaded:
+                return
+            self._loaded.add(key)
+            if not self.root:
+                return
+            path = self._path(symbol, timeframe)
+            if not os.path.exists(path):
+                return
+            try:
+                with open(path, 'r') as f:
+                    entry = json.load(f)
+                self._states[key] = IndicatorState.from_dict(entry['state'])
+                self._rows[key] = deque(((int(ts), row) for ts, row in entry['rows']), maxlen=self.history)
+                logger.info(f"Indicator state restored for {symbol} ({timeframe})")
+            except Exception as e:
+                logger.error(f"Indicator state for {symbol} ({timeframe}) corrupted: {e}. Starting fresh.")
+                self._states.pop(key, None)
+                self._rows.pop(key, None)
+
+    def save(self, symbol: str, timeframe: str):
+        """Atomic JSON snapshot of one series (the other series' files are not touched)."""
+        if not self.root:
+            return
+        key = (symbol, timeframe)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return
+            data = {'state': state.to_dict(), 'rows': list(self._rows.get(key, []))}
+            path = self._path(symbol, timeframe)
+            tmp_path = path + ".tmp"
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f, default=lambda v: None if v is None else float(v))
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.error(f"Failed to persist indicator state for {symbol} ({timeframe}): {e}")
+
+    def state(self, symbol: str, timeframe: str):
+        self.load(symbol, timeframe)
+        return self._states.get((symbol, timeframe))
+
+    def advance(self, symbol: str, timeframe: str, df_closed: pd.DataFrame) -> int:
+        """
+        Feeds the closed candles of `df_closed` newer than the stored state.
+        Reseeds from the whole frame when there is no state or continuity is broken.
+        Returns the number of candles processed.
+        """
+        self.load(symbol, timeframe)
+        if df_closed.empty:
+            return 0
+        key = (symbol, timeframe)
+        tf_ms = timeframe_to_ms(timeframe)
+        ts = _ts_ms(df_closed['timestamp'])
+
+        with self._lock:
+            state = self._states.get(key)
+            start = 0
+            if state is not None and state.last_ts is not None:
+                start = int(np.searchsorted(ts, state.last_ts, side='right'))
+                if start < len(ts) and ts[start] != state.last_ts + tf_ms:
+                    logger.info(f"Indicator state for {symbol} ({timeframe}) out of sync. Reseeding.")
+                    state, start = None, 0
+
+            if state is None:
+                state = IndicatorState()
+                self._states[key] = state
+                self._rows[key] = deque(maxlen=self.history)
+
+            rows = self._rows[key]
+            cols = df_closed[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=float)
+            for i in range(start, len(ts)):
+                candle = {'open': cols[i, 0], 'high': cols[i, 1], 'low': cols[i, 2], 'close': cols[i, 3]}
+                rows.append((int(ts[i]), state.update(ts[i], candle)))
+
+        processed = len(ts) - start
+        if processed:
+            self.save(symbol, timeframe)
+        return processed
+
+    def peek(self, symbol: str, timeframe: str, candle) -> dict:
+        """Indicator row for the forming candle (state is not modified)."""
+        state = self.state(symbol, timeframe)
+        if state is None:
+            return None
+        return state.step(candle)[2]
+
+    def frame(self, symbol: str, timeframe: str, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Same shape as calculate_indicators(df): OHLCV + indicator columns, warm-up rows dropped.
+        df.iloc[-1] is treated as the forming candle.
+        """
+        closed = df.iloc[:-1]
+        self.advance(symbol, timeframe, closed)
+        return self.with_forming(symbol, timeframe, self.closed_frame(symbol, timeframe, closed), df.iloc[-1])
+
+    def closed_frame(self, symbol: str, timeframe: str, closed: pd.DataFrame) -> pd.DataFrame:
+        """Joins the stored indicator rows onto the closed candles (by timestamp), warm-up rows dropped."""
+        key = (symbol, timeframe)
+        with self._lock:
+            rows = dict(self._rows.get(key, []))
+
+        ts = _ts_ms(closed['timestamp'])
+        out = closed.copy()
+        values = np.full((len(out), len(INDICATOR_COLUMNS)), np.nan)
+        for i, t in enumerate(ts):
+            row = rows.get(int(t))
+            if row is not None:
+                values[i] = [_nan(row[c]) for c in INDICATOR_COLUMNS]
+        for j, col in enumerate(INDICATOR_COLUMNS):
+            out[col] = values[:, j]
+        return out.dropna()
+
+    def with_forming(self, symbol: str, timeframe: str, closed_frame: pd.DataFrame, forming: pd.Series) -> pd.DataFrame:
+        """Appends the forming candle with its peeked indicator row (O(1))."""
+        row = self.peek(symbol, timeframe, forming)
+        if row is None or any(np.isnan(v) for v in row.values()):
+            return closed_frame
+        forming_row = pd.DataFrame([dict(forming.to_dict(), **row)], index=[forming.name])
+        return pd.concat([closed_frame, forming_row[closed_frame.columns]])
+
+
+# Global Indicator Engine (state persisted in data/indicator_state/<symbol>_<timeframe>.json)
+indicator_engine = IndicatorEngine()
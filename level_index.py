@@ -0,0 +1,212 @@
+# level_index.py
+# Module: Multi-Timeframe Level Index
+# Description: Per-symbol S/R zone index. Confirmed swings from 15m, 1h and 4h are merged
+# into price zones (touch counts, timeframe-weighted strength) kept sorted by price, so
+# nearest-level and in-zone queries are O(log n) bisects. Each timeframe is consumed
+# incrementally: only swings confirmed since the last update are inserted.
+
+import bisect
+import logging
+import threading
+
+from candle_frame import CandleFrame
+from trading_tools import find_swing_points
+
+logger = logging.getLogger("level_index")
+
+ZONE_PCT = 0.15      # Swings within 0.15% of a zone centre join that zone
+MAX_ZONES = 200      # Per symbol; the weakest zones are dropped beyond this
+TIMEFRAME_WEIGHTS = {'15m': 1, '1h': 2, '4h': 4}
+SWING_LOOKBACKS = {'15m': 3, '1h': 3, '4h': 5}
+
+
+class LevelIndex:
+    """
+    Zones of one symbol, sorted by centre. Parallel lists (same order):
+    centres, lows, highs, touches, strength, last_ts, timeframes (set of tfs).
+    """
+
+    def __init__(self, zone_pct: float = ZONE_PCT, max_zones: int = MAX_ZONES):
+        self.zone_pct = zone_pct
+        self.max_zones = max_zones
+        self.centres, self.lows, self.highs = [], [], []
+        self.touches, self.strength, self.last_ts, self.timeframes = [], [], [], []
+        self.consumed = {}   # timeframe -> ts (ms) of the newest swing already inserted
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.centres)
+
+    # --- Updates ---
+
+    def update(self, timeframe: str, df_closed, lookback: int = None) -> int:
+        """
+        Inserts the swings of `df_closed` (closed candles, DataFrame or CandleFrame)
+        confirmed after the last update of this timeframe. Returns the number inserted.
+        """
+        frame = df_closed if isinstance(df_closed, CandleFrame) else CandleFrame.from_dataframe(df_closed)
+        if frame.empty:
+            return 0
+        swings = find_swing_points(frame, lookback or SWING_LOOKBACKS.get(timeframe, 3))
+        new = []
+        for side in ('high', 'low'):
+            ts = swings[f'{side}_ts'] if swings[f'{side}_ts'] is not None else swings[f'{side}_idx']
+            new += zip(ts.tolist(), swings[f'{side}_price'].tolist())
+
+        with self._lock:
+            since = self.consumed.get(timeframe)
+            new = sorted(s for s in new if since is None or s[0] > since)
+            for ts, price in new:
+                self.add(price, timeframe, ts)
+            if new:
+                self.consumed[timeframe] = new[-1][0]
+        return len(new)
+
+    def add(self, price: float, timeframe: str, ts: int = None):
+        """One swing touch: joins the nearest zone within zone_pct or opens a new one."""
+        weight = TIMEFRAME_WEIGHTS.get(timeframe, 1)
+        with self._lock:
+            i = self._nearest_index(price)
+            if i is not None and abs(self.centres[i] - price) <= price * self.zone_pct / 100:
+                touches = self.touches[i]
+                centre = (self.centres[i] * touches + price) / (touches + 1)
+                lows, highs = min(self.lows[i], price), max(self.highs[i], price)
+                strength, tfs = self.strength[i] + weight, self.timeframes[i] | {timeframe}
+                last = max(self.last_ts[i] or 0, ts or 0) or None
+                self._remove(i)
+                self._insert(centre, lows, highs, touches + 1, strength, last, tfs)
+                self._merge_neighbours(centre)
+            else:
+                self._insert(price, price, price, 1, weight, ts, {timeframe})
+                if len(self.centres) > self.max_zones:
+                    weakest = min(range(len(self.centres)), key=lambda k: (self.strength[k], self.last_ts[k] or 0))
+                    self._remove(weakest)
+
+    def _insert(self, centre, low, high, touches, strength, last_ts, tfs):
+        i = bisect.bisect_left(self.centres, centre)
+        for values, value in ((self.centres, centre), (self.lows, low), (self.highs, high),
+                              (self.touches, touches), (self.strength, strength),
+                              (self.last_ts, last_ts), (self.timeframes, tfs)):
+            values.insert(i, value)
+
+    def _remove(self, i):
+        for values in (self.centres, self.lows, self.highs, self.touches, self.strength,
+                       self.last_ts, self.timeframes):
+            del values[i]
+
+    def _merge_neighbours(self, centre: float):
+        """A zone whose centre moved may now sit within zone_pct of a neighbour: fold them."""
+        i = bisect.bisect_left(self.centres, centre)
+        for j in (i - 1, i + 1):
+            if 0 <= j < len(self.centres) and 0 <= i < len(self.centres):
+                a, b = min(i, j), max(i, j)
+                if self.centres[b] - self.centres[a] <= self.centres[b] * self.zone_pct / 100:
+                    touches = self.touches[a] + self.touches[b]
+                    merged = ((self.centres[a] * self.touches[a] + self.centres[b] * self.touches[b]) / touches,
+                              min(self.lows[a], self.lows[b]), max(self.highs[a], self.highs[b]), touches,
+                              self.strength[a] + self.strength[b],
+                              max(self.last_ts[a] or 0, self.last_ts[b] or 0) or None,
+                              self.timeframes[a] | self.timeframes[b])
+                    self._remove(b)
+                    self._remove(a)
+                    self._insert(*merged)
+                    return
+
+    # --- O(log n) queries ---
+
+    def _nearest_index(self, price: float):
+        if not self.centres:
+            return None
+        i = bisect.bisect_left(self.centres, price)
+        candidates = [k for k in (i - 1, i) if 0 <= k < len(self.centres)]
+        return min(candidates, key=lambda k: abs(self.centres[k] - price))
+
+    def zone(self, i: int) -> dict:
+        return {
+            'level': self.centres[i], 'low': self.lows[i], 'high': self.highs[i],
+            'touches': self.touches[i], 'strength': self.strength[i],
+            'timeframes': sorted(self.timeframes[i], key=lambda tf: TIMEFRAME_WEIGHTS.get(tf, 0))
+        }
+
+    def nearest(self, price: float, side: str = None):
+        """Nearest zone overall, or the nearest 'resistance' (centre above) / 'support' (below)."""
+        with self._lock:
+            if side == 'resistance':
+                i = bisect.bisect_right(self.centres, price)
+                return self.zone(i) if i < len(self.centres) else None
+            if side == 'support':
+                i = bisect.bisect_left(self.centres, price) - 1
+                return self.zone(i) if i >= 0 else None
+            i = self._nearest_index(price)
+            return self.zone(i) if i is not None else None
+
+    def zone_at(self, price: float):
+        """Zone whose [low, high] range contains price (None if price is between zones)."""
+        with self._lock:
+            i = bisect.bisect_left(self.centres, price)
+            for k in (i - 1, i):
+                if 0 <= k < len(self.centres) and self.lows[k] <= price <= self.highs[k]:
+                    return self.zone(k)
+        return None
+
+    def proximity(self, price: float, side: str, threshold_pct: float = 0.15) -> tuple:
+        """
+        Same contract as trading_tools.check_proximity_to_level, against the nearest
+        zone on `side`: distance is measured to the zone edge facing price (0 inside it).
+        Returns (is_near, level, distance_pct).
+        """
+        if not price or price <= 0:
+            return False, None, None
+        zone = self.nearest(price, side)
+        if zone is None:
+            return False, None, None
+        edge = zone['low'] if side == 'resistance' else zone['high']
+        distance_pct = max((edge - price) if side == 'resistance' else (price - edge), 0) / price * 100
+        if distance_pct <= threshold_pct:
+            return True, zone['level'], distance_pct
+        return False, None, None
+
+    def sr_levels(self, price: float, num_levels: int = 5) -> dict:
+        """calculate_sr_levels-shaped dict from the nearest zones on each side."""
+        with self._lock:
+            i = bisect.bisect_right(self.centres, price)
+            j = bisect.bisect_left(self.centres, price)
+            above = list(range(i, min(i + num_levels, len(self.centres))))
+            below = list(range(max(j - num_levels, 0), j))
+            zones = [self.zone(k) for k in below + above]
+            resistances = sorted((self.centres[k] for k in above), reverse=True)
+            supports = sorted(self.centres[k] for k in below)
+        return {
+            'resistances': resistances,
+            'supports': supports,
+            'nearest_resistance': min(resistances) if resistances else None,
+            'nearest_support': max(supports) if supports else None,
+            'current_price': price,
+            'zones': zones
+        }
+
+
+class LevelBook:
+    """One LevelIndex per symbol."""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, symbol: str) -> LevelIndex:
+        with self._lock:
+            return self._indexes.setdefault(symbol, LevelIndex())
+
+    def update(self, symbol: str, frames: dict) -> LevelIndex:
+        """frames: {timeframe: DataFrame of CLOSED candles}. Returns the symbol's index."""
+        index = self.index(symbol)
+        for timeframe, df_closed in frames.items():
+            if df_closed is not None and len(df_closed):
+                added = index.update(timeframe, df_closed)
+                if added:
+                    logger.debug(f"{symbol} {timeframe}: {added} swings -> {len(index)} zones")
+        return index
+
+
+# Global Level Book (shared by the pair workers)
+level_book = LevelBook()
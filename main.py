@@ -10,6 +10,11 @@ import logging
 import time
 import os
 import sys
+import asyncio
+import threading
+import copy
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 
@@ -21,6 +26,20 @@ import strategies # QUANT STRATEGIES
 import market_profile as mp # VOLUME PROFILE STRATEGY
 import market_monitor as mm # STATISTICAL DRIFT DETECTION
 import order_flow as flow     # TOXICITY DETECTION
+from market_stream import MarketStream # LIVE WEBSOCKET FEED
+from trade_flow import trade_flow_book # TRADE-LEVEL VPIN / CVD (aggTrades)
+import feature_cache as fc # CANDLE-CLOSE-AWARE FEATURES
+from feature_graph import LazyFeatures, GATEKEEPER_COLUMNS # LAZY GATEKEEPER FEATURES
+from batch_indicators import BatchIndicators, stack_from_store # ONE GATEKEEPER PASS FOR ALL PAIRS
+from candle_store import timeframe_to_ms
+from candle_frame import CandleFrame # ZERO-COPY HOT-PATH CANDLES
+from market_structure import structure_book, structure_key # PERSISTED BOS/CHoCH TRACKER
+import smart_money as smc # STRUCTURED SMC RECORDS
+from level_index import level_book # MULTI-TIMEFRAME S/R ZONES
+from session_profiles import session_book, render_sessions # DAILY/WEEKLY SESSION PROFILES
+import drift_scan # BOOK-WIDE DRIFT MATRIX
+from hurst import render_hurst # R/S, DFA, VARIANCE RATIO
+from resample import resampled_window
 
 # FORCE UTF-8 for Windows Console to support Emojis 🚫
 if sys.platform.startswith('win'):
@@ -59,8 +78,71 @@ PAIRS = [
 # ]
 
 TIMEFRAME_MICRO = '15m'
+MICRO_WINDOW = 100  # 15m candles per pass (gatekeeper scan + analysis)
 TIMEFRAME_MACRO = '4h'
 
+# === CONCURRENCY ===
+MAX_CONCURRENT_PAIRS = 4      # Pairs processed at the same time (async orchestrator)
+MAX_CONCURRENT_AI_CALLS = 2   # Gemini requests in flight (replaces the old 2s sleep per AI call)
+
+STATE_LOCK = threading.RLock()  # Guards the shared state dict + state.json
+AI_SEMAPHORE = threading.BoundedSemaphore(MAX_CONCURRENT_AI_CALLS)
+
+# === LOOP CADENCES (see ARCHITECTURE.md) ===
+MICRO_LOOP_SECONDS = 3          # Trailing Stop / SL / TP (live price only)
+MACRO_LOOP_SECONDS = 180        # Indicators + AI + Entries
+STRUCTURE_CLOSE_DELAY = 5       # Seconds after a 4h close before recomputing structure
+STRUCTURE_RETRY_SECONDS = 30    # Exchange has not published the closed 4h candle yet
+
+# Dedicated worker so trailing stops never queue behind indicator/AI threads
+MICRO_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro")
+
+# === SHARED IN-MEMORY CONTEXT (between loops) ===
+# symbol -> {'atr', 'features_pulled', 'regime_data', 'trend_state', 'updated_at'}
+MARKET_CONTEXT = {}
+
+# === BOOK MODE (universe drift scan, refreshed once per orchestrator cycle) ===
+# 'DEFENSIVE' when many symbols shift at once: every pair is classified DEFENSIVE
+BOOK_MODE = {'mode': 'NORMAL', 'drifting': [], 'tested': 0, 'share': 0.0, 'reason': "No scan yet"}
+
+# === STATE PERSISTENCE / NOTIFICATIONS (disk and network I/O never run under STATE_LOCK) ===
+STATE_WRITE_LOCK = threading.Lock()  # Serializes state.json writes
+_state_versions = {'next': 0, 'written': -1}
+
+def save_state(state):
+    """
+    Persists the shared state: deep-copies it under STATE_LOCK, writes the copy after releasing it.
+    Copies are numbered so a slower writer never replaces a newer state.json with an older copy.
+    """
+    with STATE_LOCK:
+        snapshot = copy.deepcopy(state)
+        version = _state_versions['next']
+        _state_versions['next'] += 1
+    with STATE_WRITE_LOCK:
+        if version < _state_versions['written']:
+            return False
+        _state_versions['written'] = version
+        return tools.write_state(snapshot)
+
+def defer(outbox, func, *args):
+    """Queues func(*args) in 'outbox' (run by send_outbox once STATE_LOCK is released), or runs it now."""
+    if outbox is None:
+        func(*args)
+    else:
+        outbox.append((func, args))
+
+def notify(outbox, message):
+    """Telegram message through the outbox (see defer)."""
+    defer(outbox, tools.send_telegram_message, message)
+
+def send_outbox(outbox):
+    """Runs the queued side effects (Telegram, radiography, lessons) in order, outside STATE_LOCK."""
+    for func, args in outbox:
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Deferred {getattr(func, '__name__', func)} failed: {e}")
+
 # === RADIOGRAPHY LOGGING ===
 RADIOGRAPHY_FILE = r"C:\Users\USER\AgenTra\radiografias.md"
 
@@ -158,9 +240,10 @@ def check_gatekeeper(df):
 
     return False, "No Signal"
 
-def detect_breakout(df_micro, vp_data):
+def detect_breakout(df_micro, vp_data, session=None):
     """
     Detects if price is breaking out of established range.
+    With session context, a break still inside the prior day's value area is capped at MEDIUM.
     """
     last_candle = df_micro.iloc[-1]
     prev_candle = df_micro.iloc[-2]
@@ -175,35 +258,59 @@ def detect_breakout(df_micro, vp_data):
     vah = vp_data['VAH']
     val = vp_data['VAL']
     
+    breakout = None
+    
     # Bullish Breakout
     if price > vah and volume > avg_volume * 1.5:
         if prev_candle['close'] <= vah * 1.002:  # Just broke out (or near enough)
-            return {
+            breakout = {
                 'type': 'BULLISH_BREAKOUT',
                 'confidence': 'HIGH' if volume > avg_volume * 2 else 'MEDIUM',
                 'level': vah
             }
     
     # Bearish Breakdown
-    if price < val and volume > avg_volume * 1.5:
+    if breakout is None and price < val and volume > avg_volume * 1.5:
         if prev_candle['close'] >= val * 0.998:  # Just broke down
-            return {
+            breakout = {
                 'type': 'BEARISH_BREAKDOWN',
                 'confidence': 'HIGH' if volume > avg_volume * 2 else 'MEDIUM',
                 'level': val
             }
     
-    return None
+    # Acceptance outside the prior session's value area (O(1): cached session context)
+    prior = (session or {}).get('prior_daily')
+    if breakout and prior:
+        bullish = breakout['type'] == 'BULLISH_BREAKOUT'
+        breakout['outside_prior_value'] = price > prior['VAH'] if bullish else price < prior['VAL']
+        if not breakout['outside_prior_value']:
+            breakout['confidence'] = 'MEDIUM'
+    
+    return breakout
 
-def classify_market_regime(df_micro, df_macro, vp_data, btc_pct_change, drift_detected):
+def classify_market_regime(df_micro, df_macro, vp_data, btc_pct_change, drift_detected, hurst=None, session=None,
+                           book_mode=None):
     """
     Comprehensive regime classification.
+    `session`: cached session-profile context (prior day/week value areas, naked POCs).
+    `book_mode`: universe drift verdict (BOOK_MODE); DEFENSIVE overrides every other regime.
     Returns regime info dict.
     """
     adx_4h = df_macro.iloc[-1].get('ADX_14', 0)
-    hurst = tools.calculate_hurst(df_macro)
+    if hurst is None:
+        hurst = tools.calculate_hurst(df_macro)
+    
+    # Priority 0: Book-wide drift (many symbols shifted at once)
+    if book_mode and book_mode.get('mode') == 'DEFENSIVE':
+        return {
+            'regime': 'UNCERTAIN',
+            'playbook': 'DEFENSIVE',
+            'bias': 'ONLY_IF_PERFECT',
+            'confidence_adjustment': -2,
+            'reason': f"Book-wide drift: {book_mode['reason']} - require exceptional setups"
+        }
     
-    breakout_info = detect_breakout(df_micro, vp_data)
+    breakout_info = detect_breakout(df_micro, vp_data, session)
     
     # Priority 1: Breakout (overrides everything)
     if breakout_info:
@@ -236,12 +343,14 @@ def classify_market_regime(df_micro, df_macro, vp_data, btc_pct_change, drift_de
             channel_width = (vp_data['VAH'] - vp_data['VAL']) / vp_data['POC']
         
         if channel_width > 0.02:  # Lowered from 2.5% to 2% to include tighter ranges
+            prior = (session or {}).get('prior_daily')
+            prior_str = f", Prior Day VA [{prior['VAL']:.2f} - {prior['VAH']:.2f}]" if prior else ""
             return {
                 'regime': 'RANGE',
                 'playbook': 'MEAN_REVERSION',
                 'bias': 'BIDIRECTIONAL',
                 'confidence_adjustment': 0,
-                'reason': f"Range-bound market (ADX {adx_4h:.1f}, Channel {channel_width*100:.1f}%)"
+                'reason': f"Range-bound market (ADX {adx_4h:.1f}, Channel {channel_width*100:.1f}%{prior_str})"
             }
     
     # Priority 4: Concept Drift (Defensive)
@@ -353,14 +462,130 @@ def calculate_position_size_by_regime(regime, account_balance, risk_pct, entry,
     
     return final_size
 
-def process_pair(symbol, btc_context_str, global_sentiment):
+def refresh_structure(symbol, df_macro, state=None):
+    """
+    STRUCTURE-LOOP: feeds the 4H structure tracker with the candles closed since its last update.
+    Uses closed candles only (the forming candle cannot confirm a swing or a break).
+    Swing history, bias and BOS/CHoCH events persist in state['market_structure'].
+    Returns the StructureTracker (snapshot() is O(1) per tick).
+    """
+    tracker = structure_book.tracker(symbol, TIMEFRAME_MACRO, state)
+    if df_macro is None or len(df_macro) < 2:
+        return tracker
+    
+    events_before = tracker.timeline(1)
+    processed = tracker.advance(df_macro.iloc[:-1], TIMEFRAME_MACRO)
+    if not processed:
+        return tracker
+    
+    last_event = tracker.timeline(1)
+    if last_event and last_event != events_before:
+        event = last_event[0]
+        logger.info(f"🏗️ {symbol} 4H {event['type']} {event['direction']}: close {event['close']:.2f} broke {event['level']:.2f} ({event['time']})")
+    logger.info(f"🏗️ {symbol} 4H structure advanced {processed} candle(s) | Bias: {tracker.bias}")
+    
+    if state is not None:
+        with STATE_LOCK:
+            state.setdefault('market_structure', {})[structure_key(symbol, TIMEFRAME_MACRO)] = tracker.to_dict()
+    return tracker
+
+
+def closed_history(symbol, df_micro):
+    """Stored 15m candles up to the last closed one (zero-copy); the closed part of df_micro if the store is empty."""
+    closed_ts = fc.last_closed_ts(df_micro)
+    if closed_ts is None:
+        return None
+    history = CandleFrame.from_store(symbol, TIMEFRAME_MICRO).until(closed_ts)
+    if history.empty:
+        history = CandleFrame.from_dataframe(df_micro.iloc[:-1])
+    return history
+
+
+def refresh_session_profiles(symbol, df_micro):
+    """
+    SESSION PROFILES: feeds the daily/weekly session profiles with the 15m candles closed
+    since the last update (the whole stored history on first use). Finished sessions are
+    persisted once per session. Returns the cached context (prior POC/VAH/VAL, naked POCs).
+    """
+    history = closed_history(symbol, df_micro)
+    if history is None:
+        return session_book.context(symbol)
+    return session_book.update(symbol, history).context()
+
+
+def refresh_drift(symbol, df_micro):
+    """
+    CONCEPT DRIFT: feeds the symbol's streaming drift monitor with the 15m candles closed
+    since the last update. The baseline (up to mm.DRIFT_BASELINE returns) is seeded from
+    the candle store, not from the 100-candle fetch. Returns the drift snapshot.
+    """
+    history = closed_history(symbol, df_micro)
+    if history is None:
+        return mm.drift_book.monitor(symbol).snapshot()
+    return mm.drift_book.update(symbol, history).snapshot()
+
+
+def scan_gatekeeper(symbols):
+    """
+    GATEKEEPER SCAN: ADX / RSI / Bollinger for every pair in one BatchIndicators pass over the
+    stored 15m windows (right-aligned: a lagging pair never blanks the others). None on failure,
+    process_pair then computes its own gate.
+    """
+    try:
+        stacked = stack_from_store(symbols, TIMEFRAME_MICRO, MICRO_WINDOW, right_align=True)
+        if not stacked['close'].size:
+            return None
+        return BatchIndicators(stacked, GATEKEEPER_COLUMNS, stage='gatekeeper')
+    except Exception as e:
+        logger.warning(f"Gatekeeper scan failed: {e}")
+        return None
+
+
+def refresh_book_mode(symbols):
+    """
+    BOOK MODE: KS drift matrix (1d/1w, 1d/1m, 1w/1m windows) for the whole universe from
+    the candle store. Switches the book to DEFENSIVE when many symbols shift at once.
+    """
+    global BOOK_MODE
+    try:
+        scan = drift_scan.scan_universe(symbols, TIMEFRAME_MICRO)
+        mode = scan.book_mode()
+    except Exception as e:
+        logger.warning(f"Drift scan failed: {e}")
+        return BOOK_MODE
+    if mode['mode'] != BOOK_MODE['mode']:
+        icon = "🛡️" if mode['mode'] == 'DEFENSIVE' else "✅"
+        logger.warning(f"{icon} BOOK MODE {BOOK_MODE['mode']} -> {mode['mode']}: {mode['reason']}")
+    BOOK_MODE = mode
+    return mode
+
+
+def refresh_levels(symbol, df_micro, df_macro):
+    """
+    Feeds the symbol's S/R level index with the swings confirmed on 15m, 1h and 4h since
+    its last update (closed candles only). 1h is resampled from the local 15m store.
+    Returns the LevelIndex (nearest/in-zone queries are O(log n) bisects).
+    """
+    df_1h = resampled_window(symbol, '1h', 200)
+    frames = {
+        TIMEFRAME_MICRO: df_micro.iloc[:-1] if df_micro is not None else None,
+        '1h': df_1h.iloc[:-1] if not df_1h.empty else None,
+        TIMEFRAME_MACRO: df_macro.iloc[:-1] if df_macro is not None else None
+    }
+    return level_book.update(symbol, frames)
+
+def process_pair(symbol, btc_context_str, global_sentiment, state=None, df_micro=None, df_macro=None, gate=None):
     """
     Analyzes and manages a single pair.
+    Safe to run concurrently: 'state' is the cycle's shared state dict (mutations under STATE_LOCK;
+    Telegram and state.json writes happen after releasing it). Pre-fetched candles and the cycle's
+    gatekeeper scan ('gate') can be passed in by the async orchestrator.
     Returns True if AI analysis was performed (used for rate limiting).
     """
     logger.info(f"--- Processing {symbol} ---")
     
-    state = tools.read_state()
+    if state is None:
+        state = tools.read_state()
     constitution = tools.read_constitution()
     strategy = tools.read_strategy()
     
@@ -371,15 +596,28 @@ def process_pair(symbol, btc_context_str, global_sentiment):
     # 2. Fetch Data (MICRO FIRST)
     try:
         # --- PASO 1: MICRO (15m) ---
-        df_micro = tools.fetch_market_data(symbol, TIMEFRAME_MICRO, limit=100)
-        df_micro = tools.calculate_indicators(df_micro)
-        
-        if df_micro.empty:
+        if df_micro is None:
+            # One base (15m) download; the 4h window is resampled from the same store
+            frames = tools.fetch_timeframes(symbol, {TIMEFRAME_MICRO: MICRO_WINDOW, TIMEFRAME_MACRO: 252})
+            df_micro = frames[TIMEFRAME_MICRO]
+            if df_macro is None:
+                df_macro = frames[TIMEFRAME_MACRO]
+        if len(df_micro) < 21:
              logger.warning(f"Insufficient data for {symbol} (MICRO). Skipping.")
              return False
         
         # --- PASO 2: FILTRO (Gatekeeper) en 15m ---
-        is_interesting, gate_reason = check_gatekeeper(df_micro)
+        # Lazy graph: only ADX / RSI / Bollinger (and their inputs) for pairs that may be skipped.
+        # The orchestrator's batched scan already has them for every pair; standalone calls compute their own.
+        gate_frame = gate.frame(symbol, GATEKEEPER_COLUMNS) if gate is not None and symbol in gate.symbols else None
+        batched = gate_frame is not None and not gate_frame.empty
+        if batched:
+            pulled = {'gatekeeper': list(gate.lazy.pulled.get('gatekeeper', []))} # This pair's row of the shared pass
+        else:
+            lazy_micro = LazyFeatures.from_frame(df_micro)
+            gate_frame = lazy_micro.frame(GATEKEEPER_COLUMNS, stage='gatekeeper')
+            pulled = lazy_micro.pulled
+        is_interesting, gate_reason = check_gatekeeper(gate_frame)
         
         current_positions = state.get('current_positions', [])
         has_open_position = any(p['symbol'] == symbol for p in current_positions)
@@ -394,7 +632,8 @@ def process_pair(symbol, btc_context_str, global_sentiment):
             has_open_position = True # Force recognition just in case
         
         if not is_interesting and not has_open_position and not is_manual_close:
-            logger.info(f">> Skipping {symbol}: {gate_reason} (Token Saver Mode)")
+            pulled_str = " | ".join(f"{stage}: {len(names)}" for stage, names in pulled.items())
+            logger.info(f">> Skipping {symbol}: {gate_reason} (Token Saver Mode) | Features pulled: {pulled_str}")
             return False
             
         if has_open_position:
@@ -402,26 +641,37 @@ def process_pair(symbol, btc_context_str, global_sentiment):
             pass # Silent continue
         else:
             logger.info(f"[OK] CANDIDATE DETECTED: {symbol} [{gate_reason}]. Fetching MACRO...")
+        
+        # Full indicator suite only for pairs that passed the gate: the persisted engine state keeps
+        # long EMAs (EMA_200) seeded beyond the 100-candle gate window, one pass per 15m close
+        df_micro = fc.cached_indicators(symbol, TIMEFRAME_MICRO, df_micro)
+        if df_micro.empty:
+             logger.warning(f"Insufficient data for {symbol} (MICRO). Skipping.")
+             return False
+        
+        # Publish for the micro-loop (trailing distance needs ATR, never recomputes it)
+        MARKET_CONTEXT.setdefault(symbol, {}).update({
+            'atr': float(df_micro.iloc[-1].get('ATR_14', 0)),
+            'features_pulled': pulled,
+            'updated_at': time.time()
+        })
 
         # --- PASO 3: MACRO (4h) ---
-        # Solo descargamos esto si pasa el filtro (Ahorro de API de Exchange y proceso)
+        # Resampleado desde las velas de 15m (sin requests extra)
         # 252 velas = ~6 semanas de historia para BOS/CHoCH detection
-        df_macro = tools.fetch_market_data(symbol, TIMEFRAME_MACRO, limit=252)
-        df_macro = tools.calculate_indicators(df_macro)
+        # Hurst reads the raw closes (indicator warm-up rows are dropped below)
+        hurst_data = fc.cached_hurst_profile(symbol, TIMEFRAME_MACRO, df_macro) # Once per 4h close
+        df_macro = fc.cached_indicators(symbol, TIMEFRAME_MACRO, df_macro) # Full pass only on 4h close
 
         # === MARKET STRUCTURE ANALYSIS (4H) ===
         current_price = tools.get_current_price(symbol)
-        swing_highs_4h, swing_lows_4h = tools.detect_swing_points(df_macro, lookback=5)
-        structure_4h = tools.detect_market_structure(swing_highs_4h, swing_lows_4h, current_price)
+        structure_4h = refresh_structure(symbol, df_macro, state).snapshot(current_price) # O(1) between 4h closes
         
-        # === S/R LEVELS (15m) ===
-        sr_levels_15m = tools.calculate_sr_levels(df_micro, num_levels=5, lookback=3)
-        near_resistance, res_level, res_dist = tools.check_proximity_to_level(
-            current_price, sr_levels_15m['resistances'], threshold_pct=0.20
-        )
-        near_support, sup_level, sup_dist = tools.check_proximity_to_level(
-            current_price, sr_levels_15m['supports'], threshold_pct=0.20
-        )
+        # === S/R ZONES (15m/1h/4h) ===
+        levels = refresh_levels(symbol, df_micro, df_macro)
+        sr_levels_15m = levels.sr_levels(current_price, num_levels=5)
+        near_resistance, res_level, res_dist = levels.proximity(current_price, 'resistance', threshold_pct=0.20)
+        near_support, sup_level, sup_dist = levels.proximity(current_price, 'support', threshold_pct=0.20)
         
         # Log structure for debugging
         logger.info(f"📊 {symbol} Structure 4H: {structure_4h['bias']} | BOS: {structure_4h['bos_detected']} | CHoCH: {structure_4h['choch_detected']}")
@@ -437,14 +687,23 @@ def process_pair(symbol, btc_context_str, global_sentiment):
         
         # --- QUANT METRICS (Regime & VPIN Pro) ---
         regime_data = tools.get_market_regime(df_micro)
-        vpin_score = flow.calculate_vpin_pro(df_micro)
+        vpin_score = fc.cached_vpin(symbol, TIMEFRAME_MICRO, df_micro)
+        trade_flow = trade_flow_book.snapshot(symbol)
+        if trade_flow and trade_flow['ready']:
+            vpin_score = trade_flow['vpin'] # True aggressor-side buckets beat the OHLC proxy
+            MARKET_CONTEXT[symbol]['order_flow'] = trade_flow
         regime_data['vpin'] = vpin_score # Combine for context
+        flow_str = (f"Order Flow (aggTrades): CVD {trade_flow['cvd']:+.2f} | "
+                    f"Delta 1m: {trade_flow['delta']:+.2f} | "
+                    f"Intensity: {trade_flow['trades_per_sec']:.1f} trades/s\n"
+                    if trade_flow and trade_flow['ready'] else "")
         
-        smc_data = tools.calculate_smart_money(df_micro)
-        hurst_val = tools.calculate_hurst(df_macro)
+        smc_data = fc.cached_smart_money(symbol, TIMEFRAME_MICRO, df_micro)
+        hurst_val = hurst_data['hurst']
         
         # --- VOLUME PROFILE (POC, VAH, VAL) ---
-        vp_data = mp.calculate_volume_profile(df_micro)
+        vp_data = fc.cached_volume_profile(symbol, TIMEFRAME_MICRO, df_micro)
+        session_ctx = refresh_session_profiles(symbol, df_micro) # Developing session: one candle per close
         
         # --- BTC VOLATILITY CONTEXT ---
         btc_pct = 0.0
@@ -453,12 +712,16 @@ def process_pair(symbol, btc_context_str, global_sentiment):
              btc_pct = float(btc_context_str.split('%')[0].split(':')[-1].strip())
         except: pass
         
-        # --- CONCEPT DRIFT DETECTION (KS-TEST) ---
-        # Compare last 50 candles (current) vs prior 50-200 (baseline)
-        drift_data = mm.detect_drift(df_micro['close'].iloc[-50:], df_micro['close'].iloc[-200:-50])
+        # --- CONCEPT DRIFT DETECTION (KS + PAGE-HINKLEY, STREAMING) ---
+        # Last 50 returns vs a rolling baseline of up to 2000 stored returns
+        drift_data = refresh_drift(symbol, df_micro)
+        MARKET_CONTEXT[symbol]['hurst'] = hurst_data
+        MARKET_CONTEXT[symbol]['drift'] = dict(drift_data, history=mm.drift_book.monitor(symbol).history(10))
+        book_mode = BOOK_MODE
         
         # --- REGIME CLASSIFICATION (OMNIDIRECTIONAL) ---
-        regime_info = classify_market_regime(df_micro, df_macro, vp_data, btc_pct, drift_data['drift_detected'])
+        regime_info = classify_market_regime(df_micro, df_macro, vp_data, btc_pct, drift_data['drift_detected'], hurst=hurst_val,
+                                             session=session_ctx, book_mode=book_mode)
         
         # Extract for Logging & Context
         regime_type = regime_info['regime']
@@ -468,13 +731,17 @@ def process_pair(symbol, btc_context_str, global_sentiment):
         vol_recent = df_micro.iloc[-5:]['volume'].mean()
         vol_older = df_micro.iloc[-20:-5]['volume'].mean() if len(df_micro) >= 20 else vol_recent
         trend_state_info = detect_trend_state(df_micro, df_macro, vol_recent, vol_older)
+        MARKET_CONTEXT[symbol].update({'regime_data': regime_data, 'trend_state': trend_state_info})
 
         
         smc_context_str = f"--- MARKET PHYSICS (QUANT) ---\n" \
                           f"Regime: {regime_type} (Playbook: {playbook})\n" \
                           f"Bias: {regime_info['bias']}\n" \
                           f"Reason: {regime_info['reason']}\n" \
-                          f"Hurst: {hurst_val:.2f} | VPIN: {vpin_score}\n\n" \
+                          f"Hurst: {hurst_val:.2f} | VPIN: {vpin_score}\n" \
+                          f"{render_hurst(hurst_data)}\n" \
+                          f"{flow_str}\n" \
+                          f"Book Drift: {book_mode['mode']} ({book_mode['reason']})\n" \
                           f"{trend_state_info['icon']} TREND STATE: {trend_state_info['state']}\n" \
                           f"  - Micro ADX: {trend_state_info['micro_adx']:.1f} (momentum: {trend_state_info['adx_momentum']:+.1f})\n" \
                           f"  - Macro ADX: {trend_state_info['macro_adx']:.1f}\n" \
@@ -482,9 +749,12 @@ def process_pair(symbol, btc_context_str, global_sentiment):
                           f"{structure_context_str}\n\n" \
                           f"--- VOLUME PROFILE (15m) ---\n" \
                           f"{vp_data['profile_str']}\n\n" \
+                          f"--- SESSION PROFILES (UTC) ---\n" \
+                          f"{render_sessions(session_ctx, current_price)}\n\n" \
                           f"--- SMART MONEY CONCEPTS (15m) ---\n" \
-                          f"FAIR VALUE GAPS:\n{smc_data['fvg_str']}\n\n" \
-                          f"LIQUIDITY POOLS (Swing Highs/Lows):\n{smc_data['liquidity_str']}\n\n" \
+                          f"FAIR VALUE GAPS:\n{smc.render_fvgs(smc_data)}\n\n" \
+                          f"LIQUIDITY POOLS (Swing Highs/Lows):\n{smc.render_liquidity(smc_data)}\n" \
+                          f"{smc.render_pools(smc_data, current_price)}\n\n" \
                           f"CANDLE PATTERNS (Vision):\n{smc_data.get('patterns_str', 'None')}"
 
 
@@ -520,16 +790,17 @@ def process_pair(symbol, btc_context_str, global_sentiment):
     
     if should_call_ai:
         logger.info(f"Requesting AI decision for {symbol} (Playbook: {playbook})...")
-        decision_packet = brain.analyze_market_omnidirectional(
-            summary_micro=summary_micro, 
-            summary_macro=summary_macro, 
-            regime_info=regime_info,
-            strategy_content=strategy, 
-            constitution_content=constitution, 
-            sentiment_text=sentiment,
-            btc_context_str=btc_context_str,
-            smc_context_str=smc_context_str
-        )
+        with AI_SEMAPHORE:
+            decision_packet = brain.analyze_market_omnidirectional(
+                summary_micro=summary_micro, 
+                summary_macro=summary_macro, 
+                regime_info=regime_info,
+                strategy_content=strategy, 
+                constitution_content=constitution, 
+                sentiment_text=sentiment,
+                btc_context_str=btc_context_str,
+                smc_context_str=smc_context_str
+            )
         decision = decision_packet.get("decision", "HOLD").upper()
         reason = decision_packet.get("reason", "No reason provided")
         confidence = int(decision_packet.get("confidence", 0))
@@ -539,311 +810,514 @@ def process_pair(symbol, btc_context_str, global_sentiment):
         logger.info(f"AI Decision ({symbol}): {decision} [Confidence: {confidence}/10]")
         
         # Update Timestamp (init dict if needed)
-        if 'last_ai_analysis' not in state: state['last_ai_analysis'] = {}
-        state['last_ai_analysis'][symbol] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-        tools.write_state(state) # Persist immediately
+        with STATE_LOCK:
+            if 'last_ai_analysis' not in state: state['last_ai_analysis'] = {}
+            state['last_ai_analysis'][symbol] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+        save_state(state) # Persist immediately
     else:
         logger.debug(f"Skipping AI for {symbol} (Analysed {int(seconds_since_analysis/60)}m ago)")
 
-    # 4. Execution Logic (Runs EVERY TICK for Trailing/SL/TP)
-    # We pass 'decision' down. If AI was skipped, decision is HOLD, 
-    # BUT Trailing Logic below can override it to "SELL" / "BUY" if stops are hit.
-    my_positions = [p for p in state.get('current_positions', []) if p['symbol'] == symbol]
+    outbox = [] # Telegram / radiography / lessons, run once STATE_LOCK is released
+    with STATE_LOCK:
+        # 4. Execution Logic (Runs EVERY TICK for Trailing/SL/TP)
+        # We pass 'decision' down. If AI was skipped, decision is HOLD, 
+        # BUT Trailing Logic below can override it to "SELL" / "BUY" if stops are hit.
+        my_positions = [p for p in state.get('current_positions', []) if p['symbol'] == symbol]
 
     
-    trade_executed = False
+        trade_executed = False
     
-    # helper to safe cast
-    def safe_float(val):
-        try: return float(val)
-        except: return None
+        # helper to safe cast
+        def safe_float(val):
+            try: return float(val)
+            except: return None
 
-    stop_loss_price = safe_float(stop_loss_price)
-    take_profit_price = safe_float(take_profit_price)
+        stop_loss_price = safe_float(stop_loss_price)
+        take_profit_price = safe_float(take_profit_price)
     
-    # --- SL LOGIC GUARD (Prevent AI Hallucinations) ---
-    if stop_loss_price and current_price > 0:
-        # Calculate backup ATR for safety
-        atr_guard = df_micro.iloc[-1].get('ATR_14', current_price * 0.01)
+        # --- SL LOGIC GUARD (Prevent AI Hallucinations) ---
+        if stop_loss_price and current_price > 0:
+            # Calculate backup ATR for safety
+            atr_guard = df_micro.iloc[-1].get('ATR_14', current_price * 0.01)
         
-        if decision == "BUY" and stop_loss_price >= current_price:
-             old_sl = stop_loss_price
-             stop_loss_price = current_price - (2.0 * atr_guard)
-             logger.warning(f"⚠️ SL FIXED: AI proposed LONG SL {old_sl} >= Entry {current_price}. Corrected to {stop_loss_price:.5f}")
+            if decision == "BUY" and stop_loss_price >= current_price:
+                 old_sl = stop_loss_price
+                 stop_loss_price = current_price - (2.0 * atr_guard)
+                 logger.warning(f"⚠️ SL FIXED: AI proposed LONG SL {old_sl} >= Entry {current_price}. Corrected to {stop_loss_price:.5f}")
              
-        elif decision == "SELL" and stop_loss_price <= current_price:
-             old_sl = stop_loss_price
-             # For Shorts, SL must be ABOVE entry
-             stop_loss_price = current_price + (2.0 * atr_guard)
-             logger.warning(f"⚠️ SL FIXED: AI proposed SHORT SL {old_sl} <= Entry {current_price}. Corrected to {stop_loss_price:.5f}")
+            elif decision == "SELL" and stop_loss_price <= current_price:
+                 old_sl = stop_loss_price
+                 # For Shorts, SL must be ABOVE entry
+                 stop_loss_price = current_price + (2.0 * atr_guard)
+                 logger.warning(f"⚠️ SL FIXED: AI proposed SHORT SL {old_sl} <= Entry {current_price}. Corrected to {stop_loss_price:.5f}")
     
-    if not my_positions:
-        # DEBUG TRACE
-        print(f"DEBUG: NO POSITION for {symbol}")
-        # NO POSITION - CHECK CONFIDENCE
-        total_open_positions = len(state.get('current_positions', []))
-        MAX_CONCURRENT = 3 # RISK GUARD: Max 3 positions at once
-
-        if total_open_positions >= MAX_CONCURRENT and decision != "HOLD":
-             logger.warning(f"🚫 MAX POSITIONS ({MAX_CONCURRENT}) REACHED. Ignoring Entry for {symbol}.")
-             decision = "HOLD"
-
-        if confidence < 5 and decision != "HOLD":
-            logger.info(f"Decision {decision} ignored due to LOW CONFIDENCE ({confidence}/10).")
-            decision = "HOLD" # Force Hold
-
-        # === STRUCTURE-BASED ENTRY FILTER ===
-        # This filter ensures we only enter WITH structure (4H) and near S/R (15m)
-        structure_filter_passed = True
-        structure_filter_reason = ""
+        if not my_positions:
+            # DEBUG TRACE
+            print(f"DEBUG: NO POSITION for {symbol}")
+            # NO POSITION - CHECK CONFIDENCE
+            total_open_positions = len(state.get('current_positions', []))
+            MAX_CONCURRENT = 3 # RISK GUARD: Max 3 positions at once
+
+            if total_open_positions >= MAX_CONCURRENT and decision != "HOLD":
+                 logger.warning(f"🚫 MAX POSITIONS ({MAX_CONCURRENT}) REACHED. Ignoring Entry for {symbol}.")
+                 decision = "HOLD"
+
+            if confidence < 5 and decision != "HOLD":
+                logger.info(f"Decision {decision} ignored due to LOW CONFIDENCE ({confidence}/10).")
+                decision = "HOLD" # Force Hold
+
+            # === STRUCTURE-BASED ENTRY FILTER ===
+            # This filter ensures we only enter WITH structure (4H) and near S/R (15m)
+            structure_filter_passed = True
+            structure_filter_reason = ""
         
-        if decision != "HOLD" and structure_4h['structure_valid']:
-            bias = structure_4h['bias']
-            
-            # Rule 1: Don't trade against the 4H structure
-            if bias == 'BEARISH' and decision == "BUY":
-                structure_filter_passed = False
-                structure_filter_reason = f"BLOCKED: 4H Structure is BEARISH, no LONG allowed"
-            elif bias == 'BULLISH' and decision == "SELL":
-                structure_filter_passed = False
-                structure_filter_reason = f"BLOCKED: 4H Structure is BULLISH, no SHORT allowed"
+            if decision != "HOLD" and structure_4h['structure_valid']:
+                bias = structure_4h['bias']
             
-            # Rule 2: Require proximity to S/R for entry
-            if structure_filter_passed:
-                if decision == "SELL" and not near_resistance:
+                # Rule 1: Don't trade against the 4H structure
+                if bias == 'BEARISH' and decision == "BUY":
                     structure_filter_passed = False
-                    structure_filter_reason = f"WAIT: SHORT signal but not near resistance (nearest: {res_level})"
-                elif decision == "BUY" and not near_support:
+                    structure_filter_reason = f"BLOCKED: 4H Structure is BEARISH, no LONG allowed"
+                elif bias == 'BULLISH' and decision == "SELL":
                     structure_filter_passed = False
-                    structure_filter_reason = f"WAIT: LONG signal but not near support (nearest: {sup_level})"
+                    structure_filter_reason = f"BLOCKED: 4H Structure is BULLISH, no SHORT allowed"
             
-            # Rule 3: If CHoCH detected, pause all entries
-            if structure_4h['choch_detected']:
-                structure_filter_passed = False
-                structure_filter_reason = f"PAUSE: CHoCH detected on 4H - waiting for structure confirmation"
-                logger.warning(f"⚠️ CHoCH DETECTED for {symbol} - Entry paused")
+                # Rule 2: Require proximity to S/R for entry
+                if structure_filter_passed:
+                    if decision == "SELL" and not near_resistance:
+                        structure_filter_passed = False
+                        structure_filter_reason = f"WAIT: SHORT signal but not near resistance (nearest: {res_level})"
+                    elif decision == "BUY" and not near_support:
+                        structure_filter_passed = False
+                        structure_filter_reason = f"WAIT: LONG signal but not near support (nearest: {sup_level})"
             
-            if not structure_filter_passed:
-                logger.info(f"🚫 STRUCTURE FILTER: {structure_filter_reason}")
-                decision = "HOLD"
-            else:
-                logger.info(f"✅ STRUCTURE FILTER PASSED: {bias} bias, entry aligned with S/R")
-
-
-        size = 0.0
-        if stop_loss_price and decision != "HOLD":
-            # --- OMNIDIRECTIONAL SIZING ---
-            raw_size = calculate_position_size_by_regime(
-                regime=regime_info['regime'],
-                account_balance=state.get("account_balance", 10000.0),
-                risk_pct=2.0,
-                entry=current_price,
-                sl=stop_loss_price
-            )
+                # Rule 2b: Don't enter straight into an open opposing FVG (SMC records, 15m)
+                if structure_filter_passed:
+                    opposing_fvg = smc.fvg_against(smc_data, current_price, decision, max_dist_pct=0.20)
+                    if opposing_fvg:
+                        structure_filter_passed = False
+                        structure_filter_reason = (f"WAIT: {decision} into open FVG "
+                                                   f"{opposing_fvg['bottom']:.4f}-{opposing_fvg['top']:.4f} "
+                                                   f"({opposing_fvg['distance_pct']:.2f}% away)")
             
-            # --- DYNAMIC ALLOCATION (Based on Confidence) ---
-            allocation_pct = 1.0 # Default 100%
-            if confidence >= 9:
-                allocation_pct = 1.0
-                logger.info(f"High Confidence ({confidence}/10): Using 100% Allocation.")
-            elif confidence >= 7:
-                allocation_pct = 0.75
-                logger.info(f"Mid-High Confidence ({confidence}/10): Using 75% Allocation.")
-            elif confidence >= 5:
-                allocation_pct = 0.50
-                logger.info(f"Mid Confidence ({confidence}/10): Using 50% Allocation.")
-            else:
-                 allocation_pct = 0.0 # Should be filtered by <5 check above, but purely safe
-                 logger.info(f"Low Confidence ({confidence}/10): Skipping.")
+                # Rule 3: If CHoCH detected, pause all entries
+                if structure_4h['choch_detected']:
+                    structure_filter_passed = False
+                    structure_filter_reason = f"PAUSE: CHoCH detected on 4H - waiting for structure confirmation"
+                    logger.warning(f"⚠️ CHoCH DETECTED for {symbol} - Entry paused")
+            
+                if not structure_filter_passed:
+                    logger.info(f"🚫 STRUCTURE FILTER: {structure_filter_reason}")
+                    decision = "HOLD"
+                else:
+                    logger.info(f"✅ STRUCTURE FILTER PASSED: {bias} bias, entry aligned with S/R")
+
+
+            size = 0.0
+            if stop_loss_price and decision != "HOLD":
+                # --- OMNIDIRECTIONAL SIZING ---
+                raw_size = calculate_position_size_by_regime(
+                    regime=regime_info['regime'],
+                    account_balance=state.get("account_balance", 10000.0),
+                    risk_pct=2.0,
+                    entry=current_price,
+                    sl=stop_loss_price
+                )
             
-            size = raw_size * allocation_pct
+                # --- DYNAMIC ALLOCATION (Based on Confidence) ---
+                allocation_pct = 1.0 # Default 100%
+                if confidence >= 9:
+                    allocation_pct = 1.0
+                    logger.info(f"High Confidence ({confidence}/10): Using 100% Allocation.")
+                elif confidence >= 7:
+                    allocation_pct = 0.75
+                    logger.info(f"Mid-High Confidence ({confidence}/10): Using 75% Allocation.")
+                elif confidence >= 5:
+                    allocation_pct = 0.50
+                    logger.info(f"Mid Confidence ({confidence}/10): Using 50% Allocation.")
+                else:
+                     allocation_pct = 0.0 # Should be filtered by <5 check above, but purely safe
+                     logger.info(f"Low Confidence ({confidence}/10): Skipping.")
             
-            # --- SAFETY NET: Ensure TP Exists ---
-            if not take_profit_price and stop_loss_price:
-                risk = abs(current_price - stop_loss_price)
-                # Default 2R Target
-                if decision == "BUY":
-                    take_profit_price = current_price + (risk * 2.0)
-                elif decision == "SELL":
-                    take_profit_price = current_price - (risk * 2.0)
-                logger.info(f"⚠️ AI missing TP. Calculated Safety Net TP: {take_profit_price:.4f} (2R)")
-            elif not take_profit_price:
-                 # Fallback if even SL is missing (unlikely due to Trading Tools)
-                 atr_fallback = df_micro.iloc[-1].get('ATR_14', current_price*0.01)
-                 if decision == "BUY": take_profit_price = current_price + (3 * atr_fallback)
-                 elif decision == "SELL": take_profit_price = current_price - (3 * atr_fallback)
+                size = raw_size * allocation_pct
             
-        if decision == "BUY":
-            if size > 0:
-                # Count existing trades for numbering
-                trade_num = len(state.get('trade_history', [])) + 1
+                # --- SAFETY NET: Ensure TP Exists ---
+                if not take_profit_price and stop_loss_price:
+                    risk = abs(current_price - stop_loss_price)
+                    # Default 2R Target
+                    if decision == "BUY":
+                        take_profit_price = current_price + (risk * 2.0)
+                    elif decision == "SELL":
+                        take_profit_price = current_price - (risk * 2.0)
+                    logger.info(f"⚠️ AI missing TP. Calculated Safety Net TP: {take_profit_price:.4f} (2R)")
+                elif not take_profit_price:
+                     # Fallback if even SL is missing (unlikely due to Trading Tools)
+                     atr_fallback = df_micro.iloc[-1].get('ATR_14', current_price*0.01)
+                     if decision == "BUY": take_profit_price = current_price + (3 * atr_fallback)
+                     elif decision == "SELL": take_profit_price = current_price - (3 * atr_fallback)
+            
+            if decision == "BUY":
+                if size > 0:
+                    # Count existing trades for numbering
+                    trade_num = len(state.get('trade_history', [])) + 1
                 
-                entry = {
-                    "symbol": symbol,
-                    "type": "LONG",
-                    "entry_price": current_price,
-                    "quantity": size,
-                    "entry_time": datetime.now(timezone(timedelta(hours=-6))).strftime("%Y-%m-%d %H:%M:%S UTC-6"),
-                    "stop_loss": stop_loss_price,
-                    "initial_stop_loss": stop_loss_price, # SAVE ORIGINAL
-                    "take_profit": take_profit_price,
-                    "reason": decision_packet.get("reason"),
-                    "regime_at_entry": regime_data,
-                    "strategy_used": regime_type, # TAG FOR META-LEARNER
-                    "current_price": current_price,
-                    "last_update": datetime.now(timezone(timedelta(hours=-6))).strftime("%Y-%m-%d %H:%M:%S UTC-6")
-                }
-                state['current_positions'].append(entry)
+                    entry = {
+                        "symbol": symbol,
+                        "type": "LONG",
+                        "entry_price": current_price,
+                        "quantity": size,
+                        "entry_time": datetime.now(timezone(timedelta(hours=-6))).strftime("%Y-%m-%d %H:%M:%S UTC-6"),
+                        "stop_loss": stop_loss_price,
+                        "initial_stop_loss": stop_loss_price, # SAVE ORIGINAL
+                        "take_profit": take_profit_price,
+                        "reason": decision_packet.get("reason"),
+                        "regime_at_entry": regime_data,
+                        "strategy_used": regime_type, # TAG FOR META-LEARNER
+                        "current_price": current_price,
+                        "last_update": datetime.now(timezone(timedelta(hours=-6))).strftime("%Y-%m-%d %H:%M:%S UTC-6")
+                    }
+                    state['current_positions'].append(entry)
                 
-                # LOG TO RADIOGRAPHY
-                log_radiography('ENTRY', {
-                    'trade_num': trade_num,
-                    'type': 'LONG',
-                    'entry_price': current_price,
-                    'sl': stop_loss_price,
-                    'tp': take_profit_price,
-                    'reason': decision_packet.get("reason", "-")
-                })
+                    # LOG TO RADIOGRAPHY
+                    defer(outbox, log_radiography, 'ENTRY', {
+                        'trade_num': trade_num,
+                        'type': 'LONG',
+                        'entry_price': current_price,
+                        'sl': stop_loss_price,
+                        'tp': take_profit_price,
+                        'reason': decision_packet.get("reason", "-")
+                    })
                 
-                msg = f"[LONG] **OPEN LONG** {symbol}\nPrice: {current_price}\nSize: {size:.4f} (Conf: {confidence})\nSL: {stop_loss_price}"
-                logger.info(msg)
-                tools.send_telegram_message(msg)
-                trade_executed = True
+                    msg = f"[LONG] **OPEN LONG** {symbol}\nPrice: {current_price}\nSize: {size:.4f} (Conf: {confidence})\nSL: {stop_loss_price}"
+                    logger.info(msg)
+                    notify(outbox, msg)
+                    trade_executed = True
 
                 
-        elif decision == "SELL":
-             if size > 0:
-                # Count existing trades for numbering
-                trade_num = len(state.get('trade_history', [])) + 1
+            elif decision == "SELL":
+                 if size > 0:
+                    # Count existing trades for numbering
+                    trade_num = len(state.get('trade_history', [])) + 1
                 
-                entry = {
-                    "symbol": symbol,
-                    "type": "SHORT",
-                    "entry_price": current_price,
-                    "quantity": size,
-                    "entry_time": datetime.now(timezone(timedelta(hours=-6))).strftime("%Y-%m-%d %H:%M:%S UTC-6"),
-                    "stop_loss": stop_loss_price,
-                    "initial_stop_loss": stop_loss_price, # SAVE ORIGINAL
-                    "take_profit": take_profit_price,
-                    "reason": decision_packet.get("reason"),
-                    "regime_at_entry": regime_data,
-                    "strategy_used": regime_type, # TAG FOR META-LEARNER
-                    "current_price": current_price,
-                    "last_update": datetime.now(timezone(timedelta(hours=-6))).strftime("%Y-%m-%d %H:%M:%S UTC-6")
-                }
-                state['current_positions'].append(entry)
+                    entry = {
+                        "symbol": symbol,
+                        "type": "SHORT",
+                        "entry_price": current_price,
+                        "quantity": size,
+                        "entry_time": datetime.now(timezone(timedelta(hours=-6))).strftime("%Y-%m-%d %H:%M:%S UTC-6"),
+                        "stop_loss": stop_loss_price,
+                        "initial_stop_loss": stop_loss_price, # SAVE ORIGINAL
+                        "take_profit": take_profit_price,
+                        "reason": decision_packet.get("reason"),
+                        "regime_at_entry": regime_data,
+                        "strategy_used": regime_type, # TAG FOR META-LEARNER
+                        "current_price": current_price,
+                        "last_update": datetime.now(timezone(timedelta(hours=-6))).strftime("%Y-%m-%d %H:%M:%S UTC-6")
+                    }
+                    state['current_positions'].append(entry)
                 
-                # LOG TO RADIOGRAPHY
-                log_radiography('ENTRY', {
-                    'trade_num': trade_num,
-                    'type': 'SHORT',
-                    'entry_price': current_price,
-                    'sl': stop_loss_price,
-                    'tp': take_profit_price,
-                    'reason': decision_packet.get("reason", "-")
-                })
+                    # LOG TO RADIOGRAPHY
+                    defer(outbox, log_radiography, 'ENTRY', {
+                        'trade_num': trade_num,
+                        'type': 'SHORT',
+                        'entry_price': current_price,
+                        'sl': stop_loss_price,
+                        'tp': take_profit_price,
+                        'reason': decision_packet.get("reason", "-")
+                    })
                 
-                msg = f"[SHORT] **OPEN SHORT** {symbol}\nPrice: {current_price}\nSize: {size:.4f} (Conf: {confidence})\nSL: {stop_loss_price}"
-                logger.info(msg)
-                tools.send_telegram_message(msg)
-                trade_executed = True
+                    msg = f"[SHORT] **OPEN SHORT** {symbol}\nPrice: {current_price}\nSize: {size:.4f} (Conf: {confidence})\nSL: {stop_loss_price}"
+                    logger.info(msg)
+                    notify(outbox, msg)
+                    trade_executed = True
 
 
-    else:
-        # EXISTING POSITION
-        # DEBUG TRACE
-        print(f"DEBUG: EXISTING POS for {symbol}")
-        
-        decision = "HOLD" # Initialize default to prevent UnboundLocalError
-        pos = my_positions[0]
-        pos_type = pos['type']
-        entry_price = float(pos['entry_price'])
-        quantity = pos.get('quantity', 0.0)
-        # Ensure we have a stop_loss, even if None initially (safety)
-        current_sl = float(pos.get('stop_loss') or (entry_price * 0.95 if pos_type == 'LONG' else entry_price * 1.05))
-        
-        # Define Take Profit & Distance for BE Logic
-        take_profit = float(pos.get('take_profit', 0) or 0)
-        if take_profit > 0:
-            tp_dist = abs(take_profit - entry_price)
         else:
-            tp_dist = float('inf') # Infinite distance if no TP
+            # EXISTING POSITION
+            # Trailing / SL / TP / Manual Close run in the MICRO-LOOP (manage_position_tick).
+            # Here only trend-state management that needs fresh indicators.
+            # DEBUG TRACE
+            print(f"DEBUG: EXISTING POS for {symbol}")
         
-        # Use REAL TIME price for Execution and Trailing (Not candle close)
-        real_price = tools.get_current_price(symbol)
-        if real_price == 0: real_price = current_price # Fallback to candle close
-
-        # DEBUG PRICE MONITOR (For User Confidence)
-        print(f"DEBUG PRICE: {symbol} | Live: {real_price} | SL: {current_sl} | TP: {take_profit}")
-
-        # Update current price in state for Dashboard visibility
-        pos['current_price'] = real_price
-        pos['last_update'] = str(df_micro.iloc[-1]['timestamp']) # Keep candle timestamp
-        
-        # --- TRAILING STOP LOGIC (PROGRESSIVE / SMART) ---
-        atr = df_micro.iloc[-1].get('ATR_14', 0)
+            decision = "HOLD" # Initialize default to prevent UnboundLocalError
+            pos = my_positions[0]
+            pos_type = pos['type']
+            last_closed_candle = str(df_micro.iloc[-2]['timestamp']) if len(df_micro) >= 2 else ""
         
-        # === NEW: PROGRESSIVE TRAILING DISTANCE ===
-        # Calculate current profit percentage
-        if pos_type == "LONG":
-            profit_pct = (real_price - entry_price) / entry_price * 100
-        else:  # SHORT
-            profit_pct = (entry_price - real_price) / entry_price * 100
-        
-        # Trailing distance tightens as profit grows (gives eyes to the bot)
-        # At 0% profit: 1.5x ATR (loose, room to breathe)
-        # At 0.5% profit: 1.0x ATR (starting to protect)
-        # At 1.0%+ profit: 0.5x ATR (tight, lock in gains)
-        if profit_pct >= 1.0:
-            atr_mult = 0.5  # Tight trailing at high profit
-            logger.info(f"PROFIT {profit_pct:.2f}% - Using TIGHT trailing (0.5x ATR)")
-        elif profit_pct >= 0.5:
-            atr_mult = 0.75  # Medium trailing
-            logger.info(f"PROFIT {profit_pct:.2f}% - Using MEDIUM trailing (0.75x ATR)")
-        elif profit_pct >= 0.2:
-            atr_mult = 1.0  # Standard trailing
-            logger.info(f"PROFIT {profit_pct:.2f}% - Using STANDARD trailing (1.0x ATR)")
-        else:
-            atr_mult = 1.5  # Loose trailing (allow room to develop)
+            # --- EXIT ANTICIPADO: Check for Confirmed Trend Reversal ---
+            # Only applies to TRENDING positions
+            if pos.get('strategy_used') == "TRENDING" and trend_state_info['state'] == "REVERSING":
+                # Initialize reversal tracker if first time
+                if 'reversal_start' not in pos:
+                    pos['reversal_start'] = datetime.now().isoformat()
+                    pos['reversal_candles'] = 0
+                    logger.warning(f"⚠️ {symbol} entering REVERSING state (not confirmed yet)")
+            
+                # Count CLOSED 15m candles, not loop passes (macro-loop cadence != candle size)
+                if pos.get('reversal_last_candle') != last_closed_candle:
+                    pos['reversal_last_candle'] = last_closed_candle
+                    pos['reversal_candles'] = pos.get('reversal_candles', 0) + 1
+            
+                # PATIENCE: Wait 3 candles (45 min) to confirm reversal
+                if pos['reversal_candles'] >= 3:
+                    entry_regime_adx = pos.get('regime_at_entry', {}).get('adx', 0)
+                    logger.warning(f"🚨 CONFIRMED TREND REVERSAL for {symbol} (3+ candles)")
+                    logger.warning(f"   Strategy: {pos['strategy_used']} | Entry ADX: {entry_regime_adx:.1f} → Current Micro: {trend_state_info['micro_adx']:.1f}")
+                    logger.warning(f"   Macro ADX: {trend_state_info['macro_adx']:.1f} | Volume Trend: {trend_state_info['vol_trend']}")
+                    logger.warning(f"   📉 FORCING EXIT to preserve capital (reversal confirmed)")
+                
+                    decision = "SELL" if pos_type == "LONG" else "BUY"
+                    reason = f"TREND REVERSAL CONFIRMED (State: {trend_state_info['state']}, {pos['reversal_candles']} candles, Macro ADX: {trend_state_info['macro_adx']:.1f})"
+                    notify(outbox, f"⚠️ **TREND REVERSAL EXIT**\n{symbol} {pos_type}\nReason: {reason}")
+                else:
+                    logger.info(f"⚠️ {symbol} REVERSING {pos['reversal_candles']}/3 candles, being cautious...")
         
-        # Hard Floor Logic: 0.15% minimum distance (reduced from 0.2%)
-        min_dist = entry_price * 0.0015
+            elif pos.get('strategy_used') == "TRENDING" and trend_state_info['state'] != "REVERSING":
+                # Trend recovered, clear reversal tracker
+                if 'reversal_start' in pos:
+                    logger.info(f"✅ {symbol} trend state improved to {trend_state_info['state']}, clearing reversal tracker")
+                    pos.pop('reversal_start', None)
+                    pos.pop('reversal_candles', None)
+                    pos.pop('reversal_last_candle', None)
         
-        atr_dist = atr_mult * atr if atr > 0 else 0
+            # --- CONSOLIDATION MANAGEMENT ---
+            if pos.get('strategy_used') == "TRENDING" and trend_state_info['state'] == "CONSOLIDATING":
+                # Initialize consolidation tracker
+                if 'consolidation_start' not in pos:
+                    pos['consolidation_start'] = datetime.now().isoformat()
+                    pos['consolidation_candles'] = 0
+                    logger.info(f"🔄 {symbol} started CONSOLIDATING (trend pause detected)")
+            
+                # Count CLOSED 15m candles, not loop passes (macro-loop cadence != candle size)
+                if pos.get('consolidation_last_candle') != last_closed_candle:
+                    pos['consolidation_last_candle'] = last_closed_candle
+                    pos['consolidation_candles'] = pos.get('consolidation_candles', 0) + 1
+            
+                # Give it 5 candles (75 min) to resume
+                if pos['consolidation_candles'] >= 5:
+                    logger.warning(f"⏰ {symbol} consolidating for {pos['consolidation_candles']} candles (75+ min)")
+                    logger.warning(f"   Patience limit reached. Considering tighter SL management.")
+                    # Optionally tighten trailing SL here if needed
+                else:
+                    logger.info(f"🕐 {symbol} CONSOLIDATING {pos['consolidation_candles']}/5 candles, being patient...")
         
-        final_dist = max(atr_dist, min_dist)
+            elif pos.get('strategy_used') == "TRENDING" and trend_state_info['state'] == "ACTIVE":
+                # Trend is healthy, reset consolidation tracker if it exists
+                if 'consolidation_start' in pos:
+                    logger.info(f"✅ {symbol} trend RESUMED (ACTIVE state). Clearing consolidation tracker.")
+                    pos.pop('consolidation_start', None)
+                    pos.pop('consolidation_candles', None)
+                    pos.pop('consolidation_last_candle', None)
+
+            if (pos_type == "LONG" and decision == "SELL") or \
+               (pos_type == "SHORT" and decision == "BUY"):
+                _close_position(state, symbol, pos, current_price, reason, regime_data, outbox=outbox)
+                trade_executed = True
+            else:
+                 logger.info(f"Holding {symbol} {pos_type}.")
+
 
+        # Save State
+        state['last_run'] = str(df_micro.iloc[-1]['timestamp'])
+    
+        # Update dashboard (Show MICRO indicators as primary for liveliness)
+        state['latest_analysis'] = {
+            "symbol": symbol,
+            "price": current_price,
+            "rsi": df_micro.iloc[-1]['RSI_14'],
+            "adx": df_micro.iloc[-1].get('ADX_14', 0)
+        }
+    
+    send_outbox(outbox)
+    save_state(state)
+    return True # AI was called
+
+
+def local_atr(frame, period=14):
+    """ATR_14 (mean true range) of the last 'period' candles of a CandleFrame; 0.0 if too short."""
+    if len(frame) <= period:
+        return 0.0
+    high, low, close = frame['high'][-period:], frame['low'][-period:], frame['close'][-period - 1:]
+    prev_close = close[:-1]
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return float(np.mean(tr))
+
+
+def entry_candles(frame, entry_time_str):
+    """
+    Candles of a CandleFrame opened at or after a position's entry (wick TP check).
+    entry_time_str: '2026-01-29 01:54:35 UTC-6' as written at entry (or ' UTC'); the store is UTC.
+    None if missing or unreadable (logged): callers fall back to the last candle.
+    """
+    if not entry_time_str:
+        return None
+    try:
+        stamp, _, offset = entry_time_str.partition(' UTC')
+        entry_dt = datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone(timedelta(hours=int(offset or 0))))
+    except ValueError as e:
+        logger.warning(f"⚠️ Unreadable entry_time '{entry_time_str}': {e}")
+        return None
+    return frame.since(entry_dt)
+
+
+def manage_position_tick(state, symbol, outbox=None, price=None):
+    """
+    MICRO-LOOP: Trailing Stop / Break Even / SL / TP / Kill Switch / Manual Close for one open position.
+    Uses only the live price and cached context: ATR published by the macro-loop (recomputed
+    from the local 15m candle store if missing) and the same store for wick checks.
+    SL/TP hits are enforced on every tick; only Break Even / Trailing need the ATR.
+    No downloads, no indicators, no AI.
+    Call under STATE_LOCK with an 'outbox' list (Telegram / radiography / lessons, run after releasing it)
+    and the live 'price' fetched before taking it (no network I/O under the lock).
+    Returns True if the position was closed.
+    """
+    my_positions = [p for p in state.get('current_positions', []) if p['symbol'] == symbol]
+    if not my_positions:
+        return False
+    
+    context = MARKET_CONTEXT.get(symbol, {})
+    df_micro = CandleFrame.from_store(symbol, TIMEFRAME_MICRO, 100) # Local store: zero-copy, no request
+    if df_micro.empty:
+        return False
+    
+    current_price = df_micro.last('close')
+    reason = ""
+    decision = "HOLD" # Initialize default to prevent UnboundLocalError
+    pos = my_positions[0]
+    pos_type = pos['type']
+    entry_price = float(pos['entry_price'])
+    # Ensure we have a stop_loss, even if None initially (safety)
+    current_sl = float(pos.get('stop_loss') or (entry_price * 0.95 if pos_type == 'LONG' else entry_price * 1.05))
+
+    # Define Take Profit & Distance for BE Logic
+    take_profit = float(pos.get('take_profit', 0) or 0)
+    if take_profit > 0:
+        tp_dist = abs(take_profit - entry_price)
+    else:
+        tp_dist = float('inf') # Infinite distance if no TP
+
+    # Use REAL TIME price for Execution and Trailing (Not candle close)
+    real_price = price if price is not None else tools.get_current_price(symbol)
+    if real_price == 0: real_price = current_price # Fallback to candle close (local store)
+
+    # PRICE MONITOR (every tick: debug level only)
+    logger.debug(f"PRICE: {symbol} | Live: {real_price} | SL: {current_sl} | TP: {take_profit}")
+
+    # Update current price in state for Dashboard visibility
+    pos['current_price'] = real_price
+    pos['last_update'] = str(df_micro.timestamp_at(-1)) # Keep candle timestamp
+
+    # --- TRAILING STOP LOGIC (PROGRESSIVE / SMART) ---
+    atr = context.get('atr', 0) # Published by the macro-loop (no indicator work here)
+    if not atr:
+        atr = local_atr(df_micro) # Restart / failed macro pass: same ATR_14 from the stored 15m candles
+
+    # === NEW: PROGRESSIVE TRAILING DISTANCE ===
+    # Calculate current profit percentage
+    if pos_type == "LONG":
+        profit_pct = (real_price - entry_price) / entry_price * 100
+    else:  # SHORT
+        profit_pct = (entry_price - real_price) / entry_price * 100
+
+    # Trailing distance tightens as profit grows (gives eyes to the bot)
+    # At 0% profit: 1.5x ATR (loose, room to breathe)
+    # At 0.5% profit: 1.0x ATR (starting to protect)
+    # At 1.0%+ profit: 0.5x ATR (tight, lock in gains)
+    if profit_pct >= 1.0:
+        atr_mult = 0.5  # Tight trailing at high profit
+        logger.info(f"PROFIT {profit_pct:.2f}% - Using TIGHT trailing (0.5x ATR)")
+    elif profit_pct >= 0.5:
+        atr_mult = 0.75  # Medium trailing
+        logger.info(f"PROFIT {profit_pct:.2f}% - Using MEDIUM trailing (0.75x ATR)")
+    elif profit_pct >= 0.2:
+        atr_mult = 1.0  # Standard trailing
+        logger.info(f"PROFIT {profit_pct:.2f}% - Using STANDARD trailing (1.0x ATR)")
+    else:
+        atr_mult = 1.5  # Loose trailing (allow room to develop)
+
+    # Hard Floor Logic: 0.15% minimum distance (reduced from 0.2%)
+    min_dist = entry_price * 0.0015
+
+    atr_dist = atr_mult * atr if atr > 0 else 0
+
+    final_dist = max(atr_dist, min_dist)
+
+
+    # Break Even / Trailing need a volatility scale; SL/TP hits below never wait on it
+    if atr > 0:
+        # 1. Break Even Check - NOW TRIGGERS EARLIER
+        # At 0.3% profit OR 1x ATR, whichever is smaller
+        be_trigger_pct = entry_price * 0.003  # 0.3% profit
+        be_trigger = min(atr, be_trigger_pct, tp_dist * 0.3) if tp_dist != float('inf') else min(atr, be_trigger_pct)
+    
+        if pos_type == "LONG":
+            # Use real_price for triggering
+            if real_price > (entry_price + be_trigger) and current_sl < entry_price:
+                logger.info(f"Moving SL to Break Even for {symbol}")
+                pos['stop_loss'] = entry_price
+                current_sl = entry_price
+                notify(outbox, f"🛡️ **BREAK EVEN** {symbol}\nStop moved to Entry: {entry_price}")
         
-        if atr > 0:
-            # 1. Break Even Check - NOW TRIGGERS EARLIER
-            # At 0.3% profit OR 1x ATR, whichever is smaller
-            be_trigger_pct = entry_price * 0.003  # 0.3% profit
-            be_trigger = min(atr, be_trigger_pct, tp_dist * 0.3) if tp_dist != float('inf') else min(atr, be_trigger_pct)
+            # 2. Trailing (If price moves up, drag SL at final_dist)
+            new_sl = real_price - final_dist
+            if new_sl > current_sl:
+                old_sl = current_sl
+                logger.info(f"📈 Trailing SL Up for {symbol}: {old_sl:.4f} → {new_sl:.4f} (Dist: {final_dist:.4f})")
+                pos['stop_loss'] = new_sl
+                current_sl = new_sl
+                # LOG TO RADIOGRAPHY
+                defer(outbox, log_radiography, 'SL_MOVE', {
+                    'price': real_price,
+                    'old_sl': old_sl,
+                    'new_sl': new_sl,
+                    'profit_pct': profit_pct
+                })
+                locked_profit = (new_sl - entry_price) / entry_price * 100
             
-            if pos_type == "LONG":
-                # Use real_price for triggering
-                if real_price > (entry_price + be_trigger) and current_sl < entry_price:
-                    logger.info(f"Moving SL to Break Even for {symbol}")
-                    pos['stop_loss'] = entry_price
-                    current_sl = entry_price
-                    tools.send_telegram_message(f"🛡️ **BREAK EVEN** {symbol}\nStop moved to Entry: {entry_price}")
-                
-                # 2. Trailing (If price moves up, drag SL at final_dist)
-                new_sl = real_price - final_dist
-                if new_sl > current_sl:
+                if locked_profit > 0:
+                    lock_msg = f"💰 **Profit Locked: {locked_profit:.2f}%**"
+                else:
+                    risk_pct = abs(locked_profit)
+                    lock_msg = f"🛡️ **Risk Reduced to: {risk_pct:.2f}%**"
+
+                # Notify on significant moves (every 0.1% or more)
+                if (new_sl - old_sl) / entry_price > 0.001:
+                    notify(outbox, f"📈 **TRAILING** {symbol}\nSL moved: ${old_sl:.4f} → ${new_sl:.4f}\nMarket: {profit_pct:.2f}% | {lock_msg}")
+
+        elif pos_type == "SHORT":
+            # 1. BREAK EVEN (Move SL to Entry when profit reaches threshold)
+            # Now uses the same be_trigger calculated above (0.3% or ATR, whichever smaller)
+            if real_price < (entry_price - be_trigger) and current_sl > entry_price:
+                logger.info(f"Moving SL to Break Even for {symbol}")
+                pos['stop_loss'] = entry_price
+                current_sl = entry_price
+                notify(outbox, f"🛡️ **BREAK EVEN** {symbol}\nStop moved to Entry: {entry_price}")
+
+            # 2. Trailing (Drag SL DOWN following price)
+            new_sl = real_price + final_dist
+        
+            # CRITICAL: For SHORT, SL should only trail down if:
+            # - New SL is lower than current SL (trailing down) AND
+            # - New SL is still ABOVE entry (unless already in BE mode where SL = entry)
+            if new_sl < current_sl:
+                # Safety: Don't trail below entry unless we're already in BE mode
+                if current_sl > entry_price and new_sl < entry_price:
+                    # Don't trail past entry, stay at entry for now
+                    logger.info(f"Trailing SL would go below entry ({new_sl:.2f} < {entry_price:.2f}), holding at current {current_sl:.2f}")
+                else:
                     old_sl = current_sl
-                    logger.info(f"📈 Trailing SL Up for {symbol}: {old_sl:.4f} → {new_sl:.4f} (Dist: {final_dist:.4f})")
+                    logger.info(f"📉 Trailing SL Down for {symbol}: {old_sl:.4f} → {new_sl:.4f} (Dist: {final_dist:.4f})")
                     pos['stop_loss'] = new_sl
                     current_sl = new_sl
                     # LOG TO RADIOGRAPHY
-                    log_radiography('SL_MOVE', {
+                    defer(outbox, log_radiography, 'SL_MOVE', {
                         'price': real_price,
                         'old_sl': old_sl,
                         'new_sl': new_sl,
                         'profit_pct': profit_pct
                     })
-                    locked_profit = (new_sl - entry_price) / entry_price * 100
-                    
+                    locked_profit = (entry_price - new_sl) / entry_price * 100
+                
                     if locked_profit > 0:
                         lock_msg = f"💰 **Profit Locked: {locked_profit:.2f}%**"
                     else:
@@ -851,253 +1325,126 @@ def process_pair(symbol, btc_context_str, global_sentiment):
                         lock_msg = f"🛡️ **Risk Reduced to: {risk_pct:.2f}%**"
 
                     # Notify on significant moves (every 0.1% or more)
-                    if (new_sl - old_sl) / entry_price > 0.001:
-                        tools.send_telegram_message(f"📈 **TRAILING** {symbol}\nSL moved: ${old_sl:.4f} → ${new_sl:.4f}\nMarket: {profit_pct:.2f}% | {lock_msg}")
+                    if (old_sl - new_sl) / entry_price > 0.001:
+                        notify(outbox, f"📉 **TRAILING** {symbol}\nSL moved: ${old_sl:.4f} → ${new_sl:.4f}\nMkt: {profit_pct:.2f}% | {lock_msg}")
 
-                    
-                # 3. STOP HIT CHECK
-                if real_price <= current_sl: # Check Live Price vs SL
-                    decision = "SELL"
-                    # GUARANTEED STOP EMULATION: Exit at SL Price (Limit Stop Simulator)
-                    current_price = current_sl 
-                    reason = "TRAILING STOP HIT (LIVE)"
+    if pos_type == "LONG":
+        # 3. STOP HIT CHECK
+        if real_price <= current_sl: # Check Live Price vs SL
+            decision = "SELL"
+            # GUARANTEED STOP EMULATION: Exit at SL Price (Limit Stop Simulator)
+            current_price = current_sl 
+            reason = "TRAILING STOP HIT (LIVE)"
 
-                
-                # 4. TAKE PROFIT CHECK
-                take_profit = float(pos.get('take_profit', 0) or 0)
-                
-                 # SENSOR UPGRADE: Check Last 3 Candles relative to ENTRY TIME (Long)
-                entry_time_str = pos.get('entry_time', '')
-                try:
-                    et_clean = entry_time_str.replace(' UTC', '')
-                    entry_dt = pd.to_datetime(et_clean)
-                    relevant_candles = df_micro[df_micro['timestamp'] >= entry_dt]
-                    
-                    if not relevant_candles.empty:
-                         last_highs = relevant_candles['high'].max()
-                    else:
-                         last_highs = df_micro.iloc[-1]['high']
-                except:
-                    last_highs = df_micro.iloc[-1]['high']
-
-                # Check BOTH Live Price and Valid History (Wick)
-                if take_profit > 0 and (real_price >= take_profit or last_highs >= take_profit):
-                    logger.info(f"✅ TP TRIGGERED! Price/Wick:{max(real_price, last_highs)} >= TP:{take_profit}")
-                    decision = "SELL"
-                    current_price = real_price if real_price >= take_profit else take_profit
-                    reason = "TAKE PROFIT HIT (LIVE/WICK)"
-                    
-            elif pos_type == "SHORT":
-                # 1. BREAK EVEN (Move SL to Entry when profit reaches threshold)
-                # Now uses the same be_trigger calculated above (0.3% or ATR, whichever smaller)
-                if real_price < (entry_price - be_trigger) and current_sl > entry_price:
-                    logger.info(f"Moving SL to Break Even for {symbol}")
-                    pos['stop_loss'] = entry_price
-                    current_sl = entry_price
-                    tools.send_telegram_message(f"🛡️ **BREAK EVEN** {symbol}\nStop moved to Entry: {entry_price}")
-
-                # 2. Trailing (Drag SL DOWN following price)
-                new_sl = real_price + final_dist
-                
-                # CRITICAL: For SHORT, SL should only trail down if:
-                # - New SL is lower than current SL (trailing down) AND
-                # - New SL is still ABOVE entry (unless already in BE mode where SL = entry)
-                if new_sl < current_sl:
-                    # Safety: Don't trail below entry unless we're already in BE mode
-                    if current_sl > entry_price and new_sl < entry_price:
-                        # Don't trail past entry, stay at entry for now
-                        logger.info(f"Trailing SL would go below entry ({new_sl:.2f} < {entry_price:.2f}), holding at current {current_sl:.2f}")
-                    else:
-                        old_sl = current_sl
-                        logger.info(f"📉 Trailing SL Down for {symbol}: {old_sl:.4f} → {new_sl:.4f} (Dist: {final_dist:.4f})")
-                        pos['stop_loss'] = new_sl
-                        current_sl = new_sl
-                        # LOG TO RADIOGRAPHY
-                        log_radiography('SL_MOVE', {
-                            'price': real_price,
-                            'old_sl': old_sl,
-                            'new_sl': new_sl,
-                            'profit_pct': profit_pct
-                        })
-                        locked_profit = (entry_price - new_sl) / entry_price * 100
-                        
-                        if locked_profit > 0:
-                            lock_msg = f"💰 **Profit Locked: {locked_profit:.2f}%**"
-                        else:
-                            risk_pct = abs(locked_profit)
-                            lock_msg = f"🛡️ **Risk Reduced to: {risk_pct:.2f}%**"
-
-                        # Notify on significant moves (every 0.1% or more)
-                        if (old_sl - new_sl) / entry_price > 0.001:
-                            tools.send_telegram_message(f"📉 **TRAILING** {symbol}\nSL moved: ${old_sl:.4f} → ${new_sl:.4f}\nMkt: {profit_pct:.2f}% | {lock_msg}")
-
-                    
-                # 3. STOP HIT CHECK
-                if real_price >= current_sl: # Check Live Price vs SL
-                    decision = "BUY"
-                    # GUARANTEED STOP EMULATION: Exit at SL Price
-                    current_price = current_sl
-                    reason = "TRAILING STOP HIT (LIVE)"
-
-
-                # 4. TAKE PROFIT CHECK
-                take_profit_val = pos.get('take_profit', 0)
-                take_profit = float(take_profit_val) if take_profit_val else 0
-                
-                # SENSOR UPGRADE: Check Last 3 Candles relative to ENTRY TIME
-                # Fixes 'Time Travel' bug where old wicks triggered new trades
-                entry_time_str = pos.get('entry_time', '')
-                try:
-                    # Convert Entry Time string to Timestamp
-                    # Format: 2026-01-29 01:54:35 UTC
-                    et_clean = entry_time_str.replace(' UTC', '')
-                    entry_dt = pd.to_datetime(et_clean)
-                    
-                    # Filter candles that happened AFTER or ON entry
-                    # df_micro['timestamp'] is already dt object per fetch_market_data
-                    relevant_candles = df_micro[df_micro['timestamp'] >= entry_dt]
-                    
-                    if not relevant_candles.empty:
-                         last_lows = relevant_candles['low'].min()
-                    else:
-                         last_lows = df_micro.iloc[-1]['low'] # Fallback to current
-                except Exception as e:
-                    # logger.error(f"Time Filter Error: {e}")
-                    last_lows = df_micro.iloc[-1]['low']
-
-                # Check BOTH Live Price and Valid History
-                if take_profit > 0 and (real_price <= take_profit or last_lows <= take_profit):
-                    logger.info(f"✅ TP TRIGGERED! Price/Wick:{min(real_price, last_lows)} <= TP:{take_profit}")
-                    decision = "BUY"
-                    current_price = real_price if real_price <= take_profit else take_profit
-                    reason = "TAKE PROFIT HIT (LIVE/WICK)"
+    
+        # 4. TAKE PROFIT CHECK
+        take_profit = float(pos.get('take_profit', 0) or 0)
+    
+         # SENSOR UPGRADE: Check Last 3 Candles relative to ENTRY TIME (Long)
+        relevant_candles = entry_candles(df_micro, pos.get('entry_time', ''))
+        if relevant_candles is not None and not relevant_candles.empty:
+             last_highs = relevant_candles['high'].max()
+        else:
+             last_highs = df_micro.last('high')
+
+        # Check BOTH Live Price and Valid History (Wick)
+        if take_profit > 0 and (real_price >= take_profit or last_highs >= take_profit):
+            logger.info(f"✅ TP TRIGGERED! Price/Wick:{max(real_price, last_highs)} >= TP:{take_profit}")
+            decision = "SELL"
+            current_price = real_price if real_price >= take_profit else take_profit
+            reason = "TAKE PROFIT HIT (LIVE/WICK)"
+
+    elif pos_type == "SHORT":
+        # 3. STOP HIT CHECK
+        if real_price >= current_sl: # Check Live Price vs SL
+            decision = "BUY"
+            # GUARANTEED STOP EMULATION: Exit at SL Price
+            current_price = current_sl
+            reason = "TRAILING STOP HIT (LIVE)"
+
+
+        # 4. TAKE PROFIT CHECK
+        take_profit_val = pos.get('take_profit', 0)
+        take_profit = float(take_profit_val) if take_profit_val else 0
+    
+        # SENSOR UPGRADE: Check Last 3 Candles relative to ENTRY TIME
+        # Fixes 'Time Travel' bug where old wicks triggered new trades
+        # Filter candles that happened AFTER or ON entry
+        # Binary search on the sorted candle timestamps (zero-copy view)
+        relevant_candles = entry_candles(df_micro, pos.get('entry_time', ''))
+        if relevant_candles is not None and not relevant_candles.empty:
+             last_lows = relevant_candles['low'].min()
+        else:
+             last_lows = df_micro.last('low') # Fallback to current
+
+        # Check BOTH Live Price and Valid History
+        if take_profit > 0 and (real_price <= take_profit or last_lows <= take_profit):
+            logger.info(f"✅ TP TRIGGERED! Price/Wick:{min(real_price, last_lows)} <= TP:{take_profit}")
+            decision = "BUY"
+            current_price = real_price if real_price <= take_profit else take_profit
+            reason = "TAKE PROFIT HIT (LIVE/WICK)"
+
+    if os.path.exists("STOP_REQUEST"):
+         decision = "SELL" if pos_type == "LONG" else "BUY"
+         reason = "KILL SWITCH"
+         try: os.remove("STOP_REQUEST")
+         except: pass
+
+    # --- CHECK FOR MANUAL CLOSE REQUEST (From Dashboard) ---
+    safe_symbol = symbol.replace('/', '_')
+    # USE ABSOLUTE PATH matching dashboard
+    close_req_path = os.path.join(r"C:\Users\USER\AgenTra", f"CLOSE_{safe_symbol}.req")
+
+    close_requested = os.path.exists(close_req_path)
+    logger.debug(f"Manual close check: {symbol} -> {close_req_path} | Exists: {close_requested}")
+
+    if close_requested:
+        decision = "SELL" if pos_type == "LONG" else "BUY"
+        reason = "MANUAL DASHBOARD CLOSE"
+        try: os.remove(close_req_path)
+        except: pass
+        logger.info(f"🚨 MANUAL CLOSE DETECTED for {symbol}")
 
-        
-        # --- EXIT ANTICIPADO: Check for Confirmed Trend Reversal ---
-        # Only applies to TRENDING positions
-        if pos.get('strategy_used') == "TRENDING" and trend_state_info['state'] == "REVERSING":
-            # Initialize reversal tracker if first time
-            if 'reversal_start' not in pos:
-                pos['reversal_start'] = datetime.now().isoformat()
-                pos['reversal_candles'] = 0
-                logger.warning(f"⚠️ {symbol} entering REVERSING state (not confirmed yet)")
-            
-            pos['reversal_candles'] = pos.get('reversal_candles', 0) + 1
-            
-            # PATIENCE: Wait 3 candles (45 min) to confirm reversal
-            if pos['reversal_candles'] >= 3:
-                entry_regime_adx = pos.get('regime_at_entry', {}).get('adx', 0)
-                logger.warning(f"🚨 CONFIRMED TREND REVERSAL for {symbol} (3+ candles)")
-                logger.warning(f"   Strategy: {pos['strategy_used']} | Entry ADX: {entry_regime_adx:.1f} → Current Micro: {trend_state_info['micro_adx']:.1f}")
-                logger.warning(f"   Macro ADX: {trend_state_info['macro_adx']:.1f} | Volume Trend: {trend_state_info['vol_trend']}")
-                logger.warning(f"   📉 FORCING EXIT to preserve capital (reversal confirmed)")
-                
-                decision = "SELL" if pos_type == "LONG" else "BUY"
-                reason = f"TREND REVERSAL CONFIRMED (State: {trend_state_info['state']}, {pos['reversal_candles']} candles, Macro ADX: {trend_state_info['macro_adx']:.1f})"
-                tools.send_telegram_message(f"⚠️ **TREND REVERSAL EXIT**\n{symbol} {pos_type}\nReason: {reason}")
-            else:
-                logger.info(f"⚠️ {symbol} REVERSING {pos['reversal_candles']}/3 candles, being cautious...")
-        
-        elif pos.get('strategy_used') == "TRENDING" and trend_state_info['state'] != "REVERSING":
-            # Trend recovered, clear reversal tracker
-            if 'reversal_start' in pos:
-                logger.info(f"✅ {symbol} trend state improved to {trend_state_info['state']}, clearing reversal tracker")
-                pos.pop('reversal_start', None)
-                pos.pop('reversal_candles', None)
-        
-        # --- CONSOLIDATION MANAGEMENT ---
-        if pos.get('strategy_used') == "TRENDING" and trend_state_info['state'] == "CONSOLIDATING":
-            # Initialize consolidation tracker
-            if 'consolidation_start' not in pos:
-                pos['consolidation_start'] = datetime.now().isoformat()
-                pos['consolidation_candles'] = 0
-                logger.info(f"🔄 {symbol} started CONSOLIDATING (trend pause detected)")
-            
-            pos['consolidation_candles'] = pos.get('consolidation_candles', 0) + 1
-            
-            # Give it 5 candles (75 min) to resume
-            if pos['consolidation_candles'] >= 5:
-                logger.warning(f"⏰ {symbol} consolidating for {pos['consolidation_candles']} candles (75+ min)")
-                logger.warning(f"   Patience limit reached. Considering tighter SL management.")
-                # Optionally tighten trailing SL here if needed
-            else:
-                logger.info(f"🕐 {symbol} CONSOLIDATING {pos['consolidation_candles']}/5 candles, being patient...")
-        
-        elif pos.get('strategy_used') == "TRENDING" and trend_state_info['state'] == "ACTIVE":
-            # Trend is healthy, reset consolidation tracker if it exists
-            if 'consolidation_start' in pos:
-                logger.info(f"✅ {symbol} trend RESUMED (ACTIVE state). Clearing consolidation tracker.")
-                pos.pop('consolidation_start', None)
-                pos.pop('consolidation_candles', None)
-        
-        if os.path.exists("STOP_REQUEST"):
-             decision = "SELL" if pos_type == "LONG" else "BUY"
-             reason = "KILL SWITCH"
-             try: os.remove("STOP_REQUEST")
-             except: pass
+    if (pos_type == "LONG" and decision == "SELL") or \
+       (pos_type == "SHORT" and decision == "BUY"):
+        _close_position(state, symbol, pos, current_price, reason, context.get('regime_data', {}), outbox=outbox)
+        return True
+    
+    return False
 
-        # --- CHECK FOR MANUAL CLOSE REQUEST (From Dashboard) ---
-        safe_symbol = symbol.replace('/', '_')
-        # USE ABSOLUTE PATH matching dashboard
-        close_req_path = os.path.join(r"C:\Users\USER\AgenTra", f"CLOSE_{safe_symbol}.req")
-        
-        
-        # DEBUG LOGGING (Temporary)
-        print(f"DEBUG Check: {symbol} -> {close_req_path} | Exists: {os.path.exists(close_req_path)}")
-        
-        if os.path.exists(close_req_path):
-            decision = "SELL" if pos_type == "LONG" else "BUY"
-            reason = "MANUAL DASHBOARD CLOSE"
-            try: os.remove(close_req_path)
-            except: pass
-            logger.info(f"🚨 MANUAL CLOSE DETECTED for {symbol}")
-
-        if (pos_type == "LONG" and decision == "SELL") or \
-           (pos_type == "SHORT" and decision == "BUY"):
-            
-            price_change = (current_price - entry_price) if pos_type == "LONG" else (entry_price - current_price)
-            realized_pnl_usd = price_change * quantity
-            pnl_percent = (price_change / entry_price) * 100
-            
-            # --- FORENSIC DATA FOR RECORDING ---
-            forensic_context = {
-                "exit_regime": regime_data,
-                "entry_regime": pos.get("regime_at_entry", {}),
-                "strategy_used": pos.get("strategy_used", "UNKNOWN") # DATA FOR META-LEARNER
-            }
-            
-            _record_trade(state, symbol, pos_type, entry_price, current_price, pnl_percent, realized_pnl_usd, reason, forensic_context)
-            
-            # --- FORENSIC MEMORY: Save Lesson ---
-            result_str = "WIN" if realized_pnl_usd > 0 else "LOSS"
-            brain.record_lesson(symbol, result_str, f"{reason} | PnL: {pnl_percent:.2f}%")
-            
-            msg = f"[WIN/LOSS] **CLOSE {pos_type}** {symbol}\nPnL: ${realized_pnl_usd:.2f} ({pnl_percent:.2f}%)"
-            logger.info(msg)
-            tools.send_telegram_message(msg)
-            trade_executed = True
-            
-            state['current_positions'] = [p for p in state['current_positions'] if p['symbol'] != symbol]
-            
-        else:
-             logger.info(f"Holding {symbol} {pos_type}.")
 
-    # Save State
-    state['last_run'] = str(df_micro.iloc[-1]['timestamp'])
+def _close_position(state, symbol, pos, exit_price, reason, regime_data, outbox=None):
+    """Closes a position: records the trade; lesson, radiography and Telegram go through 'outbox'. Call under STATE_LOCK."""
+    pos_type = pos['type']
+    entry_price = float(pos['entry_price'])
+    quantity = pos.get('quantity', 0.0)
     
-    # Update dashboard (Show MICRO indicators as primary for liveliness)
-    state['latest_analysis'] = {
-        "symbol": symbol,
-        "price": current_price,
-        "rsi": df_micro.iloc[-1]['RSI_14'],
-        "adx": df_micro.iloc[-1].get('ADX_14', 0)
+    price_change = (exit_price - entry_price) if pos_type == "LONG" else (entry_price - exit_price)
+    realized_pnl_usd = price_change * quantity
+    pnl_percent = (price_change / entry_price) * 100
+    
+    # --- FORENSIC DATA FOR RECORDING ---
+    forensic_context = {
+        "exit_regime": regime_data,
+        "entry_regime": pos.get("regime_at_entry", {}),
+        "strategy_used": pos.get("strategy_used", "UNKNOWN") # DATA FOR META-LEARNER
     }
-    tools.write_state(state)
-    return True # AI was called
+    
+    _record_trade(state, symbol, pos_type, entry_price, exit_price, pnl_percent, realized_pnl_usd, reason, forensic_context, outbox)
+    
+    # --- FORENSIC MEMORY: Save Lesson ---
+    result_str = "WIN" if realized_pnl_usd > 0 else "LOSS"
+    defer(outbox, brain.record_lesson, symbol, result_str, f"{reason} | PnL: {pnl_percent:.2f}%")
+    
+    msg = f"[WIN/LOSS] **CLOSE {pos_type}** {symbol}\nPnL: ${realized_pnl_usd:.2f} ({pnl_percent:.2f}%)"
+    logger.info(msg)
+    notify(outbox, msg)
+    
+    state['current_positions'] = [p for p in state['current_positions'] if p['symbol'] != symbol]
 
 
-def _record_trade(state, symbol, type, entry, exit, pnl_pct, pnl_usd, reason, context):
-    """Helper to save trade history with Forensic Context"""
+def _record_trade(state, symbol, type, entry, exit, pnl_pct, pnl_usd, reason, context, outbox=None):
+    """Helper to save trade history with Forensic Context (radiography via 'outbox')"""
     trade_record = {
         "symbol": symbol,
         "type": type,
@@ -1111,7 +1458,7 @@ def _record_trade(state, symbol, type, entry, exit, pnl_pct, pnl_usd, reason, co
     }
     
     # LOG TO RADIOGRAPHY
-    log_radiography('EXIT', {
+    defer(outbox, log_radiography, 'EXIT', {
         'exit_price': exit,
         'reason': reason,
         'pnl': pnl_usd,
@@ -1128,9 +1475,9 @@ def _record_trade(state, symbol, type, entry, exit, pnl_pct, pnl_usd, reason, co
     
     if pnl_usd < 0:
         logger.info("Loss detected. Triggering Forensic Reflexion...")
-        strategy = tools.read_strategy()
         
         # PASS CONTEXT TO REFLEXION ENGINE (COMMENTED OUT FOR RESCUE PLAN)
+        # strategy = tools.read_strategy() # Read outside STATE_LOCK when re-enabled
         # market_context = context.get('exit_regime', {})
         # new_strategy, change_reason = brain.reflect_on_performance(state['trade_history'], strategy, market_context)
         
@@ -1144,16 +1491,35 @@ def _record_trade(state, symbol, type, entry, exit, pnl_pct, pnl_usd, reason, co
             # tools.update_strategy(new_strategy)
 
 
-def run_orchestrator():
-    """Loops through all pairs."""
+async def run_orchestrator(state=None):
+    """
+    MACRO-LOOP body: analysis + AI + entries for all pairs.
+    Processes all pairs CONCURRENTLY (bounded by MAX_CONCURRENT_PAIRS).
+    Exchange I/O uses the async CCXT client; CPU/AI work runs in worker threads.
+    Cycle wall time ~ slowest single pair instead of the sum of all pairs.
+    """
     print("\n--- 💓 HEARTBEAT: Starting Loop 💓 ---")
     logger.info("--- Starting Multi-Pair Cycle (15m/4h) ---")
+    cycle_start = time.monotonic()
+    
+    # --- CYCLE CONTEXT (BTC leader, price snapshot, news) fetched concurrently ---
+    btc_result, _, sentiment_result = await asyncio.gather(
+        # Fetch tiny snapshot of BTC 1h just for correlation (resampled from BTC 15m)
+        tools.fetch_timeframes_async('BTC/USDT', {'1h': 5}),
+        # PRICE SNAPSHOT: One bulk ticker request for the whole universe
+        # process_pair (structure + trailing) reads prices from here via tools.get_current_price
+        tools.refresh_price_snapshot_async(PAIRS),
+        # Fetch GLOBAL sentiment once per cycle (SPEED UP)
+        asyncio.to_thread(tools.get_market_sentiment),
+        return_exceptions=True
+    )
     
     # --- BITCOIN (THE LEADER) CHECK ---
     btc_context_str = "Unknown"
     try:
-        # Fetch tiny snapshot of BTC 1h just for correlation
-        btc_df = tools.fetch_market_data('BTC/USDT', '1h', limit=5)
+        if isinstance(btc_result, Exception):
+            raise btc_result
+        btc_df = btc_result['1h']
         if not btc_df.empty and len(btc_df) >= 2:
             now_price = btc_df.iloc[-1]['close']
             prev_price = btc_df.iloc[-2]['close'] # Previous hour close
@@ -1164,8 +1530,14 @@ def run_orchestrator():
     except Exception as e:
         logger.warning(f"Failed to fetch Bitcoin context: {e}")
 
-    # Fetch GLOBAL sentiment once per cycle (SPEED UP)
-    global_sentiment = tools.get_market_sentiment()
+    global_sentiment = sentiment_result if isinstance(sentiment_result, str) else "Error fetching news."
+
+    # --- BOOK-WIDE DRIFT SCAN (stored 15m history, all pairs in one vectorized pass) ---
+    await asyncio.to_thread(refresh_book_mode, PAIRS)
+
+    # Shared state (all workers and loops mutate the same dict under STATE_LOCK)
+    if state is None:
+        state = tools.read_state()
 
     # --- PRIORITY QUEUE LOGIC (MANUAL CLOSE FIRST) ---
     priority_pairs = []
@@ -1177,23 +1549,138 @@ def run_orchestrator():
             priority_pairs.append(p)
         else:
             normal_pairs.append(p)
-            
-    ordered_pairs = priority_pairs + normal_pairs
     
     if priority_pairs:
         logger.info(f"🚨 PRIORITY OVERRIDE: Processing {priority_pairs} FIRST due to Manual Signal.")
 
-    for pair in ordered_pairs:
-        ai_called = process_pair(pair, btc_context_str, global_sentiment)
-        if ai_called:
-            logger.info("[WAIT] Rate Limit breathing (2s)...")
-            time.sleep(2)
-            
-    # Sleep 1 minute (15m timeframe doesn't need 1s loop)
-    # The outer loop is controlled by caller, but here we enforce a reasonable cycle delay
-    # Or just return to allow caller to decide. The user suggested time.sleep(60) in main loop.
-    # We will assume this function runs ONCE per cycle.
-    pass
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAIRS)
+
+    async def _fetch_pair(pair):
+        async with semaphore:
+            try:
+                frames = await tools.fetch_timeframes_async(pair, {TIMEFRAME_MICRO: MICRO_WINDOW, TIMEFRAME_MACRO: 252})
+                return frames[TIMEFRAME_MICRO], frames[TIMEFRAME_MACRO]
+            except Exception as e:
+                logger.error(f"Data fetch failed for {pair}: {e}")
+                return None
+
+    # All candles first: the gatekeeper then runs ONE batched pass over the stored windows
+    fetched = dict(zip(priority_pairs + normal_pairs,
+                       await asyncio.gather(*[_fetch_pair(p) for p in priority_pairs + normal_pairs])))
+    gate = await asyncio.to_thread(scan_gatekeeper, [p for p, frames in fetched.items() if frames])
+
+    async def _run_pair(pair):
+        if not fetched.get(pair):
+            return False
+        async with semaphore:
+            df_micro, df_macro = fetched[pair]
+            return await asyncio.to_thread(process_pair, pair, btc_context_str, global_sentiment,
+                                           state, df_micro, df_macro, gate)
+
+    # Manual-close pairs run (and finish) before anything else starts
+    for group in (priority_pairs, normal_pairs):
+        if not group:
+            continue
+        results = await asyncio.gather(*[_run_pair(p) for p in group], return_exceptions=True)
+        for pair, result in zip(group, results):
+            if isinstance(result, Exception):
+                logger.error(f"Unhandled error processing {pair}: {result}")
+
+    logger.info(f"Cycle processed {len(PAIRS)} pairs in {time.monotonic() - cycle_start:.2f}s | {fc.feature_cache.stats_str()}")
+
+
+def run_micro_tick(state, symbols):
+    """One MICRO-LOOP pass over open positions (runs on MICRO_EXECUTOR)."""
+    # Live prices first: the REST fallback must not run under STATE_LOCK
+    prices = {symbol: tools.get_current_price(symbol) for symbol in symbols}
+    outbox = []
+    with STATE_LOCK:
+        for symbol in symbols:
+            try:
+                manage_position_tick(state, symbol, outbox, prices[symbol])
+            except Exception as e:
+                logger.error(f"Position management failed for {symbol}: {e}")
+    send_outbox(outbox)
+    save_state(state)
+
+
+async def run_micro_loop(state):
+    """
+    MICRO-LOOP (every MICRO_LOOP_SECONDS): live price vs SL/TP + trailing.
+    Never waits on candles, indicators or the LLM.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            with STATE_LOCK:
+                symbols = sorted({p['symbol'] for p in state.get('current_positions', [])})
+            if symbols:
+                await tools.refresh_price_snapshot_async(symbols)
+                await loop.run_in_executor(MICRO_EXECUTOR, run_micro_tick, state, symbols)
+        except Exception as e:
+            logger.error(f"Micro-loop error: {e}")
+        await asyncio.sleep(MICRO_LOOP_SECONDS)
+
+
+async def run_macro_loop(state):
+    """MACRO-LOOP (every MACRO_LOOP_SECONDS): indicators, AI and entries for all pairs."""
+    while True:
+        cycle_start = time.monotonic()
+        try:
+            await run_orchestrator(state)
+        except Exception as e:
+            logger.error(f"Macro-loop error: {e}")
+        elapsed = time.monotonic() - cycle_start
+        logger.info(f"--- Macro Cycle Complete. Next analysis in {max(MACRO_LOOP_SECONDS - elapsed, 0):.0f}s ---")
+        await asyncio.sleep(max(MACRO_LOOP_SECONDS - elapsed, 0))
+
+
+async def run_structure_loop(state):
+    """
+    STRUCTURE-LOOP: wakes up right after each 4h candle close and feeds the 4H structure tracker.
+    Between closes it sleeps - no 4h downloads, no BOS/CHoCH swing recomputation.
+    """
+    tf_ms = timeframe_to_ms(TIMEFRAME_MACRO)
+    while True:
+        expected_close = (int(time.time() * 1000) // tf_ms - 1) * tf_ms # Open time of the last closed 4h candle
+        pending = []
+        
+        async def _refresh(pair):
+            frames = await tools.fetch_timeframes_async(pair, {TIMEFRAME_MACRO: 252})
+            df_macro = frames[TIMEFRAME_MACRO]
+            refresh_structure(pair, df_macro, state)
+            if len(df_macro) < 2 or int(df_macro.iloc[-2]['timestamp'].timestamp() * 1000) < expected_close:
+                pending.append(pair)
+        
+        results = await asyncio.gather(*[_refresh(p) for p in PAIRS], return_exceptions=True)
+        for pair, result in zip(PAIRS, results):
+            if isinstance(result, Exception):
+                logger.error(f"Structure refresh failed for {pair}: {result}")
+                pending.append(pair)
+        
+        if pending:
+            await asyncio.sleep(STRUCTURE_RETRY_SECONDS)
+            continue
+        
+        now_ms = int(time.time() * 1000)
+        next_close_ms = (now_ms // tf_ms + 1) * tf_ms
+        await asyncio.sleep((next_close_ms - now_ms) / 1000 + STRUCTURE_CLOSE_DELAY)
+
+
+async def run_scheduler():
+    """Runs the three loops side by side, sharing one in-memory state."""
+    state = tools.read_state()
+    tasks = [
+        asyncio.create_task(run_micro_loop(state), name="micro-loop"),
+        asyncio.create_task(run_structure_loop(state), name="structure-loop"),
+        asyncio.create_task(run_macro_loop(state), name="macro-loop"),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await tools.session_manager.close_async()
 
 
 def main():
@@ -1206,18 +1693,24 @@ def main():
     else:
         brain.configure_genai(api_key)
 
+    # Live market data (WebSocket). Prices/candles fall back to REST automatically when stale.
+    stream = None
+    if os.getenv("MARKET_STREAM", "1") == "1":
+        stream = MarketStream(list(dict.fromkeys(PAIRS + ['BTC/USDT'])), [TIMEFRAME_MICRO], # Higher timeframes are resampled from 15m
+                              agg_trades=os.getenv("MARKET_AGG_TRADES", "1") == "1") # Trade-level order flow
+        stream.start()
+
     try:
-        # Run Multi-Pair Cycle
-        # Uncomment to run in a loop:
-        while True:
-            run_orchestrator()
-            logger.info("--- Cycle Complete. Waiting 3s for next tick check ---")
-            time.sleep(3) 
+        # Micro (trailing), Macro (analysis) and Structure (4H) loops with independent cadences
+        asyncio.run(run_scheduler())
         
     except KeyboardInterrupt:
         logger.info("Agent stopped by user.")
     except Exception as e:
         logger.critical(f"Unhandled exception: {e}")
+    finally:
+        if stream:
+            stream.stop()
 
 if __name__ == "__main__":
     main()
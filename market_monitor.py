@@ -1,7 +1,11 @@
 import pandas as pd
 import numpy as np
+import bisect
 import logging
-from scipy.stats import ks_2samp
+import threading
+from collections import deque
+from scipy.stats import ks_2samp, kstwo
+from candle_frame import CandleFrame, col
 
 logger = logging.getLogger("market_monitor")
 
@@ -64,3 +68,207 @@ def detect_drift(current_prices: pd.Series, baseline_prices: pd.Series, confiden
             "ks_stat": 0.0, 
             "reason": f"Calculation Error: {e}"
         }
+
+
+# =============================================================================
+# STREAMING DRIFT MONITOR (per symbol, fed once per closed candle)
+# =============================================================================
+
+DRIFT_BASELINE = 2000      # Baseline returns (~3 weeks of 15m candles)
+DRIFT_RECENT = 50          # Recent window tested against the baseline
+DRIFT_MIN_BASELINE = 200   # No verdicts before this many baseline returns
+DRIFT_ALPHA = 0.01         # KS runs on every candle: stricter than the one-shot 0.05
+PH_DELTA = 0.25            # Page-Hinkley drift allowance (in baseline std units)
+PH_THRESHOLD = 25.0        # Page-Hinkley alarm level (~1e5 candles between false alarms)
+MAX_DRIFT_EVENTS = 100
+
+
+class PageHinkley:
+    """One-sided Page-Hinkley test for an upward shift in the mean of a zero-mean input. O(1)."""
+
+    def __init__(self, delta: float = PH_DELTA, threshold: float = PH_THRESHOLD):
+        self.delta = delta
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.cum = 0.0
+        self.min = 0.0
+
+    @property
+    def stat(self) -> float:
+        return self.cum - self.min
+
+    def update(self, x: float) -> bool:
+        self.cum += x - self.delta
+        self.min = min(self.min, self.cum)
+        return self.stat > self.threshold
+
+
+class DriftMonitor:
+    """
+    Rolling baseline of log returns (ring buffer, kept sorted for the KS test) plus the
+    most recent DRIFT_RECENT returns. Per new return:
+      - Page-Hinkley on standardized returns (mean up / down) and on |return| (volatility up): O(1)
+      - Two-sample KS, recent vs baseline: exact statistic from the recent points only
+        (bisect into the sorted baseline), compared with a cached critical value; the
+        asymptotic p-value (as ks_2samp(method='asymp')) is computed on snapshot() only
+    """
+
+    def __init__(self, baseline_size: int = DRIFT_BASELINE, recent_size: int = DRIFT_RECENT,
+                 confidence_level: float = DRIFT_ALPHA):
+        self.baseline_size = baseline_size
+        self.recent_size = recent_size
+        self.confidence_level = confidence_level
+        self.recent = deque(maxlen=recent_size)
+        self.baseline = deque()          # Arrival order (ring: oldest evicted first)
+        self.sorted_baseline = []        # Same values, sorted
+        self._sum = self._sumsq = self._sum_abs = 0.0
+        self.detectors = {'mean_up': PageHinkley(), 'mean_down': PageHinkley(), 'vol_up': PageHinkley()}
+        self.last_close = None
+        self.last_ts = None
+        self.candles = 0
+        self.last_alarm = None           # (candle number, detector)
+        self.ks_stat = 0.0
+        self.events = deque(maxlen=MAX_DRIFT_EVENTS)
+        self._ks_drift = False
+        self._ks_n = 0                   # Effective sample size of the last test
+        self._critical = {}              # Effective sample size -> critical KS statistic
+        self._lock = threading.Lock()
+
+    def update(self, frame) -> int:
+        """Consumes the closed candles of `frame` newer than the last update. Returns candles consumed."""
+        frame = frame if isinstance(frame, CandleFrame) else CandleFrame.from_dataframe(frame)
+        with self._lock:
+            if self.last_ts is not None:
+                frame = frame.since(self.last_ts + 1)
+            elif len(frame) > self.baseline_size + self.recent_size + 1:
+                frame = frame.tail(self.baseline_size + self.recent_size + 1) # Older candles would be evicted anyway
+            if frame.empty:
+                return 0
+            ts, close = frame['timestamp'], col(frame, 'close')
+            for i in range(len(close)):
+                self._push(float(close[i]), int(ts[i]), evaluate=(i == len(close) - 1))
+            return len(close)
+
+    def _push(self, close: float, ts: int, evaluate: bool = True):
+        previous, self.last_close, self.last_ts = self.last_close, close, ts
+        if not previous or not close or not np.isfinite(close) or not np.isfinite(previous):
+            return
+        ret = float(np.log(close / previous))
+        self.candles += 1
+
+        if len(self.baseline) >= DRIFT_MIN_BASELINE:
+            self._page_hinkley(ret, ts)
+
+        if len(self.recent) == self.recent_size:
+            self._to_baseline(self.recent[0])
+        self.recent.append(ret)
+        if evaluate:
+            self._ks(ts)
+
+    def _to_baseline(self, ret: float):
+        self.baseline.append(ret)
+        bisect.insort(self.sorted_baseline, ret)
+        self._sum += ret
+        self._sumsq += ret * ret
+        self._sum_abs += abs(ret)
+        if len(self.baseline) > self.baseline_size:
+            old = self.baseline.popleft()
+            del self.sorted_baseline[bisect.bisect_left(self.sorted_baseline, old)]
+            self._sum -= old
+            self._sumsq -= old * old
+            self._sum_abs -= abs(old)
+
+    def _page_hinkley(self, ret: float, ts: int):
+        n = len(self.baseline)
+        mean = self._sum / n
+        std = np.sqrt(max(self._sumsq / n - mean * mean, 0.0))
+        mean_abs = self._sum_abs / n
+        if std <= 0 or mean_abs <= 0:
+            return
+        z = (ret - mean) / std
+        inputs = {'mean_up': z, 'mean_down': -z, 'vol_up': abs(ret) / mean_abs - 1.0}
+        for name, detector in self.detectors.items():
+            if detector.update(inputs[name]):
+                self._event(ts, name, detector.stat)
+                self.last_alarm = (self.candles, name)
+                detector.reset()
+
+    def _ks(self, ts: int):
+        m, n = len(self.recent), len(self.sorted_baseline)
+        if m < self.recent_size or n < DRIFT_MIN_BASELINE:
+            self.ks_stat, self._ks_n, self._ks_drift = 0.0, 0, False
+            return
+        d = 0.0
+        for i, x in enumerate(sorted(self.recent), start=1):
+            d = max(d, i / m - bisect.bisect_right(self.sorted_baseline, x) / n,
+                    bisect.bisect_left(self.sorted_baseline, x) / n - (i - 1) / m)
+        self.ks_stat = d
+        self._ks_n = int(np.round(m * n / (m + n)))
+        if self._ks_n not in self._critical: # Baseline fills up once, then the size is fixed
+            self._critical[self._ks_n] = float(kstwo.isf(self.confidence_level, self._ks_n))
+        ks_drift = d > self._critical[self._ks_n]
+        if ks_drift and not self._ks_drift:
+            self._event(ts, 'ks', d)
+        self._ks_drift = ks_drift
+
+    def _event(self, ts: int, detector: str, stat: float):
+        self.events.append({'time': pd.Timestamp(ts, unit='ms').strftime('%Y-%m-%d %H:%M'),
+                            'detector': detector, 'stat': round(float(stat), 4)})
+
+    @property
+    def p_value(self) -> float:
+        return float(kstwo.sf(self.ks_stat, self._ks_n)) if self._ks_n else 1.0
+
+    def snapshot(self) -> dict:
+        """detect_drift-compatible dict plus the online detectors' state."""
+        with self._lock:
+            p_value = self.p_value
+            ph_alarm = (self.last_alarm[1] if self.last_alarm and
+                        self.candles - self.last_alarm[0] < self.recent_size else None)
+            drift = self._ks_drift or ph_alarm is not None
+            if len(self.baseline) < DRIFT_MIN_BASELINE:
+                reason = f"Insufficient samples for statistical test (baseline {len(self.baseline)}/{DRIFT_MIN_BASELINE})"
+            elif drift:
+                signals = ([f"KS p-value {p_value:.4e}"] if self._ks_drift else []) + \
+                          ([f"Page-Hinkley {ph_alarm}"] if ph_alarm else [])
+                reason = f"CONCEPT DRIFT DETECTED: {' | '.join(signals)}. Market dynamics have changed."
+            else:
+                reason = "Market behavior remains statistically consistent."
+            return {
+                "drift_detected": bool(drift),
+                "p_value": p_value,
+                "ks_stat": float(self.ks_stat),
+                "reason": reason,
+                "page_hinkley": {name: round(float(d.stat), 3) for name, d in self.detectors.items()},
+                "alarm": ph_alarm,
+                "baseline": len(self.baseline),
+                "events": len(self.events)
+            }
+
+    def history(self, limit: int = None) -> list:
+        with self._lock:
+            events = list(self.events)
+        return events[-limit:] if limit else events
+
+
+class DriftBook:
+    """One DriftMonitor per symbol."""
+
+    def __init__(self):
+        self._monitors = {}
+        self._lock = threading.Lock()
+
+    def monitor(self, symbol: str) -> DriftMonitor:
+        with self._lock:
+            return self._monitors.setdefault(symbol, DriftMonitor())
+
+    def update(self, symbol: str, frame) -> DriftMonitor:
+        monitor = self.monitor(symbol)
+        monitor.update(frame)
+        return monitor
+
+
+# Global Drift Book (fed from the candle store by the pair workers)
+drift_book = DriftBook()
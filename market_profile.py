@@ -1,89 +1,248 @@
 import pandas as pd
 import numpy as np
 import logging
+import threading
+from collections import deque
+from candle_frame import CandleFrame, col
 
 logger = logging.getLogger("market_profile")
 
-def calculate_volume_profile(df: pd.DataFrame, lookback: int = 24) -> dict:
+VALUE_AREA_PCT = 0.70
+PROFILE_BINS = 50          # Batch profile: bins across the lookback range
+ROLLING_BIN_PCT = 0.0005   # Rolling profile: fixed grid of 0.05% of price per bin
+REBUILD_EVERY = 500        # Rolling profile: full rebuild cadence (float drift / dead bins)
+
+
+def distribute_volume(low, high, volume, bin_size: float, origin: float = 0.0) -> tuple:
+    """
+    Spreads each candle's volume uniformly over its [low, high] range on a grid of
+    bins [origin + k * bin_size, origin + (k + 1) * bin_size). Vectorized: interior
+    bins via a difference array, the two partial end bins via bincount.
+
+    Returns:
+        (first_bin, hist): absolute index of hist[0] on the grid and volume per bin.
+    """
+    low, high, volume = (np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in (low, high, volume))
+    valid = np.isfinite(low) & np.isfinite(high) & np.isfinite(volume) & (volume > 0) & (high >= low)
+    if not valid.any():
+        return 0, np.zeros(0)
+    lo = (low[valid] - origin) / bin_size
+    hi = (high[valid] - origin) / bin_size
+    vol = volume[valid]
+
+    a = np.floor(lo).astype(np.int64)
+    b = np.maximum(np.ceil(hi).astype(np.int64) - 1, a) # A high on a bin edge does not touch the next bin
+    first = int(a.min())
+    size = int(b.max()) - first + 1
+    a -= first
+    b -= first
+
+    span = hi - lo
+    single = a == b                      # Whole range inside one bin (incl. high == low)
+    density = np.divide(vol, span, out=np.zeros_like(vol), where=~single)
+
+    # Full interior bins a+1 .. b-1 receive `density` each
+    diff = np.bincount(a[~single] + 1, weights=density[~single], minlength=size + 1)
+    diff -= np.bincount(b[~single], weights=density[~single], minlength=size + 1)
+    hist = np.cumsum(diff, dtype=np.float64)[:size]
+
+    # Partial end bins (or the whole volume for single-bin candles)
+    first_part = np.where(single, vol, density * (a + first + 1 - lo))
+    last_part = np.where(single, 0.0, density * (hi - (b + first)))
+    hist += np.bincount(a, weights=first_part, minlength=size)
+    hist += np.bincount(b, weights=last_part, minlength=size)
+    return first, hist
+
+
+def value_area(hist: np.ndarray, pct: float = VALUE_AREA_PCT) -> tuple:
+    """
+    POC-centred value area: starting at the POC bin, repeatedly add the larger of the
+    next bin above / below until `pct` of the volume is covered.
+    Returns (poc_idx, val_idx, vah_idx).
+    """
+    poc = int(np.argmax(hist))
+    volumes = hist.tolist()
+    target = sum(volumes) * pct
+    lo = hi = poc
+    covered = volumes[poc]
+    while covered < target and (lo > 0 or hi < len(volumes) - 1):
+        above = volumes[hi + 1] if hi < len(volumes) - 1 else -1.0
+        below = volumes[lo - 1] if lo > 0 else -1.0
+        if above >= below:
+            hi += 1
+            covered += above
+        else:
+            lo -= 1
+            covered += below
+    return poc, lo, hi
+
+
+def summarize_profile(first_bin: int, hist: np.ndarray, bin_size: float, origin: float = 0.0) -> dict:
+    """POC (bin centre), VAH/VAL (value-area edges) and the full profile (plain lists: JSON-safe)."""
+    edges = origin + (first_bin + np.arange(len(hist) + 1)) * bin_size
+    prices = (edges[:-1] + edges[1:]) / 2
+    if not len(hist) or hist.sum() <= 0:
+        return {"POC": 0, "VAH": 0, "VAL": 0, "profile_str": "Insufficient Data",
+                "profile": {"price": prices.tolist(), "volume": hist.tolist()}, "bin_size": bin_size}
+
+    poc, lo, hi = value_area(hist)
+    poc_price, val, vah = prices[poc], edges[lo], edges[hi + 1]
+    return {
+        "POC": round(float(poc_price), 4),
+        "VAH": round(float(vah), 4),
+        "VAL": round(float(val), 4),
+        "profile_str": f"POC: {poc_price:.4f} | VA: [{val:.4f} - {vah:.4f}]",
+        "profile": {"price": prices.tolist(), "volume": hist.tolist()},
+        "bin_size": bin_size
+    }
+
+
+def calculate_volume_profile(df, lookback: int = 24, n_bins: int = PROFILE_BINS) -> dict:
     """
     Calculates Volume Profile (POC, VAH, VAL) for the given dataframe.
-    
+    Each candle's volume is spread across its high-low range; the value area
+    expands out from the POC.
+
     Args:
-        df: DataFrame with 'close', 'high', 'low', 'volume'.
+        df: DataFrame or CandleFrame with 'close', 'high', 'low', 'volume'.
         lookback: Number of recent candles to inspect (default 24 = 6 hours on 15m).
-        
+        n_bins: Bins across the lookback's price range.
+
     Returns:
         dict: {
             "POC": float (Point of Control - Price with most volume),
             "VAH": float (Value Area High - 70% vol upper bound),
             "VAL": float (Value Area Low - 70% vol lower bound),
-            "profile_str": str (Formatted string for AI)
+            "profile_str": str (Formatted string for AI),
+            "profile": {"price": bin centres, "volume": volume per bin},
+            "bin_size": float
         }
     """
     try:
-        subset = df.iloc[-lookback:].copy()
-        
+        subset = df.tail(lookback)
+
         if subset.empty:
             return {"POC": 0, "VAH": 0, "VAL": 0, "profile_str": "Insufficient Data"}
 
+        low = col(subset, 'low')
+        high = col(subset, 'high')
+        volume = col(subset, 'volume')
+
         # Define Price Bins (e.g., 50 bins across the range)
-        min_price = subset['low'].min()
-        max_price = subset['high'].max()
+        min_price = np.nanmin(low)
+        max_price = np.nanmax(high)
         price_range = max_price - min_price
-        
+
         if price_range == 0:
              return {"POC": min_price, "VAH": max_price, "VAL": min_price, "profile_str": "Flat Range"}
 
-        bin_size = price_range / 50
-        
-        # Create bins
-        bins = np.arange(min_price, max_price + bin_size, bin_size)
-        
-        # Using 'close' as proxy for volume allocation (simplified 15m profile)
-        # Ideally we'd split volume across high-low, but close is sufficient for estimation.
-        subset['bin_idx'] = np.digitize(subset['close'], bins)
-        
-        # Aggregate volume per bin
-        volume_by_bin = subset.groupby('bin_idx')['volume'].sum()
-        
-        # Find POC (Bin with max volume)
-        max_vol_idx = volume_by_bin.idxmax()
-        poc_price = bins[max_vol_idx-1] # -1 because digitize is 1-indexed
-        
-        # Calculate Value Area (70% of total volume)
-        total_volume = volume_by_bin.sum()
-        target_volume = total_volume * 0.70
-        
-        # Sorting bins by volume to accumulate (Traditional VA calc starts at POC and expands, 
-        # but simplified distribution ranking works for general levels)
-        sorted_bins = volume_by_bin.sort_values(ascending=False)
-        
-        accumulated_vol = 0
-        va_indices = []
-        
-        for idx, vol in sorted_bins.items():
-            accumulated_vol += vol
-            va_indices.append(idx)
-            if accumulated_vol >= target_volume:
-                break
-                
-        # Determine VAH and VAL from the indices in the Value Area
-        va_prices = [bins[i-1] for i in va_indices if 0 <= i-1 < len(bins)]
-        
-        if not va_prices:
-            vah = max_price
-            val = min_price
-        else:
-            vah = max(va_prices)
-            val = min(va_prices)
-            
-        return {
-            "POC": round(poc_price, 4),
-            "VAH": round(vah, 4),
-            "VAL": round(val, 4),
-            "profile_str": f"POC: {poc_price:.4f} | VA: [{val:.4f} - {vah:.4f}]"
-        }
+        bin_size = price_range / n_bins
+        first, hist = distribute_volume(low, high, volume, bin_size, origin=min_price)
+        return summarize_profile(first, hist, bin_size, origin=min_price)
 
     except Exception as e:
         logger.error(f"Volume Profile Error: {e}")
         return {"POC": 0, "VAH": 0, "VAL": 0, "profile_str": "Error"}
+
+
+class RollingVolumeProfile:
+    """
+    Volume profile of the last `lookback` closed candles on a fixed price grid.
+    update() adds the candles closed since the last call and subtracts those that
+    leave the lookback (O(bins spanned) per candle); every REBUILD_EVERY candles the
+    histogram is rebuilt from the window to shed float drift and empty edge bins.
+    """
+
+    def __init__(self, lookback: int = 24, bin_size: float = None, bin_pct: float = ROLLING_BIN_PCT):
+        self.lookback = lookback
+        self.bin_size = bin_size
+        self.bin_pct = bin_pct
+        self.window = deque()    # (ts, low, high, volume) of the candles in the profile
+        self.first_bin = 0
+        self.hist = np.zeros(0)
+        self._since_rebuild = 0
+        self._lock = threading.Lock()
+
+    def update(self, df_closed) -> 'RollingVolumeProfile':
+        frame = df_closed if isinstance(df_closed, CandleFrame) else CandleFrame.from_dataframe(df_closed)
+        if frame.empty:
+            return self
+        ts = frame['timestamp']
+        with self._lock:
+            last_ts = self.window[-1][0] if self.window else None
+            start = int(np.searchsorted(ts, last_ts, side='right')) if last_ts is not None else 0
+            new = len(ts) - start
+            if not new:
+                return self
+
+            # Contiguous with what we hold? Otherwise (gap, first call, long absence) reseed.
+            contiguous = last_ts is not None and start > 0 and ts[start - 1] == last_ts
+            if self.bin_size is None:
+                self.bin_size = float(frame['close'][-1]) * self.bin_pct
+            low, high, volume = frame['low'], frame['high'], frame['volume']
+
+            if not contiguous or new >= self.lookback:
+                keep = slice(max(len(ts) - self.lookback, 0), len(ts))
+                self.window = deque(zip(ts[keep].tolist(), low[keep].tolist(), high[keep].tolist(), volume[keep].tolist()))
+                self._rebuild()
+                return self
+
+            for i in range(start, len(ts)):
+                candle = (int(ts[i]), float(low[i]), float(high[i]), float(volume[i]))
+                self.window.append(candle)
+                self._apply(candle, 1.0)
+                if len(self.window) > self.lookback:
+                    self._apply(self.window.popleft(), -1.0)
+            self._since_rebuild += new
+            if self._since_rebuild >= REBUILD_EVERY:
+                self._rebuild()
+        return self
+
+    def _apply(self, candle: tuple, sign: float):
+        first, hist = distribute_volume(candle[1], candle[2], candle[3], self.bin_size)
+        if not len(hist):
+            return
+        # Grow the histogram to cover the candle's bins
+        if not len(self.hist):
+            self.first_bin, self.hist = first, np.zeros(len(hist))
+        pad_lo = max(self.first_bin - first, 0)
+        pad_hi = max(first + len(hist) - (self.first_bin + len(self.hist)), 0)
+        if pad_lo or pad_hi:
+            self.hist = np.concatenate((np.zeros(pad_lo), self.hist, np.zeros(pad_hi)))
+            self.first_bin -= pad_lo
+        offset = first - self.first_bin
+        self.hist[offset:offset + len(hist)] += sign * hist
+
+    def _rebuild(self):
+        if self.window:
+            _, low, high, volume = zip(*self.window)
+            self.first_bin, self.hist = distribute_volume(low, high, volume, self.bin_size)
+        else:
+            self.first_bin, self.hist = 0, np.zeros(0)
+        self._since_rebuild = 0
+
+    def summary(self) -> dict:
+        with self._lock:
+            hist = np.where(self.hist > 1e-9 * max(self.hist.max(initial=0.0), 1.0), self.hist, 0.0) # Subtraction residue
+            occupied = np.flatnonzero(hist)
+            if len(occupied): # Trim the empty edges left by candles that rolled out
+                hist = hist[occupied[0]:occupied[-1] + 1]
+                return summarize_profile(self.first_bin + int(occupied[0]), hist, self.bin_size)
+            return summarize_profile(self.first_bin, hist, self.bin_size or 0.0)
+
+
+class ProfileBook:
+    """One RollingVolumeProfile per (symbol, timeframe)."""
+
+    def __init__(self, lookback: int = 24):
+        self.lookback = lookback
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def rolling(self, symbol: str, timeframe: str) -> RollingVolumeProfile:
+        with self._lock:
+            return self._profiles.setdefault((symbol, timeframe), RollingVolumeProfile(self.lookback))
+
+
+# Global Profile Book (rolled once per closed candle through feature_cache)
+profile_book = ProfileBook()
@@ -0,0 +1,332 @@
+# market_stream.py
+# Module: Market Stream
+# Description: WebSocket kline/bookTicker feed (Binance USD-M Futures combined streams).
+# Keeps a live in-memory last-price and forming-candle table for every configured pair,
+# writes closed candles into the candle store, optionally feeds aggTrades to the trade-flow
+# engine, and ships a local replay server for offline tests.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+import aiohttp
+from aiohttp import web
+
+from candle_store import candle_store
+from trade_flow import trade_flow_book
+
+logger = logging.getLogger("market_stream")
+
+STREAM_URL = os.getenv("MARKET_STREAM_URL", "wss://fstream.binance.com/stream")
+STREAM_MAX_AGE_SECONDS = 5.0    # Older quotes are considered stale -> REST fallback
+RECONNECT_BACKOFF_MAX = 30.0
+HEARTBEAT_SECONDS = 20.0
+
+
+def to_stream_symbol(symbol: str) -> str:
+    """'ETH/USDT' -> 'ethusdt' (Binance stream naming)."""
+    return symbol.split(':')[0].replace('/', '').lower()
+
+
+def build_stream_names(pairs: list, timeframes: list, agg_trades: bool = False) -> list:
+    names = []
+    for pair in pairs:
+        raw = to_stream_symbol(pair)
+        for tf in timeframes:
+            names.append(f"{raw}@kline_{tf}")
+        names.append(f"{raw}@bookTicker")
+        if agg_trades:
+            names.append(f"{raw}@aggTrade")
+    return names
+
+
+class LiveMarketTable:
+    """
+    Thread-safe table of the latest quote and forming candles per symbol.
+    Written by the stream thread, read by the trading loop.
+    """
+
+    def __init__(self):
+        self._prices = {}    # symbol -> {'price', 'bid', 'ask', 'ts'}
+        self._candles = {}   # (symbol, timeframe) -> {'t', 'open', 'high', 'low', 'close', 'volume', 'closed', 'ts'}
+        self._lock = threading.Lock()
+
+    def update_quote(self, symbol: str, price: float, bid: float = None, ask: float = None):
+        with self._lock:
+            quote = self._prices.setdefault(symbol, {'price': 0.0, 'bid': None, 'ask': None, 'ts': 0.0})
+            quote['price'] = price
+            if bid is not None:
+                quote['bid'] = bid
+            if ask is not None:
+                quote['ask'] = ask
+            quote['ts'] = time.time()
+
+    def update_candle(self, symbol: str, timeframe: str, candle: dict):
+        with self._lock:
+            self._candles[(symbol, timeframe)] = dict(candle, ts=time.time())
+
+    def last_price(self, symbol: str, max_age: float = STREAM_MAX_AGE_SECONDS):
+        """Latest streamed price, or None if missing/stale."""
+        with self._lock:
+            quote = self._prices.get(symbol)
+            if not quote or quote['price'] <= 0:
+                return None
+            if (time.time() - quote['ts']) > max_age:
+                return None
+            return quote['price']
+
+    def quote(self, symbol: str) -> dict:
+        with self._lock:
+            return dict(self._prices.get(symbol, {}))
+
+    def forming_candle(self, symbol: str, timeframe: str, max_age: float = STREAM_MAX_AGE_SECONDS):
+        """Latest streamed candle for (symbol, timeframe), or None if missing/stale."""
+        with self._lock:
+            candle = self._candles.get((symbol, timeframe))
+            if not candle or (time.time() - candle['ts']) > max_age:
+                return None
+            return dict(candle)
+
+
+# Global Live Table (read by trading_tools.get_current_price / fetch_market_data)
+live_table = LiveMarketTable()
+
+
+class MarketStream:
+    """
+    Background WebSocket consumer. Runs its own asyncio loop in a daemon thread
+    and reconnects with exponential backoff. Optionally records raw messages
+    to a JSONL file that ReplayServer can play back.
+    """
+
+    def __init__(self, pairs: list, timeframes: list, url: str = STREAM_URL,
+                 table: LiveMarketTable = None, store=None, record_path: str = None,
+                 agg_trades: bool = False, flow_book=None):
+        self.pairs = list(pairs)
+        self.timeframes = list(timeframes)
+        self.url = url
+        self.table = table or live_table
+        self.store = store or candle_store
+        self.record_path = record_path
+        self.agg_trades = agg_trades
+        self.flow_book = flow_book or trade_flow_book
+        self.symbol_map = {to_stream_symbol(p).upper(): p for p in self.pairs}
+        self.messages = 0
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def stream_url(self) -> str:
+        return f"{self.url}?streams={'/'.join(build_stream_names(self.pairs, self.timeframes, self.agg_trades))}"
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        if self.agg_trades:
+            self.flow_book.calibrate(self.pairs)  # Disk reads here, not on the stream thread
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._run()), name="MarketStream", daemon=True)
+        self._thread.start()
+        logger.info(f"📡 Market stream started for {len(self.pairs)} pairs ({', '.join(self.timeframes)})")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    async def _run(self):
+        backoff = 1.0
+        record = open(self.record_path, 'a', encoding='utf-8') if self.record_path else None
+        try:
+            while not self._stop.is_set():
+                try:
+                    async with aiohttp.ClientSession() as session:
+                        async with session.ws_connect(self.stream_url(), heartbeat=HEARTBEAT_SECONDS) as ws:
+                            self.connected.set()
+                            backoff = 1.0
+                            while not self._stop.is_set():
+                                try:
+                                    msg = await ws.receive(timeout=1.0)
+                                except asyncio.TimeoutError:
+                                    continue
+                                if msg.type == aiohttp.WSMsgType.TEXT:
+                                    if record:
+                                        record.write(msg.data + "\n")
+                                    self.handle_message(msg.data)
+                                elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                    break
+                except Exception as e:
+                    logger.warning(f"Market stream disconnected: {e}")
+
+                self.connected.clear()
+                if self._stop.is_set():
+                    break
+                logger.info(f"Reconnecting market stream in {backoff:.0f}s...")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+        finally:
+            if record:
+                record.close()
+
+    def handle_message(self, raw: str):
+        """Parses one combined-stream message and updates table/store."""
+        try:
+            payload = json.loads(raw)
+            data = payload.get('data', payload)
+            event = data.get('e')
+            symbol = self.symbol_map.get(str(data.get('s', '')).upper())
+            if symbol is None:
+                return
+            self.messages += 1
+
+            if event == 'kline':
+                self._on_kline(symbol, data['k'])
+            elif event == 'aggTrade':
+                self.flow_book.on_agg_trade(symbol, data)
+            elif 'b' in data and 'a' in data and event in (None, 'bookTicker'):
+                bid = float(data['b'])
+                ask = float(data['a'])
+                self.table.update_quote(symbol, (bid + ask) / 2, bid=bid, ask=ask)
+        except Exception as e:
+            logger.error(f"Bad stream message: {e}")
+
+    def _on_kline(self, symbol: str, k: dict):
+        candle = {
+            't': int(k['t']),
+            'open': float(k['o']),
+            'high': float(k['h']),
+            'low': float(k['l']),
+            'close': float(k['c']),
+            'volume': float(k['v']),
+            'closed': bool(k['x'])
+        }
+        timeframe = k['i']
+        self.table.update_candle(symbol, timeframe, candle)
+        self.table.update_quote(symbol, candle['close'])
+
+        if candle['closed']:
+            self.store.merge(symbol, timeframe, [[candle['t'], candle['open'], candle['high'],
+                                                  candle['low'], candle['close'], candle['volume']]])
+
+
+# =============================================================================
+# REPLAY SERVER (Offline testing)
+# =============================================================================
+
+class ReplayServer:
+    """
+    Serves a recorded JSONL stream (one combined-stream message per line) over a
+    local WebSocket, mimicking the Binance endpoint. Any path is accepted, so
+    MarketStream can point at ws://host:port/stream unchanged.
+    """
+
+    def __init__(self, path: str, host: str = '127.0.0.1', port: int = 0, interval: float = 0.0, loop_forever: bool = False):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.loop_forever = loop_forever
+        self.ready = threading.Event()
+        self._runner = None
+        self._loop = None
+        self._thread = None
+
+    def _lines(self) -> list:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    async def _handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        lines = self._lines()
+        while True:
+            for line in lines:
+                if ws.closed:
+                    return ws
+                await ws.send_str(line)
+                await asyncio.sleep(self.interval)
+            if not self.loop_forever:
+                break
+        # Keep the socket open (like the exchange) until the client leaves
+        async for _ in ws:
+            pass
+        return ws
+
+    async def serve(self):
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', self._handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"🎞️ Replay server on ws://{self.host}:{self.port}/stream ({self.path})")
+        self.ready.set()
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/stream"
+
+    def start(self, timeout: float = 5.0):
+        """Runs the server in a background thread; returns once it is listening."""
+        def _target():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.serve())
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=_target, name="ReplayServer", daemon=True)
+        self._thread.start()
+        if not self.ready.wait(timeout):
+            raise RuntimeError("Replay server failed to start")
+        return self
+
+    def stop(self):
+        if self._loop and self._runner:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Market stream tools (record / replay)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    rec = sub.add_parser('record', help="Record the live stream to a JSONL file")
+    rec.add_argument('output')
+    rec.add_argument('--pairs', nargs='+', default=['ETH/USDT'])
+    rec.add_argument('--timeframes', nargs='+', default=['15m'])
+    rec.add_argument('--seconds', type=float, default=60.0)
+    rec.add_argument('--agg-trades', action='store_true', help="Also record aggTrade streams")
+
+    rep = sub.add_parser('replay', help="Serve a recorded JSONL file as a local WebSocket")
+    rep.add_argument('input')
+    rep.add_argument('--port', type=int, default=8765)
+    rep.add_argument('--interval', type=float, default=0.1)
+    rep.add_argument('--loop', action='store_true')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.command == 'record':
+        stream = MarketStream(args.pairs, args.timeframes, record_path=args.output, agg_trades=args.agg_trades)
+        stream.start()
+        time.sleep(args.seconds)
+        stream.stop()
+        print(f"Recorded {stream.messages} messages to {args.output}")
+    else:
+        server = ReplayServer(args.input, port=args.port, interval=args.interval, loop_forever=args.loop).start()
+        print(f"Replaying {args.input} on {server.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
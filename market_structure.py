@@ -0,0 +1,230 @@
+# market_structure.py
+# Module: Market Structure Tracker
+# Description: Stateful BOS/CHoCH tracking per (symbol, timeframe). Newly confirmed
+# swings and newly closed candles are consumed incrementally; swing history, bias and
+# the break-event timeline persist in state.json ('market_structure'), so a structure
+# query on every tick is O(1) and the dashboard can show the full event timeline.
+
+import logging
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+
+from candle_store import timeframe_to_ms
+from candle_frame import CandleFrame
+from trading_tools import find_swing_points
+
+logger = logging.getLogger("market_structure")
+
+SWING_LOOKBACK = 5   # Fractal half-width (same as the 4H structure loop)
+MAX_SWINGS = 50      # Swing highs/lows kept per key
+MAX_EVENTS = 100     # BOS/CHoCH events kept per key
+
+
+def structure_key(symbol: str, timeframe: str) -> str:
+    return f"{symbol}|{timeframe}"
+
+
+def _time_str(ts_ms: int) -> str:
+    return str(pd.Timestamp(int(ts_ms), unit='ms'))
+
+
+class StructureTracker:
+    """
+    Structure of one (symbol, timeframe), advanced one closed candle at a time.
+    A swing at index j is confirmed when candle j+lookback closes. A close beyond the
+    last unbroken swing is a break: BOS with the bias, CHoCH against it (bias flips).
+    """
+
+    def __init__(self, lookback: int = SWING_LOOKBACK):
+        self.lookback = lookback
+        self.last_ts = None          # Last closed candle consumed (epoch ms)
+        self.bias = 'NEUTRAL'
+        self.highs = deque(maxlen=MAX_SWINGS)   # {'ts', 'time', 'price'}
+        self.lows = deque(maxlen=MAX_SWINGS)
+        self.events = deque(maxlen=MAX_EVENTS)  # {'ts', 'time', 'type', 'direction', 'level', 'close'}
+        self.broken_high_ts = None   # Swing already broken (one event per swing)
+        self.broken_low_ts = None
+        self._lock = threading.RLock()
+
+    # --- Incremental update ---
+
+    def advance(self, df_closed, timeframe: str) -> int:
+        """
+        Consumes the closed candles of `df_closed` (DataFrame or CandleFrame) newer than
+        last_ts. Reseeds from the whole window when there is no state or a gap.
+        Returns the number of candles processed.
+        """
+        frame = df_closed if isinstance(df_closed, CandleFrame) else CandleFrame.from_dataframe(df_closed)
+        if frame.empty:
+            return 0
+        ts = frame['timestamp']
+        tf_ms = timeframe_to_ms(timeframe)
+
+        with self._lock:
+            start = 0
+            if self.last_ts is not None:
+                start = int(np.searchsorted(ts, self.last_ts, side='right'))
+                if start < len(ts) and ts[start] != self.last_ts + tf_ms:
+                    logger.info(f"Structure state out of sync ({timeframe}). Reseeding from {len(ts)} candles.")
+                    self._reset()
+                    start = 0
+            if start >= len(ts):
+                return 0
+
+            swings = find_swing_points(frame, self.lookback)
+            close = frame['close']
+            # Swing j is confirmed by candle j+lookback: walk both in candle order
+            confirm = sorted(
+                [(j + self.lookback, j, 'high', p) for j, p in zip(swings['high_idx'].tolist(), swings['high_price'].tolist())] +
+                [(j + self.lookback, j, 'low', p) for j, p in zip(swings['low_idx'].tolist(), swings['low_price'].tolist())])
+            pos = 0
+            while pos < len(confirm) and confirm[pos][0] < start:
+                pos += 1
+
+            for k in range(start, len(ts)):
+                while pos < len(confirm) and confirm[pos][0] == k:
+                    _, j, kind, price = confirm[pos]
+                    self._add_swing(kind, int(ts[j]), price)
+                    pos += 1
+                self._check_break(int(ts[k]), float(close[k]))
+                self.last_ts = int(ts[k])
+
+        return len(ts) - start
+
+    def _reset(self):
+        self.last_ts = None
+        self.bias = 'NEUTRAL'
+        self.highs.clear()
+        self.lows.clear()
+        self.events.clear()
+        self.broken_high_ts = None
+        self.broken_low_ts = None
+
+    def _add_swing(self, kind: str, ts: int, price: float):
+        swings = self.highs if kind == 'high' else self.lows
+        if swings and swings[-1]['ts'] >= ts:
+            return  # Already known (overlapping windows)
+        swings.append({'ts': ts, 'time': _time_str(ts), 'price': price})
+
+    def _check_break(self, ts: int, close: float):
+        if self.highs and self.broken_high_ts != self.highs[-1]['ts'] and close > self.highs[-1]['price']:
+            self.broken_high_ts = self.highs[-1]['ts']
+            self._record(ts, 'BULLISH', self.highs[-1]['price'], close)
+        if self.lows and self.broken_low_ts != self.lows[-1]['ts'] and close < self.lows[-1]['price']:
+            self.broken_low_ts = self.lows[-1]['ts']
+            self._record(ts, 'BEARISH', self.lows[-1]['price'], close)
+
+    def _record(self, ts: int, direction: str, level: float, close: float):
+        event_type = 'CHoCH' if self.bias not in ('NEUTRAL', direction) else 'BOS'
+        self.bias = direction
+        self.events.append({'ts': ts, 'time': _time_str(ts), 'type': event_type,
+                            'direction': direction, 'level': level, 'close': close})
+        logger.debug(f"{event_type} {direction}: close {close:.2f} broke {level:.2f} ({_time_str(ts)})")
+
+    # --- O(1) queries ---
+
+    def snapshot(self, current_price: float = None) -> dict:
+        """
+        Same keys as trading_tools.detect_market_structure, from the tracked state.
+        Breaks confirmed on the last closed candle count as detected; the live price is
+        checked against the last unbroken swings (a CHoCH there flips the reported bias).
+        """
+        with self._lock:
+            last_high = self.highs[-1] if self.highs else None
+            last_low = self.lows[-1] if self.lows else None
+            last_event = dict(self.events[-1]) if self.events else None
+            result = {
+                'bias': self.bias,
+                'bos_detected': False,
+                'choch_detected': False,
+                'last_swing_high': last_high['price'] if last_high else None,
+                'last_swing_low': last_low['price'] if last_low else None,
+                'prev_swing_high': self.highs[-2]['price'] if len(self.highs) >= 2 else None,
+                'prev_swing_low': self.lows[-2]['price'] if len(self.lows) >= 2 else None,
+                'structure_valid': len(self.highs) >= 2 and len(self.lows) >= 2,
+                'last_event': last_event,
+                'events_count': len(self.events)
+            }
+            high_open = last_high is not None and self.broken_high_ts != last_high['ts']
+            low_open = last_low is not None and self.broken_low_ts != last_low['ts']
+            fresh = last_event is not None and last_event['ts'] == self.last_ts
+
+        if fresh:
+            result['bos_detected' if last_event['type'] == 'BOS' else 'choch_detected'] = True
+
+        if current_price and result['structure_valid']:
+            above = high_open and current_price > last_high['price']
+            below = low_open and current_price < last_low['price']
+            if (result['bias'] == 'BULLISH' and above) or (result['bias'] == 'BEARISH' and below):
+                result['bos_detected'] = True
+            elif result['bias'] == 'BULLISH' and below:
+                result['choch_detected'] = True
+                result['bias'] = 'BEARISH'
+            elif result['bias'] == 'BEARISH' and above:
+                result['choch_detected'] = True
+                result['bias'] = 'BULLISH'
+        return result
+
+    def timeline(self, limit: int = None) -> list:
+        """Break events, oldest first (last `limit` if given)."""
+        with self._lock:
+            events = list(self.events)
+        return events[-limit:] if limit else events
+
+    # --- Persistence ---
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'lookback': self.lookback,
+                'last_ts': self.last_ts,
+                'bias': self.bias,
+                'highs': list(self.highs),
+                'lows': list(self.lows),
+                'events': list(self.events),
+                'broken_high_ts': self.broken_high_ts,
+                'broken_low_ts': self.broken_low_ts
+            }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'StructureTracker':
+        tracker = cls(data.get('lookback', SWING_LOOKBACK))
+        tracker.last_ts = data.get('last_ts')
+        tracker.bias = data.get('bias', 'NEUTRAL')
+        tracker.highs.extend(data.get('highs', []))
+        tracker.lows.extend(data.get('lows', []))
+        tracker.events.extend(data.get('events', []))
+        tracker.broken_high_ts = data.get('broken_high_ts')
+        tracker.broken_low_ts = data.get('broken_low_ts')
+        return tracker
+
+
+class StructureBook:
+    """One StructureTracker per (symbol, timeframe), restored lazily from state.json."""
+
+    def __init__(self, lookback: int = SWING_LOOKBACK):
+        self.lookback = lookback
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def tracker(self, symbol: str, timeframe: str, state: dict = None) -> StructureTracker:
+        key = structure_key(symbol, timeframe)
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                saved = (state or {}).get('market_structure', {}).get(key)
+                if saved:
+                    try:
+                        tracker = StructureTracker.from_dict(saved)
+                        logger.info(f"Structure restored for {key} ({tracker.bias}, {len(tracker.events)} events)")
+                    except Exception as e:
+                        logger.error(f"Structure state corrupted for {key}: {e}. Starting fresh.")
+                tracker = tracker or StructureTracker(self.lookback)
+                self._trackers[key] = tracker
+            return tracker
+
+
+# Global Structure Book (shared by the structure loop and the pair workers)
+structure_book = StructureBook()
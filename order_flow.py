@@ -1,10 +1,90 @@
 import pandas as pd
 import numpy as np
 import logging
+from candle_frame import col
 
 logger = logging.getLogger("order_flow")
 
-def calculate_vpin_pro(df: pd.DataFrame, n_buckets: int = 10, bucket_size_factor: float = 1.0) -> float:
+def _volume_curves(df):
+    """
+    Cumulative volume and cumulative buy volume at candle boundaries (length n + 1).
+    Buy volume proxy (Bulk Volume Classification, OHLC form): relative position of
+    the close in the candle, clipped to 0-1. Within a candle buy volume accrues
+    linearly with volume, so any volume slice of it gets a proportional share.
+    """
+    high = col(df, 'high')
+    low = col(df, 'low')
+    close = col(df, 'close')
+    volume = np.nan_to_num(col(df, 'volume'), nan=0.0)
+
+    price_range = high - low
+    price_range[price_range == 0] = 0.000001 # Avoid div by zero
+    buy_ratio = np.nan_to_num(np.clip((close - low) / price_range, 0, 1), nan=0.5)
+
+    cum_vol = np.concatenate(([0.0], np.cumsum(volume)))
+    cum_buy = np.concatenate(([0.0], np.cumsum(volume * buy_ratio)))
+    return cum_vol, cum_buy
+
+
+def _bucket_imbalances(cum_vol, cum_buy, edges) -> np.ndarray:
+    """|Buy - Sell| / V for the buckets between consecutive cumulative-volume edges."""
+    buy_at = np.interp(edges, cum_vol, cum_buy) # Candles split proportionally at each edge
+    bucket_vol = np.diff(edges)
+    bucket_buy = np.diff(buy_at)
+    return np.abs(2 * bucket_buy - bucket_vol) / bucket_vol
+
+
+def _bucket_volume(cum_vol, n_candles: int, bucket_size_factor: float, bucket_volume=None) -> float:
+    """Bucket size V: explicit, or the average candle volume times the factor."""
+    if bucket_volume:
+        return float(bucket_volume)
+    return cum_vol[-1] / n_candles * bucket_size_factor if n_candles else 0.0
+
+
+def vpin_series(df, n_buckets: int = 10, bucket_size_factor: float = 1.0, bucket_volume: float = None) -> dict:
+    """
+    Full VPIN time series over equal-volume buckets (vectorized).
+    Bucket edges are multiples of V on the cumulative volume curve, located with
+    searchsorted; a candle straddling an edge has its volume split proportionally.
+    
+    Args:
+        df: DataFrame or CandleFrame with OHLCV data.
+        n_buckets: Buckets averaged per VPIN value.
+        bucket_size_factor: Multiplier for average candle volume to define bucket size.
+        bucket_volume: Explicit bucket size V (overrides the factor).
+    
+    Returns:
+        dict: 'bucket_volume' (V), per bucket 'imbalance', 'vpin' (rolling mean of the
+        last n_buckets, NaN until enough buckets) and 'end_idx' (candle completing it),
+        plus 'candle_vpin': latest completed VPIN at each candle (NaN before the first).
+    """
+    cum_vol, cum_buy = _volume_curves(df)
+    n = len(cum_vol) - 1
+    V = _bucket_volume(cum_vol, n, bucket_size_factor, bucket_volume)
+    empty = np.empty(0)
+    if not V > 0 or cum_vol[-1] < V:
+        return {'bucket_volume': V, 'imbalance': empty, 'vpin': empty,
+                'end_idx': np.empty(0, dtype=np.int64), 'candle_vpin': np.full(n, np.nan)}
+
+    edges = np.arange(int(cum_vol[-1] // V) + 1) * V
+    imbalance = _bucket_imbalances(cum_vol, cum_buy, edges)
+    end_idx = np.searchsorted(cum_vol, edges[1:], side='left') - 1
+
+    # Rolling mean of the last n_buckets imbalances
+    window = max(int(n_buckets), 1)
+    csum = np.concatenate(([0.0], np.cumsum(imbalance)))
+    vpin = np.full(len(imbalance), np.nan)
+    vpin[window - 1:] = (csum[window:] - csum[:-window]) / window
+
+    # Candle-aligned: each candle sees the VPIN of the last bucket completed by it
+    last_bucket = np.searchsorted(end_idx, np.arange(n), side='right') - 1
+    candle_vpin = np.where(last_bucket >= 0, vpin[np.maximum(last_bucket, 0)], np.nan)
+
+    return {'bucket_volume': V, 'imbalance': imbalance, 'vpin': vpin,
+            'end_idx': end_idx, 'candle_vpin': candle_vpin}
+
+
+def calculate_vpin_pro(df, n_buckets: int = 10, bucket_size_factor: float = 1.0, bucket_volume: float = None) -> float:
     """
     Calculates the VPIN (Volume-Synchronized Probability of Informed Trading).
     This is a 'Pro' version that uses Volume Buckets for better toxicity detection.
@@ -12,72 +92,31 @@ def calculate_vpin_pro(df: pd.DataFrame, n_buckets: int = 10, bucket_size_factor
     Logic:
     1. Determine the average volume per bucket.
     2. Approximate Buy/Sell volume within each candle using price relative position.
-    3. Aggregate volume into buckets of size V.
-    4. Calculate cumulative imbalance in the buckets.
+    3. Cut the last n_buckets buckets of size V backwards from the newest candle
+       (cumulative-volume edges, candles split proportionally across edges).
+    4. Average the bucket imbalances.
     
     Args:
-        df: DataFrame with OHLCV data.
+        df: DataFrame or CandleFrame with OHLCV data.
         n_buckets: Number of buckets to look back for the VPIN average.
         bucket_size_factor: Multiplier for average volume to define bucket size.
+        bucket_volume: Explicit bucket size V (overrides the factor).
         
     Returns:
         float: VPIN score (0.0 to 1.0). High (> 0.7) means toxic flow/informed trading.
     """
     try:
-        # 1. Estimate Buy/Sell Volume using the 'Bulk Volume Classification' method:
-        # Buy Volume = Total Volume * CDF((Close - Mean) / StdDev)
-        # Simplified OHLC Proxy: (Close - Low) / (High - Low)
-        
-        subset = df.copy()
-        price_range = subset['high'] - subset['low']
-        price_range = price_range.replace(0, 0.000001) # Avoid div by zero
-        
-        # Buy volume proxy: Relative position of close in the candle
-        buy_ratio = (subset['close'] - subset['low']) / price_range
-        # Limit to 0-1 for crazy wicks
-        buy_ratio = buy_ratio.clip(0, 1)
-        
-        subset['buy_vol'] = subset['volume'] * buy_ratio
-        subset['sell_vol'] = subset['volume'] * (1 - buy_ratio)
-        
-        # 2. Define Bucket Size (Avg volume of the lookback period)
-        avg_vol = subset['volume'].mean()
-        V = avg_vol * bucket_size_factor
-        
-        # 3. Aggregate into Volume Buckets
-        # We process candles one by one to fill 'buckets' of size V
-        c_buy_vol = 0
-        c_sell_vol = 0
-        c_vol = 0
-        imbalances = []
-        
-        # Iterate backwards through enough data to fill n_buckets
-        # We need roughly n_buckets * bucket_size_factor candles
-        for i in range(len(subset) - 1, -1, -1):
-            row = subset.iloc[i]
-            
-            # Add to current bucket
-            c_buy_vol += row['buy_vol']
-            c_sell_vol += row['sell_vol']
-            c_vol += row['volume']
-            
-            # If bucket is full (or we ran out of data)
-            if c_vol >= V:
-                # Calculate imbalance for this bucket: |Buy - Sell| / Total
-                imbalances.append(abs(c_buy_vol - c_sell_vol) / c_vol)
-                # Reset for next bucket
-                c_buy_vol = 0
-                c_sell_vol = 0
-                c_vol = 0
-                
-            if len(imbalances) >= n_buckets:
-                break
-                
-        if not imbalances:
+        cum_vol, cum_buy = _volume_curves(df)
+        V = _bucket_volume(cum_vol, len(cum_vol) - 1, bucket_size_factor, bucket_volume)
+        if not V > 0:
+            return 0.5
+
+        # Buckets anchored at the newest candle (fewer if history is short)
+        count = min(int(n_buckets), int(cum_vol[-1] // V))
+        if count < 1:
             return 0.5
-            
-        # VPIN is the average of imbalances over history
-        vpin = np.mean(imbalances)
+        edges = cum_vol[-1] - np.arange(count, -1, -1) * V
+        vpin = np.mean(_bucket_imbalances(cum_vol, cum_buy, edges))
         
         return round(float(vpin), 3)
 
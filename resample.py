@@ -0,0 +1,94 @@
+# resample.py
+# Module: Timeframe Resampler
+# Description: Builds higher-timeframe OHLCV bars (1h, 4h, 1d...) from the stored
+# base-timeframe candles, so every timeframe comes from the same 15m data and
+# costs no extra exchange requests.
+
+import logging
+import numpy as np
+import pandas as pd
+
+from candle_store import candle_store, timeframe_to_ms, COLUMNS, PRICE_COLUMNS
+
+logger = logging.getLogger("resample")
+
+BASE_TIMEFRAME = '15m'
+
+
+def base_candles_needed(timeframe: str, limit: int, base_timeframe: str = BASE_TIMEFRAME) -> int:
+    """Base candles required to build `limit` bars of `timeframe` (+1 bar for a partial leading bucket)."""
+    ratio = timeframe_to_ms(timeframe) // timeframe_to_ms(base_timeframe)
+    return (limit + 1) * ratio
+
+
+def resample_columns(cols: dict, timeframe: str, base_timeframe: str = BASE_TIMEFRAME) -> dict:
+    """
+    Aggregates base OHLCV column arrays into `timeframe` bars aligned to UTC
+    (same bucket boundaries as Binance: 1h, 4h and 1d bars open at multiples of their length).
+
+    - open = first, high = max, low = min, close = last, volume = sum of the base candles.
+    - The newest bar is kept even if its bucket is not complete: it is the forming bar,
+      exactly like the exchange returns it (callers treat iloc[-1] as forming).
+    - A leading bucket whose first base candle is missing is dropped (history starts mid-bar).
+    """
+    target_ms = timeframe_to_ms(timeframe)
+    base_ms = timeframe_to_ms(base_timeframe)
+    if target_ms % base_ms:
+        raise ValueError(f"Cannot build {timeframe} bars from {base_timeframe} candles")
+
+    ts = cols['timestamp']
+    if len(ts) == 0:
+        return {name: cols[name][:0].copy() for name in COLUMNS}
+
+    buckets = ts - ts % target_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+
+    out = {
+        'timestamp': buckets[starts],
+        'open': cols['open'][starts],
+        'high': np.maximum.reduceat(cols['high'], starts),
+        'low': np.minimum.reduceat(cols['low'], starts),
+        'close': cols['close'][ends],
+        'volume': np.add.reduceat(cols['volume'], starts),
+    }
+
+    if ts[0] != buckets[0] and len(starts) > 1:
+        out = {name: values[1:] for name, values in out.items()}
+
+    return out
+
+
+def resample_ohlcv(df: pd.DataFrame, timeframe: str, base_timeframe: str = BASE_TIMEFRAME) -> pd.DataFrame:
+    """DataFrame version of resample_columns (timestamp column as datetime, like CandleStore.window)."""
+    cols = {'timestamp': df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)}
+    for name in PRICE_COLUMNS:
+        cols[name] = df[name].to_numpy(dtype=np.float64)
+    return _to_frame(resample_columns(cols, timeframe, base_timeframe))
+
+
+def _to_frame(cols: dict) -> pd.DataFrame:
+    data = {'timestamp': pd.to_datetime(cols['timestamp'], unit='ms')}
+    for name in PRICE_COLUMNS:
+        data[name] = cols[name]
+    return pd.DataFrame(data, columns=COLUMNS)
+
+
+def resampled_window(symbol: str, timeframe: str, limit: int, base_timeframe: str = BASE_TIMEFRAME,
+                     store=None) -> pd.DataFrame:
+    """
+    Newest `limit` bars of `timeframe` for `symbol`, built from the stored base candles.
+    Reads only the local candle store (no requests). Base timeframe windows are served as-is.
+    """
+    store = store or candle_store
+    if timeframe == base_timeframe:
+        return store.window(symbol, timeframe, limit)
+
+    cols = store.load(symbol, base_timeframe)
+    start = max(len(cols['timestamp']) - base_candles_needed(timeframe, limit, base_timeframe), 0)
+    tail = {name: values[start:] for name, values in cols.items()}
+    bars = resample_columns(tail, timeframe, base_timeframe)
+
+    if limit:
+        bars = {name: values[-limit:] for name, values in bars.items()}
+    return _to_frame(bars)
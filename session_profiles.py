@@ -0,0 +1,258 @@
+# session_profiles.py
+# Module: Session Profiles
+# Description: Session volume profiles (UTC daily, Monday-start weekly, composite N-day)
+# on a fixed per-symbol price grid. Finished sessions are summarized and persisted once
+# per session; the developing session is updated per closed candle. Prior-session
+# POC/VAH/VAL and naked POCs are served from a cached context dict (O(1) per read).
+
+import os
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+import numpy as np
+
+from candle_frame import CandleFrame
+from market_profile import distribute_volume, summarize_profile, ROLLING_BIN_PCT
+
+logger = logging.getLogger("session_profiles")
+
+SESSION_PROFILE_DIR = os.getenv("SESSION_PROFILE_DIR", "data/profiles")
+DAY_MS = 86_400_000
+KINDS = ('daily', 'weekly')
+MAX_SESSIONS = {'daily': 60, 'weekly': 12}
+COMPOSITE_DAYS = 5     # Composite profile: last 5 finished days
+MAX_NAKED_POCS = 20    # Untested daily POCs kept (newest first)
+
+
+def session_key(ts, kind: str):
+    """UTC day number (daily) or Monday-start week number (weekly) of epoch-ms timestamps."""
+    day = np.floor_divide(ts, DAY_MS)
+    return day if kind == 'daily' else np.floor_divide(day + 3, 7) # 1970-01-01 was a Thursday
+
+
+def session_start(key: int, kind: str) -> int:
+    return int(key) * DAY_MS if kind == 'daily' else (int(key) * 7 - 3) * DAY_MS
+
+
+def _session_label(start_ms: int) -> str:
+    return datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def _accumulate(first_bin: int, hist: np.ndarray, first: int, add: np.ndarray) -> tuple:
+    """hist (starting at first_bin) + add (starting at first), growing the grid as needed."""
+    if not len(add):
+        return first_bin, hist
+    if not len(hist):
+        return first, add.copy()
+    lo = min(first_bin, first)
+    hi = max(first_bin + len(hist), first + len(add))
+    out = np.zeros(hi - lo)
+    out[first_bin - lo:first_bin - lo + len(hist)] += hist
+    out[first - lo:first - lo + len(add)] += add
+    return lo, out
+
+
+def _levels(summary: dict) -> dict:
+    return {'POC': summary['POC'], 'VAH': summary['VAH'], 'VAL': summary['VAL']}
+
+
+class SymbolSessions:
+    """Finished + developing session profiles of one symbol."""
+
+    def __init__(self, bin_size: float = None):
+        self.bin_size = bin_size
+        self.last_ts = None
+        self.developing = {kind: None for kind in KINDS}   # {'key', 'first_bin', 'hist'}
+        self.finished = {kind: deque(maxlen=MAX_SESSIONS[kind]) for kind in KINDS}
+        self.naked_pocs = []                                # [{'level', 'session'}], newest first
+        self._composite = None                              # Rebuilt only when a day finishes
+        self._context = {}
+        self._lock = threading.RLock()
+
+    # --- Updates ---
+
+    def update(self, frame) -> int:
+        """
+        Consumes the closed candles of `frame` (DataFrame or CandleFrame) newer than
+        the last update. Returns the number of sessions finished by this call.
+        """
+        frame = frame if isinstance(frame, CandleFrame) else CandleFrame.from_dataframe(frame)
+        with self._lock:
+            if self.last_ts is not None:
+                frame = frame.since(self.last_ts + 1)
+            if frame.empty:
+                return 0
+            ts, low, high, volume = frame['timestamp'], frame['low'], frame['high'], frame['volume']
+            if self.bin_size is None:
+                self.bin_size = float(frame['close'][0]) * ROLLING_BIN_PCT
+
+            finished = 0
+            for kind in KINDS:
+                keys = session_key(ts, kind)
+                bounds = np.r_[0, np.flatnonzero(np.diff(keys)) + 1, len(ts)]
+                for s, e in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                    key = int(keys[s])
+                    dev = self.developing[kind]
+                    if dev is not None and dev['key'] != key:
+                        self._finish(kind, dev)
+                        finished += 1
+                        dev = None
+                    if dev is None:
+                        dev = self.developing[kind] = {'key': key, 'first_bin': 0, 'hist': np.zeros(0)}
+                    first, add = distribute_volume(low[s:e], high[s:e], volume[s:e], self.bin_size)
+                    dev['first_bin'], dev['hist'] = _accumulate(dev['first_bin'], dev['hist'], first, add)
+                    if kind == 'daily':
+                        self._test_naked(low[s:e], high[s:e])
+
+            self.last_ts = int(ts[-1])
+            self._build_context()
+            return finished
+
+    def _finish(self, kind: str, dev: dict):
+        summary = summarize_profile(dev['first_bin'], dev['hist'], self.bin_size)
+        start = session_start(dev['key'], kind)
+        self.finished[kind].append(dict(_levels(summary), key=dev['key'], session=_session_label(start),
+                                        first_bin=dev['first_bin'], volume=dev['hist'].tolist()))
+        if kind == 'daily' and summary['POC']:
+            self.naked_pocs.insert(0, {'level': summary['POC'], 'session': _session_label(start)})
+            del self.naked_pocs[MAX_NAKED_POCS:]
+            self._build_composite()
+        logger.debug(f"Session {kind} {_session_label(start)} closed: POC {summary['POC']}")
+
+    def _test_naked(self, low: np.ndarray, high: np.ndarray):
+        """Drops naked POCs traded through by these candles (all later than their session)."""
+        if self.naked_pocs and len(low):
+            lo, hi = np.nanmin(low), np.nanmax(high) # Quick reject on the run's overall range
+            self.naked_pocs = [p for p in self.naked_pocs
+                               if not ((lo <= p['level'] <= hi) and ((low <= p['level']) & (high >= p['level'])).any())]
+
+    # --- O(1) reads ---
+
+    def _build_composite(self):
+        days = list(self.finished['daily'])[-COMPOSITE_DAYS:]
+        self._composite = None
+        if days:
+            first_bin, hist = 0, np.zeros(0)
+            for day in days:
+                first_bin, hist = _accumulate(first_bin, hist, day['first_bin'], np.asarray(day['volume']))
+            self._composite = dict(_levels(summarize_profile(first_bin, hist, self.bin_size)), days=len(days))
+
+    def _build_context(self):
+        context = {'bin_size': self.bin_size, 'naked_pocs': list(self.naked_pocs)}
+        for kind in KINDS:
+            prior = self.finished[kind][-1] if self.finished[kind] else None
+            context[f'prior_{kind}'] = (dict(_levels(prior), session=prior['session']) if prior else None)
+            dev = self.developing[kind]
+            context[f'developing_{kind}'] = (_levels(summarize_profile(dev['first_bin'], dev['hist'], self.bin_size))
+                                             if dev is not None and len(dev['hist']) else None)
+        context['composite'] = self._composite
+        self._context = context
+
+    def context(self) -> dict:
+        """Cached levels: prior_daily, prior_weekly, composite, developing_*, naked_pocs."""
+        with self._lock:
+            return self._context
+
+    # --- Persistence ---
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'bin_size': self.bin_size,
+                'last_ts': self.last_ts,
+                'developing': {kind: (dict(dev, hist=dev['hist'].tolist()) if dev else None)
+                               for kind, dev in self.developing.items()},
+                'finished': {kind: list(sessions) for kind, sessions in self.finished.items()},
+                'naked_pocs': self.naked_pocs
+            }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SymbolSessions':
+        sessions = cls(data.get('bin_size'))
+        sessions.last_ts = data.get('last_ts')
+        for kind in KINDS:
+            dev = (data.get('developing') or {}).get(kind)
+            sessions.developing[kind] = dict(dev, hist=np.asarray(dev['hist'], dtype=np.float64)) if dev else None
+            sessions.finished[kind].extend((data.get('finished') or {}).get(kind, []))
+        sessions.naked_pocs = list(data.get('naked_pocs', []))
+        sessions._build_composite()
+        sessions._build_context()
+        return sessions
+
+
+class SessionProfileBook:
+    """
+    One SymbolSessions per symbol, persisted as JSON under `root`. Saved when a session
+    finishes (the saved developing state is exact as of last_ts: the next update resumes there).
+    """
+
+    def __init__(self, root: str = SESSION_PROFILE_DIR):
+        self.root = root
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol: str) -> str:
+        safe_symbol = symbol.replace('/', '_').replace(':', '_')
+        return os.path.join(self.root, f"{safe_symbol}_sessions.json")
+
+    def sessions(self, symbol: str) -> SymbolSessions:
+        with self._lock:
+            sessions = self._sessions.get(symbol)
+            if sessions is None:
+                sessions = SymbolSessions()
+                path = self._path(symbol)
+                if os.path.exists(path):
+                    try:
+                        with open(path, 'r', encoding='utf-8') as f:
+                            sessions = SymbolSessions.from_dict(json.load(f))
+                    except Exception as e:
+                        logger.warning(f"Could not load session profiles for {symbol}: {e}")
+                self._sessions[symbol] = sessions
+            return sessions
+
+    def update(self, symbol: str, frame) -> SymbolSessions:
+        sessions = self.sessions(symbol)
+        if sessions.update(frame):
+            self.save(symbol)
+        return sessions
+
+    def save(self, symbol: str) -> bool:
+        path = self._path(symbol)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.sessions(symbol).to_dict(), f)
+            os.replace(tmp_path, path)  # Atomic swap
+            return True
+        except Exception as e:
+            logger.error(f"Could not save session profiles for {symbol}: {e}")
+            return False
+
+    def context(self, symbol: str) -> dict:
+        return self.sessions(symbol).context()
+
+
+# Global Session Book (updated once per closed 15m candle by the pair workers)
+session_book = SessionProfileBook()
+
+
+def render_sessions(context: dict, price: float = None) -> str:
+    """Prompt block: prior day/week value areas, composite and nearest naked POCs."""
+    if not context:
+        return "No session profiles yet."
+    lines = []
+    for label, key in (("Prior Day", 'prior_daily'), ("Prior Week", 'prior_weekly'),
+                       ("Composite", 'composite'), ("Developing Day", 'developing_daily')):
+        levels = context.get(key)
+        if levels:
+            suffix = f" ({levels['days']}d)" if key == 'composite' else ""
+            lines.append(f"{label}{suffix}: POC {levels['POC']:.4f} | VA [{levels['VAL']:.4f} - {levels['VAH']:.4f}]")
+    naked = context.get('naked_pocs', [])
+    if naked:
+        if price:
+            naked = sorted(naked, key=lambda p: abs(p['level'] - price))
+        lines.append("Naked POCs: " + ", ".join(f"{p['level']:.4f} ({p['session']})" for p in naked[:3]))
+    return "\n".join(lines) if lines else "No session profiles yet."
@@ -0,0 +1,300 @@
+# smart_money.py
+# Module: Smart Money Concepts
+# Description: Vectorized SMC detection over arbitrary history. Fair Value Gaps (with
+# touch/fill tracking), liquidity pivots and equal-high/low liquidity pools are returned
+# as column arrays; strings are rendered only at prompt time and the same records feed
+# the numeric entry filters.
+
+import numpy as np
+import pandas as pd
+
+from candle_frame import col
+
+PIVOT_LOOKBACK = 2        # Strict pivot: beyond 2 candles on each side
+EQUAL_TOLERANCE = 0.001   # Pivots within 0.1% belong to the same liquidity pool
+FVG_WINDOW = 15           # Prompt: gaps formed in the last 15 candles
+LIQUIDITY_WINDOW = 50     # Prompt: pivots in the last 50 candles
+
+
+# =============================================================================
+# PRIMITIVES
+# =============================================================================
+
+def _sparse_min(values: np.ndarray) -> list:
+    """table[k][i] = min(values[i:i + 2**k])."""
+    table = [values]
+    k = 1
+    while (1 << k) <= len(values):
+        prev = table[-1]
+        half = 1 << (k - 1)
+        table.append(np.minimum(prev[:-half], prev[half:]))
+        k += 1
+    return table
+
+
+def first_at_or_below(values: np.ndarray, starts: np.ndarray, levels: np.ndarray) -> np.ndarray:
+    """
+    For every query, the first index j >= starts[q] with values[j] <= levels[q]
+    (len(values) if none). All queries at once: sparse-table minima + binary lifting,
+    O((n + q) log n). NaN never crosses.
+    """
+    n = len(values)
+    pos = np.asarray(starts, dtype=np.int64).copy()
+    levels = np.asarray(levels, dtype=np.float64)
+    if n == 0 or len(pos) == 0:
+        return np.minimum(pos, n)
+    table = _sparse_min(np.where(np.isnan(values), np.inf, values))
+    for k in range(len(table) - 1, -1, -1):
+        span = 1 << k
+        block = table[k]
+        ok = pos + span <= n
+        safe = np.where(ok, pos, 0)
+        skip = ok & (block[np.minimum(safe, len(block) - 1)] > levels)
+        pos = np.where(skip, pos + span, pos)
+    return np.minimum(pos, n)
+
+
+def first_at_or_above(values: np.ndarray, starts: np.ndarray, levels: np.ndarray) -> np.ndarray:
+    """First index j >= starts[q] with values[j] >= levels[q] (len(values) if none)."""
+    return first_at_or_below(-np.asarray(values, dtype=np.float64), starts, -np.asarray(levels, dtype=np.float64))
+
+
+def _timestamps(data, idx: np.ndarray):
+    if 'timestamp' not in data:
+        return None
+    return np.asarray(data['timestamp'])[idx]
+
+
+# =============================================================================
+# DETECTION
+# =============================================================================
+
+def detect_fvgs(data) -> dict:
+    """
+    Three-candle Fair Value Gaps. Bullish: high[i] < low[i+2]; bearish: low[i] > high[i+2].
+    Returns columns (one row per gap, in candle order):
+      'start' (candle 1 index), 'direction' (+1 bull / -1 bear), 'bottom', 'top', 'ts',
+      'touched_at' / 'filled_at' (first later candle entering / closing the gap, -1 if never),
+      'fill_pct' (deepest penetration so far, 0-1).
+    """
+    high = col(data, 'high')
+    low = col(data, 'low')
+    n = len(high)
+    if n < 3:
+        empty_i, empty_f = np.empty(0, dtype=np.int64), np.empty(0)
+        return {'start': empty_i, 'direction': empty_i, 'bottom': empty_f, 'top': empty_f, 'ts': None,
+                'touched_at': empty_i, 'filled_at': empty_i, 'fill_pct': empty_f}
+
+    bull = high[:-2] < low[2:]
+    bear = low[:-2] > high[2:]
+    start = np.flatnonzero(bull | bear)
+    direction = np.where(bull[start], 1, -1)
+    bottom = np.where(direction == 1, high[start], high[start + 2])
+    top = np.where(direction == 1, low[start + 2], low[start])
+
+    # Later candles only (after candle 3)
+    after = start + 3
+    is_bull = direction == 1
+    touched = np.where(is_bull, first_at_or_below(low, after, top), first_at_or_above(high, after, bottom))
+    filled = np.where(is_bull, first_at_or_below(low, after, bottom), first_at_or_above(high, after, top))
+
+    # Deepest penetration: suffix min(low) / max(high) from candle 4 on
+    suffix_low = np.append(np.minimum.accumulate(np.where(np.isnan(low), np.inf, low)[::-1])[::-1], np.inf)
+    suffix_high = np.append(np.maximum.accumulate(np.where(np.isnan(high), -np.inf, high)[::-1])[::-1], -np.inf)
+    depth = np.where(is_bull, top - suffix_low[after], suffix_high[after] - bottom)
+    fill_pct = np.clip(depth / (top - bottom), 0, 1)
+
+    return {
+        'start': start,
+        'direction': direction,
+        'bottom': bottom,
+        'top': top,
+        'ts': _timestamps(data, start + 2),
+        'touched_at': np.where(touched < n, touched, -1),
+        'filled_at': np.where(filled < n, filled, -1),
+        'fill_pct': fill_pct
+    }
+
+
+def detect_pivots(data, lookback: int = PIVOT_LOOKBACK) -> dict:
+    """
+    Strict liquidity pivots: high above (low below) the `lookback` candles on each side.
+    Returns {'high_idx', 'high_price', 'low_idx', 'low_price'}.
+    """
+    high = col(data, 'high')
+    low = col(data, 'low')
+    n = len(high)
+    is_high = np.zeros(n, dtype=bool)
+    is_low = np.zeros(n, dtype=bool)
+    if n > 2 * lookback:
+        centre = slice(lookback, n - lookback)
+        is_high[centre] = True
+        is_low[centre] = True
+        for k in range(1, lookback + 1):
+            for other in (slice(lookback - k, n - lookback - k), slice(lookback + k, n - lookback + k)):
+                is_high[centre] &= high[other] < high[centre]
+                is_low[centre] &= low[other] > low[centre]
+    high_idx, low_idx = np.flatnonzero(is_high), np.flatnonzero(is_low)
+    return {'high_idx': high_idx, 'high_price': high[high_idx], 'low_idx': low_idx, 'low_price': low[low_idx]}
+
+
+def _cluster(prices: np.ndarray, idx: np.ndarray, tolerance: float) -> tuple:
+    """Groups pivot prices whose sorted neighbours are within `tolerance` (relative)."""
+    order = np.argsort(prices, kind='stable')
+    sorted_prices, sorted_idx = prices[order], idx[order]
+    breaks = np.flatnonzero(np.diff(sorted_prices) > tolerance * sorted_prices[1:]) + 1
+    starts = np.r_[0, breaks]
+    return sorted_prices, sorted_idx, starts
+
+
+def detect_liquidity_pools(data, pivots: dict = None, tolerance: float = EQUAL_TOLERANCE) -> dict:
+    """
+    Liquidity pools from pivot clusters. count >= 2 means equal highs/lows.
+    side: +1 buy-side (above highs) / -1 sell-side (below lows).
+    'level' is the extreme of the cluster; 'swept_at' is the first candle after the last
+    pivot that traded through it (-1 if the pool is still resting).
+    """
+    pivots = pivots or detect_pivots(data)
+    high = col(data, 'high')
+    low = col(data, 'low')
+    n = len(high)
+    pools = {name: [] for name in ('side', 'level', 'count', 'first_idx', 'last_idx')}
+
+    for side, prices, idx in ((1, pivots['high_price'], pivots['high_idx']),
+                              (-1, pivots['low_price'], pivots['low_idx'])):
+        if len(prices) == 0:
+            continue
+        sorted_prices, sorted_idx, starts = _cluster(prices, idx, tolerance)
+        reduce_level = np.maximum if side == 1 else np.minimum
+        pools['side'].append(np.full(len(starts), side))
+        pools['level'].append(reduce_level.reduceat(sorted_prices, starts))
+        pools['count'].append(np.diff(np.r_[starts, len(sorted_prices)]))
+        pools['first_idx'].append(np.minimum.reduceat(sorted_idx, starts))
+        pools['last_idx'].append(np.maximum.reduceat(sorted_idx, starts))
+
+    out = {name: (np.concatenate(parts) if parts else np.empty(0, dtype=np.float64 if name == 'level' else np.int64))
+           for name, parts in pools.items()}
+    after = out['last_idx'] + 1
+    swept = np.where(out['side'] == 1, first_at_or_above(high, after, np.nextafter(out['level'], np.inf)),
+                     first_at_or_below(low, after, np.nextafter(out['level'], -np.inf)))
+    out['swept_at'] = np.where(swept < n, swept, -1)
+    return out
+
+
+def analyze(data) -> dict:
+    """FVGs, pivots and liquidity pools for the whole frame (DataFrame or CandleFrame)."""
+    pivots = detect_pivots(data)
+    return {
+        'n': len(data),
+        'fvgs': detect_fvgs(data),
+        'pivots': pivots,
+        'pools': detect_liquidity_pools(data, pivots)
+    }
+
+
+# =============================================================================
+# NUMERIC FILTERS
+# =============================================================================
+
+def open_fvgs(smc: dict, direction: int = None) -> np.ndarray:
+    """Indices (rows of smc['fvgs']) of gaps not yet filled, optionally one direction."""
+    fvgs = smc['fvgs']
+    mask = fvgs['filled_at'] < 0
+    if direction is not None:
+        mask &= fvgs['direction'] == direction
+    return np.flatnonzero(mask)
+
+
+def fvg_against(smc: dict, price: float, side: str, max_dist_pct: float = 0.20):
+    """
+    Nearest open gap that would oppose a `side` ('BUY'/'SELL') entry at `price`:
+    a bearish gap above (or around) price for BUY, a bullish gap below for SELL,
+    within max_dist_pct percent. Returns {'direction', 'bottom', 'top', 'distance_pct'} or None.
+    """
+    fvgs = smc['fvgs']
+    rows = open_fvgs(smc, -1 if side == 'BUY' else 1)
+    if len(rows) == 0 or not price:
+        return None
+    if side == 'BUY':
+        distance = np.maximum(fvgs['bottom'][rows] - price, 0) / price * 100
+        ahead = fvgs['top'][rows] >= price
+    else:
+        distance = np.maximum(price - fvgs['top'][rows], 0) / price * 100
+        ahead = fvgs['bottom'][rows] <= price
+    candidates = np.flatnonzero(ahead & (distance <= max_dist_pct))
+    if len(candidates) == 0:
+        return None
+    pick = candidates[np.argmin(distance[candidates])]
+    best = rows[pick]
+    return {'direction': int(fvgs['direction'][best]), 'bottom': float(fvgs['bottom'][best]),
+            'top': float(fvgs['top'][best]), 'distance_pct': float(distance[pick])}
+
+
+def resting_pools(smc: dict, side: int = None) -> np.ndarray:
+    """Indices (rows of smc['pools']) of pools not yet swept, optionally one side."""
+    pools = smc['pools']
+    mask = pools['swept_at'] < 0
+    if side is not None:
+        mask &= pools['side'] == side
+    return np.flatnonzero(mask)
+
+
+# =============================================================================
+# PROMPT RENDERING
+# =============================================================================
+
+def render_fvgs(smc: dict, window: int = FVG_WINDOW, limit: int = 3) -> str:
+    """Fresh gaps (formed in the last `window` candles), newest `limit`."""
+    fvgs, n = smc['fvgs'], smc['n']
+    lines = []
+    for row in np.flatnonzero(fvgs['start'] >= n - window)[-limit:]:
+        start, bottom, top = int(fvgs['start'][row]), fvgs['bottom'][row], fvgs['top'][row]
+        if fvgs['direction'][row] == 1:
+            lines.append(f"🟢 Bullish FVG at {bottom:.4f}-{top:.4f} (Index -{n - start - 2})")
+        else:
+            lines.append(f"🔴 Bearish FVG at {bottom:.4f}-{top:.4f} (Index -{n - start - 2})")
+    return "\n".join(lines) if lines else "None recently."
+
+
+def render_liquidity(smc: dict, window: int = LIQUIDITY_WINDOW, limit: int = 3) -> str:
+    """Pivots of the last `window` candles (lows before highs on the same candle), newest `limit`."""
+    pivots, n = smc['pivots'], smc['n']
+    first = max(n - window, 0) + PIVOT_LOOKBACK
+    entries = [(i, 0, f"💧 Sell-Side Liquidity (Low): {p:.4f}")
+               for i, p in zip(pivots['low_idx'].tolist(), pivots['low_price'].tolist()) if i >= first]
+    entries += [(i, 1, f"🔥 Buy-Side Liquidity (High): {p:.4f}")
+                for i, p in zip(pivots['high_idx'].tolist(), pivots['high_price'].tolist()) if i >= first]
+    lines = [text for _, _, text in sorted(entries)[-limit:]]
+    return "\n".join(lines) if lines else "None defined nearby."
+
+
+def render_pools(smc: dict, price: float = None, limit: int = 3) -> str:
+    """Resting equal highs/lows (count >= 2), nearest to price first."""
+    pools = smc['pools']
+    rows = [r for r in resting_pools(smc) if pools['count'][r] >= 2]
+    if not rows:
+        return "No resting equal highs/lows."
+    if price:
+        rows.sort(key=lambda r: abs(pools['level'][r] - price))
+    lines = []
+    for r in rows[:limit]:
+        label = "Equal Highs (BSL)" if pools['side'][r] == 1 else "Equal Lows (SSL)"
+        lines.append(f"🎯 {label}: {pools['level'][r]:.4f} x{int(pools['count'][r])}")
+    return "\n".join(lines)
+
+
+def to_records(arrays: dict) -> list:
+    """Column arrays -> list of dicts (dashboard / JSON)."""
+    columns = {name: values for name, values in arrays.items() if values is not None}
+    length = len(next(iter(columns.values()))) if columns else 0
+    records = []
+    for i in range(length):
+        record = {}
+        for name, values in columns.items():
+            if name == 'ts':  # datetime64 (DataFrame) or int64 ms (CandleFrame)
+                unit = 'ms' if values.dtype.kind in 'iu' else None
+                record[name] = str(pd.to_datetime(values[i], unit=unit))
+            else:
+                record[name] = values[i].item()
+        records.append(record)
+    return records
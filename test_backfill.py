@@ -0,0 +1,55 @@
+import asyncio
+import tempfile
+import backfill
+from candle_store import CandleStore
+
+T0 = 1767225600000
+M15 = 900_000
+
+
+class FakeSession:
+    """Serves a synthetic continuous 15m history like /fapi/v1/klines."""
+
+    def __init__(self, fail_since=None):
+        self.calls = []
+        self.fail_since = fail_since
+
+    async def call(self, method, symbol, timeframe, since=None, limit=500):
+        self.calls.append(since)
+        if since == self.fail_since:
+            raise RuntimeError("simulated disconnect")
+        return [[since + i * M15, 1.0, 2.0, 0.5, 1.5, 10.0] for i in range(limit)]
+
+
+def run(store, session, until_ms):
+    original = backfill.session_manager.market_data_async
+    backfill.session_manager.market_data_async = lambda: session
+    try:
+        return asyncio.run(backfill.backfill(['ETH/USDT'], ['15m'], T0, until_ms,
+                                             concurrency=3, page_limit=100, store=store))
+    finally:
+        backfill.session_manager.market_data_async = original
+
+
+def test_backfill_pages_and_resumes():
+    store = CandleStore(tempfile.mkdtemp())
+    until_ms = T0 + 999 * M15  # 1000 candles -> 10 pages
+
+    # First run loses one page in the middle (interruption / error)
+    report = run(store, FakeSession(fail_since=T0 + 300 * M15), until_ms)
+    backfill.print_report(report)
+    assert report['errors'] == 1
+    assert store.count('ETH/USDT', '15m') == 900
+    assert store.gaps('ETH/USDT', '15m') == [(T0 + 300 * M15, T0 + 399 * M15, 100)]
+
+    # Resume: only the hole and the (possibly forming) last candle are requested
+    session = FakeSession()
+    report = run(store, session, until_ms)
+    assert sorted(session.calls) == [T0 + 300 * M15, until_ms]
+    assert report['errors'] == 0
+    assert store.count('ETH/USDT', '15m') == 1000
+    assert store.gaps('ETH/USDT', '15m') == []
+
+
+if __name__ == "__main__":
+    test_backfill_pages_and_resumes()
@@ -0,0 +1,56 @@
+import numpy as np
+import trading_tools as tools
+from batch_indicators import BatchIndicators, stack_ohlcv, stack_latest, INDICATOR_COLUMNS
+from feature_graph import GATEKEEPER_COLUMNS
+from candle_fixtures import make_frame
+
+
+def test_batched_matches_per_symbol():
+    frames = {
+        'ETH/USDT': make_frame(300, 1, base=51),
+        'LINK/USDT': make_frame(300, 2, base=52),
+        # Listed later: NaN-padded at the front of the stack
+        'NEW/USDT': make_frame(120, 3, base=53, start='2026-01-03 03:00'),
+    }
+    batch = BatchIndicators(stack_ohlcv(frames))
+
+    for symbol, df in frames.items():
+        expected = tools.calculate_indicators(df.copy()).reset_index(drop=True)
+        got = batch.frame(symbol)
+        assert len(got) == len(expected), symbol
+        assert (got['timestamp'].to_numpy() == expected['timestamp'].to_numpy()).all()
+        for col in INDICATOR_COLUMNS:
+            assert np.allclose(got[col].to_numpy(), expected[col].to_numpy()), (symbol, col)
+
+    latest = batch.latest()
+    print(latest[['close', 'RSI_14', 'ADX_14']])
+    assert list(latest.index) == list(frames)
+
+
+def test_right_aligned_gatekeeper_scan():
+    ahead = make_frame(101, 4, base=54)                           # Already has the next candle
+    holed = make_frame(100, 5, base=55).drop(index=60).reset_index(drop=True)  # One candle never stored
+    frames = {'ETH/USDT': make_frame(100, 1, base=51), 'AHEAD/USDT': ahead, 'HOLED/USDT': holed}
+    stacked = stack_latest(frames)
+    assert stacked['close'].shape == (3, 101) and np.isnan(stacked['close'][[0, 2], 0]).all()
+
+    batch = BatchIndicators(stacked, GATEKEEPER_COLUMNS, stage='gatekeeper')
+    assert list(batch.lazy.pulled) == ['gatekeeper']
+    for symbol, df in frames.items():
+        expected = tools.calculate_indicators(df.copy()).reset_index(drop=True)
+        got = batch.frame(symbol)
+        assert (got['timestamp'].to_numpy() == expected['timestamp'].to_numpy()).all(), symbol
+        for col in GATEKEEPER_COLUMNS:
+            assert np.allclose(got[col].to_numpy(), expected[col].to_numpy()), (symbol, col)
+
+    # Analysis pulls the rest from the same graph: shared intermediates, identical gate values
+    gate_rsi = batch.values['RSI_14']
+    analysis = batch.frame('ETH/USDT', INDICATOR_COLUMNS, stage='analysis')
+    assert batch.values['RSI_14'] is gate_rsi and 'tr' not in batch.lazy.pulled['analysis']
+    assert set(batch.lazy.pulled) == {'gatekeeper', 'analysis'}
+    assert analysis['RSI_14'].iloc[-1] == batch.frame('ETH/USDT', GATEKEEPER_COLUMNS)['RSI_14'].iloc[-1]
+
+
+if __name__ == "__main__":
+    test_batched_matches_per_symbol()
+    test_right_aligned_gatekeeper_scan()
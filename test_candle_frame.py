@@ -0,0 +1,53 @@
+import tempfile
+import numpy as np
+import pandas as pd
+import order_flow as flow
+import market_profile as mp
+import trading_tools as tools
+from candle_store import CandleStore
+from candle_frame import CandleFrame
+from candle_fixtures import make_frame
+
+
+def test_store_views_and_roundtrip():
+    df = make_frame(50, 5)
+    store = CandleStore(root=tempfile.mkdtemp())
+    ohlcv = df.assign(timestamp=df['timestamp'].astype('datetime64[ms]').astype('int64')).values.tolist()
+    store.merge('ETH/USDT', '15m', ohlcv, save=False)
+
+    frame = CandleFrame.from_store('ETH/USDT', '15m', 20, store=store)
+    assert len(frame) == 20
+    assert np.shares_memory(frame['close'], store.load('ETH/USDT', '15m')['close'])  # Zero-copy
+    assert np.shares_memory(frame.tail(5)['high'], frame['high'])
+
+    back = frame.to_dataframe()
+    pd.testing.assert_frame_equal(back, store.window('ETH/USDT', '15m', 20))
+    assert frame.last('close') == df['close'].iloc[-1]
+    assert str(frame.timestamp_at(-1)) == str(df['timestamp'].iloc[-1])
+
+    # since(): same rows as the boolean mask used on DataFrames
+    entry = df['timestamp'].iloc[40]
+    assert np.array_equal(frame.since(entry)['high'], df[df['timestamp'] >= entry]['high'].to_numpy())
+    assert frame.since(pd.NaT).empty
+
+
+def test_analysis_accepts_both_containers():
+    df = tools.calculate_indicators(make_frame(300, 5))
+    frame = CandleFrame.from_dataframe(df)
+
+    assert flow.calculate_vpin_pro(df) == flow.calculate_vpin_pro(frame)
+    assert mp.calculate_volume_profile(df) == mp.calculate_volume_profile(frame)
+    assert tools.calculate_smart_money(df) == tools.calculate_smart_money(frame)
+    assert tools.detect_candle_patterns(df) == tools.detect_candle_patterns(frame)
+    assert tools.calculate_vpin_lite(df) == tools.calculate_vpin_lite(frame)
+    assert tools.calculate_hurst(df) == tools.calculate_hurst(frame)
+
+    regime = tools.get_market_regime(frame)
+    assert regime == tools.get_market_regime(df)
+    assert regime['volatility_rank'] == round(df['ATR_14'].rank(pct=True).iloc[-1] * 100, 1)
+    print(regime)
+
+
+if __name__ == "__main__":
+    test_store_views_and_roundtrip()
+    test_analysis_accepts_both_containers()
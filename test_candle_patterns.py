@@ -0,0 +1,68 @@
+import numpy as np
+import candle_patterns as cp
+from candle_frame import CandleFrame
+from candle_fixtures import make_frame
+
+
+def pattern_frame(n, seed):
+    """Mixes doji and full bodies with 0-3 wicks so every pattern fires."""
+    df = make_frame(n, seed, min_volume=0)
+    rng = np.random.default_rng(seed)
+    close = df['close'].to_numpy()
+    open_ = close + rng.normal(0, 1, n) * rng.choice([0.02, 1.0], n)
+    wicks = rng.random((2, n)) * rng.choice([0.0, 1.0, 3.0], (2, n))
+    return df.assign(open=open_, high=np.maximum(open_, close) + wicks[0], low=np.minimum(open_, close) - wicks[1])
+
+
+def scalar_patterns(df, i):
+    """Row-by-row reference for the multi-candle patterns."""
+    r0, r1, r2 = df.iloc[i - 2], df.iloc[i - 1], df.iloc[i]
+    body0, body1 = abs(r0['close'] - r0['open']), abs(r1['close'] - r1['open'])
+    mid0 = (r0['open'] + r0['close']) / 2
+    return {
+        'morning_star': r0['close'] < r0['open'] and body1 <= body0 * 0.3 and r2['close'] > r2['open'] and r2['close'] > mid0,
+        'evening_star': r0['close'] > r0['open'] and body1 <= body0 * 0.3 and r2['close'] < r2['open'] and r2['close'] < mid0,
+        'inside_bar': r2['high'] < r1['high'] and r2['low'] > r1['low'],
+    }
+
+
+def test_full_scan_matches_live_and_reference():
+    df = pattern_frame(400, 11)
+    events = cp.scan(CandleFrame.from_dataframe(df))
+    assert all(len(flags) == len(df) and flags.dtype == bool for flags in events.values())
+    assert not events['morning_star'][:2].any() and not events['bullish_engulfing'][0]
+
+    for i in range(2, len(df)):
+        reference = scalar_patterns(df, i)
+        for name, expected in reference.items():
+            assert events[name][i] == expected, (name, i)
+
+        # Live path (tail scan) == full-history kernel at the same candle
+        live = cp.describe(df.iloc[:i + 1])
+        flagged = [cp.PATTERNS[name][1] for name in cp.PATTERNS if events[name][i]]
+        assert live == ("\n".join(flagged) if flagged else "No clear patterns.")
+
+    print({name: int(flags.sum()) for name, flags in events.items()})
+
+
+def test_pattern_stats():
+    df = pattern_frame(3000, 4)
+    events = cp.scan(df)
+    stats = cp.pattern_stats(df, horizons=(1, 4))
+    close = df['close'].to_numpy()
+
+    idx = np.flatnonzero(events['hammer'])
+    idx = idx[idx + 4 < len(close)]
+    fwd = close[idx + 4] / close[idx] - 1
+    assert stats['hammer']['count'] == int(events['hammer'].sum())
+    assert np.isclose(stats['hammer']['ret_4'], fwd.mean())
+    assert np.isclose(stats['hammer']['hit_4'], (fwd > 0).mean())
+
+    net = cp.signal(events)
+    assert net.max() <= 4 and net.min() >= -4
+    cp.print_stats(stats, (1, 4))
+
+
+if __name__ == "__main__":
+    test_full_scan_matches_live_and_reference()
+    test_pattern_stats()
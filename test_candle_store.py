@@ -0,0 +1,95 @@
+import tempfile
+import numpy as np
+import trading_tools as tools
+from candle_store import CandleStore
+
+T0 = 1767225600000
+M15 = 900_000
+
+
+def rows(start, n, close=1.5):
+    return [[start + i * M15, 1.0, 2.0, 0.5, close, 10.0] for i in range(n)]
+
+
+class FakeSession:
+    """Serves a listing that starts at `listed` and whose newest candle opens at `now`."""
+
+    class Client:
+        def __init__(self, now):
+            self.now = now
+
+        def milliseconds(self):
+            return self.now + 60_000
+
+    def __init__(self, now, listed=T0):
+        self.client = self.Client(now)
+        self.listed = listed
+        self.calls = []
+
+    def call(self, method, symbol, timeframe, since=None, limit=500):
+        self.calls.append((since, limit))
+        start = max(since, self.listed)
+        return [r for r in rows(start, limit, close=2.5) if r[0] <= self.client.now]
+
+
+def with_store(store, session, func):
+    saved = tools.candle_store, tools.session_manager.market_data
+    tools.candle_store, tools.session_manager.market_data = store, (lambda: session)
+    try:
+        return func()
+    finally:
+        tools.candle_store, tools.session_manager.market_data = saved
+
+
+def test_merge_and_window():
+    root = tempfile.mkdtemp()
+    store = CandleStore(root)
+    assert store.merge('ETH/USDT', '15m', rows(T0, 10)) == 10
+    # Forming candle refresh overwrites, a new one appends
+    assert store.merge('ETH/USDT', '15m', [[T0 + 9 * M15, 1, 3, 0.5, 2.0, 20], [T0 + 10 * M15, 1, 2, 1, 1.8, 5]]) == 1
+    # Out-of-order rows (older hole filled) keep the store sorted
+    store.merge('ETH/USDT', '15m', rows(T0 + 20 * M15, 2))
+    assert store.gaps('ETH/USDT', '15m') == [(T0 + 11 * M15, T0 + 19 * M15, 9)]
+    store.merge('ETH/USDT', '15m', rows(T0 + 11 * M15, 9))
+    assert store.gaps('ETH/USDT', '15m') == []
+
+    window = store.window('ETH/USDT', '15m', 5)
+    assert len(window) == 5 and window['timestamp'].is_monotonic_increasing
+    assert store.window('ETH/USDT', '15m')['close'].iloc[9] == 2.0
+    assert np.all(np.diff(store.load('ETH/USDT', '15m')['timestamp']) == M15)
+
+    # Persisted on disk: a fresh instance reads the same candles
+    assert CandleStore(root).window('ETH/USDT', '15m').equals(store.window('ETH/USDT', '15m'))
+
+
+def test_fetch_pages_forward_without_holes():
+    store = CandleStore(tempfile.mkdtemp())
+    store.merge('ETH/USDT', '15m', rows(T0, 100))
+    now = T0 + 2999 * M15  # Offline for ~2900 candles, far more than the 100-candle window
+    session = FakeSession(now)
+    df = with_store(store, session, lambda: tools.fetch_market_data('ETH/USDT', '15m', limit=100))
+    assert session.calls[0][0] == T0 + 99 * M15   # Forward from the last stored (forming) candle
+    assert store.gaps('ETH/USDT', '15m') == [] and store.count('ETH/USDT', '15m') == 3000
+    assert len(df) == 100 and df['timestamp'].iloc[-1].value // 1_000_000 == now
+
+
+def test_short_listing_is_up_to_date():
+    store = CandleStore(tempfile.mkdtemp())
+    listed = T0 + 940 * M15
+    now = T0 + 999 * M15     # 60 candles since listing, window of 100 requested
+    session = FakeSession(now, listed=listed)
+    with_store(store, session, lambda: tools.fetch_market_data('NEW/USDT', '15m', limit=100))
+    assert store.count('NEW/USDT', '15m') == 60
+
+    # Next pass: no full re-download, only the last (forming) candle onwards
+    session.calls.clear()
+    session.client.now = now + M15
+    df = with_store(store, session, lambda: tools.fetch_market_data('NEW/USDT', '15m', limit=100))
+    assert session.calls == [(now, 2)]
+    assert len(df) == 61
+
+
+if __name__ == "__main__":
+    test_merge_and_window()
+    test_fetch_pages_forward_without_holes()
+    test_short_listing_is_up_to_date()
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
+from scipy.stats import ks_2samp
 import market_monitor as mm
+from candle_frame import CandleFrame
 
 def test_drift_identification():
     print("--- STARTING CONCEPT DRIFT VALIDATION ---")
@@ -36,5 +38,52 @@ def test_drift_identification():
     else:
         print("\n❌ VALIDATION FAILED: Test logic did not meet sensitivity requirements.")
 
+def make_frame(returns, start='2026-01-01'):
+    close = 3000 * np.exp(np.cumsum(np.r_[0.0, returns]))
+    return CandleFrame.from_dataframe(pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=len(close), freq='15min'),
+        'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1.0
+    }))
+
+
+def test_streaming_ks_matches_scipy():
+    rng = np.random.default_rng(3)
+    frame = make_frame(rng.normal(0, 0.003, 2600))
+    monitor = mm.DriftMonitor()
+    for end in range(100, len(frame) + 1, 37):  # Closed candles arrive a few at a time
+        monitor.update(frame.slice(0, end))
+    monitor.update(frame)
+
+    returns = np.diff(np.log(frame['close']))
+    assert len(monitor.baseline) == mm.DRIFT_BASELINE  # Ring stays bounded
+    assert np.allclose(monitor.baseline, returns[-mm.DRIFT_BASELINE - mm.DRIFT_RECENT:-mm.DRIFT_RECENT])
+    expected = ks_2samp(returns[-mm.DRIFT_RECENT:], returns[-mm.DRIFT_BASELINE - mm.DRIFT_RECENT:-mm.DRIFT_RECENT],
+                        method='asymp')
+    snapshot = monitor.snapshot()
+    assert np.isclose(snapshot['ks_stat'], expected.statistic)
+    assert np.isclose(snapshot['p_value'], expected.pvalue)
+
+    # One pass over the same history gives the same state
+    single = mm.DriftMonitor()
+    single.update(frame)
+    assert single.snapshot()['ks_stat'] == snapshot['ks_stat']
+    assert not snapshot['drift_detected']
+
+
+def test_page_hinkley_catches_shifts():
+    rng = np.random.default_rng(8)
+    stable = rng.normal(0, 0.003, 2500)
+    for label, shifted in (("volatility", rng.normal(0, 0.012, 40)), ("mean", rng.normal(0.004, 0.003, 40))):
+        monitor = mm.DriftBook().update('ETH/USDT', make_frame(stable))
+        assert not monitor.snapshot()['drift_detected'] and not monitor.history()
+        monitor.update(make_frame(np.r_[stable, shifted]))
+        snapshot = monitor.snapshot()
+        print(f"{label.upper()} SHIFT: {snapshot['reason']} | {monitor.history()}")
+        assert snapshot['drift_detected'] and snapshot['alarm'] is not None
+        assert ('vol_up' if label == "volatility" else 'mean_up') in [e['detector'] for e in monitor.history()]
+
+
 if __name__ == "__main__":
     test_drift_identification()
+    test_streaming_ks_matches_scipy()
+    test_page_hinkley_catches_shifts()
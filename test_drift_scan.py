@@ -0,0 +1,119 @@
+import tempfile
+import numpy as np
+import pandas as pd
+from scipy.stats import ks_2samp
+import drift_scan as ds
+from candle_store import CandleStore
+
+
+def test_batched_ks_matches_scipy():
+    rng = np.random.default_rng(4)
+    returns = rng.normal(0, 0.003, (6, 400))
+    returns[1, -40:] *= 4                                 # Volatility shift
+    returns[2] = np.round(returns[2], 3)                  # Heavy ties (tick-sized returns)
+    returns[3, :10] = np.nan                              # Short history: only the short pair is tested
+    windows, pairs = {'short': 40, 'mid': 120, 'long': 300}, (('short', 'mid'), ('short', 'long'))
+
+    result = ds.drift_matrix(returns, windows, pairs)
+    for i, row in enumerate(returns):
+        for j, (recent, baseline) in enumerate(pairs):
+            m, n = windows[recent], windows[baseline]
+            sample, base = row[-m:], row[-m - n:-m]
+            if np.isnan(base).any():
+                assert np.isnan(result['ks'][i, j]) and not result['drift'][i, j]
+                continue
+            expected = ks_2samp(sample, base, method='asymp')
+            assert np.isclose(result['ks'][i, j], expected.statistic)
+            assert result['drift'][i, j] == (expected.pvalue < ds.SCAN_ALPHA)
+    assert result['drift'][1].all() and not result['drift'][0].any()
+    print(pd.DataFrame(result['ks'], columns=result['pairs']).round(3).to_string())
+
+
+M15 = 900_000
+T0 = 1_767_225_600_000
+
+
+def make_store(n_symbols, shifted, candles, ahead=(), holes=(), behind=None):
+    """
+    ahead: symbols that already store the next (forming) candle; holes: symbols missing one old candle;
+    behind: {symbol index: newest candles never stored}.
+    """
+    rng = np.random.default_rng(7)
+    store = CandleStore(root=tempfile.mkdtemp())
+    for i in range(n_symbols):
+        n = candles + (i in ahead) - (behind or {}).get(i, 0)
+        ts = np.arange(n, dtype=np.int64) * M15 + T0
+        returns = rng.normal(0, 0.003, n)
+        if i < shifted:
+            returns[candles - ds.DRIFT_WINDOWS['1d']:] *= 4
+        close = 100 * np.exp(np.cumsum(returns))
+        ohlcv = np.column_stack([ts, close, close, close, close, np.ones(n)])
+        if i in holes:
+            ohlcv = np.delete(ohlcv, candles - 300, axis=0)
+        store.merge(f"SYM{i}/USDT", '15m', ohlcv.tolist(), save=False)
+    return store
+
+
+def test_book_goes_defensive_when_many_shift():
+    symbols = [f"SYM{i}/USDT" for i in range(6)]
+    now_ms = T0 + ds.history_needed() * M15              # Scanned right after the last stored candle closed
+    calm = ds.scan_universe(symbols, store=make_store(6, 1, ds.history_needed()), now_ms=now_ms)
+    assert calm.book_mode()['mode'] == 'NORMAL' and calm.book_mode()['drifting'] == ['SYM0/USDT']
+
+    shifted = ds.scan_universe(symbols, store=make_store(6, 4, ds.history_needed()), now_ms=now_ms)
+    mode = shifted.book_mode()
+    print(f"BOOK: {mode['mode']} ({mode['reason']})")
+    assert mode['mode'] == 'DEFENSIVE' and mode['tested'] == 6 and len(mode['drifting']) == 4
+    assert shifted.symbol('SYM0/USDT')['1d/1w']['drift']
+
+    # Not enough stored history: nothing is tested, the book stays NORMAL
+    short = ds.scan_universe(symbols, store=make_store(6, 6, 500), now_ms=T0 + 500 * M15)
+    assert short.book_mode()['tested'] == 0 and short.book_mode()['mode'] == 'NORMAL'
+
+
+def test_missing_values_are_ignored_per_row():
+    rng = np.random.default_rng(9)
+    recent, baseline = rng.normal(0, 1, (3, 50)), rng.normal(0.3, 1, (3, 200))
+    baseline[1, [10, 99]] = np.nan                       # Two missing candles: tested on the rest
+    baseline[2, :30] = np.nan                            # Short history: below MIN_COVERAGE
+    stat = ds.ks_batch(recent, baseline)
+    for i in (0, 1):
+        base = baseline[i][np.isfinite(baseline[i])]
+        assert np.isclose(stat[i], ks_2samp(recent[i], base).statistic)
+    assert np.isnan(stat[2])
+
+
+def test_one_symbol_ahead_or_holed_keeps_the_book_tested():
+    symbols = [f"SYM{i}/USDT" for i in range(6)]
+    candles = ds.history_needed()
+    now_ms = T0 + candles * M15 + 60_000                 # Candle `candles` is forming
+    store = make_store(6, 4, candles, ahead=(0,), holes=(5,))
+    scan = ds.scan_universe(symbols, store=store, now_ms=now_ms)
+    mode = scan.book_mode()
+    print(f"AHEAD/HOLED BOOK: {mode['mode']} ({mode['reason']})")
+    assert mode['tested'] == 6 and mode['mode'] == 'DEFENSIVE' and len(mode['drifting']) == 4
+    assert scan.timestamp == np.datetime64(T0 + (candles - 1) * M15, 'ms')
+
+    # Same verdicts as a book where every symbol is perfectly in step
+    clean = ds.scan_universe(symbols, store=make_store(6, 4, candles), now_ms=now_ms)
+    assert np.array_equal(clean.drift[:5], scan.drift[:5]) and clean.tested.all()
+
+
+def test_stale_symbol_is_not_tested():
+    symbols = [f"SYM{i}/USDT" for i in range(6)]
+    candles = ds.history_needed()
+    now_ms = T0 + candles * M15 + 60_000
+    # SYM3 (shifted) stopped 10 candles ago; SYM4 lags 2, within STALE_CANDLES
+    scan = ds.scan_universe(symbols, store=make_store(6, 4, candles, behind={3: 10, 4: 2}), now_ms=now_ms)
+    mode = scan.book_mode()
+    assert mode['stale'] == ['SYM3/USDT'] and mode['tested'] == 5
+    assert mode['drifting'] == ['SYM0/USDT', 'SYM1/USDT', 'SYM2/USDT'] and mode['share'] == 0.6
+    assert np.isnan(scan.ks[3]).all() and not scan.drift[3].any() and np.isfinite(scan.ks[4]).all()
+
+
+if __name__ == "__main__":
+    test_batched_ks_matches_scipy()
+    test_book_goes_defensive_when_many_shift()
+    test_missing_values_are_ignored_per_row()
+    test_one_symbol_ahead_or_holed_keeps_the_book_tested()
+    test_stale_symbol_is_not_tested()
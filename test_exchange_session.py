@@ -0,0 +1,91 @@
+import exchange_session as es
+
+
+class FakeClock:
+    """Replaces exchange_session.time: monotonic() is frozen, sleep() advances it."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeClient:
+    def __init__(self, venue, mode):
+        self.venue, self.mode = venue, mode
+        self.markets = {}
+        self.loads = []
+
+    def load_markets(self, reload=False):
+        self.loads.append(reload)
+        self.markets = {'ETH/USDT': {}}
+        return self.markets
+
+    def fetch_ohlcv(self, symbol, timeframe, limit=None):
+        return [[0, 1, 1, 1, 1, 1]]
+
+
+def with_fakes(func):
+    clock = FakeClock()
+    saved = es.time, es._build_client
+    es.time = clock
+    es._build_client = lambda venue, mode, use_async=False: FakeClient(venue, mode)
+    try:
+        return func(clock)
+    finally:
+        es.time, es._build_client = saved
+
+
+def test_weight_budget_refills_and_blocks():
+
+    def run(clock):
+        budget = es.WeightBudget(limit_per_minute=600)  # 10 weight / second
+        assert budget.try_acquire(600) == 0.0 and budget.available() == 0.0
+        assert budget.try_acquire(5) == 0.5         # Seconds until 5 weight refill
+        clock.now += 0.3
+        assert abs(budget.available() - 3.0) < 1e-9
+
+        budget.acquire(10)                          # Blocks (sleeps) until refilled
+        assert abs(sum(clock.sleeps) - 0.7) < 1e-9 and budget.used_total == 610
+        clock.now += 3600
+        assert budget.available() == 600            # Never above capacity
+        budget.acquire(10_000)                      # Oversized requests are capped at capacity
+        assert budget.available() == 0.0
+    with_fakes(run)
+
+
+def test_sessions_are_pooled_with_market_ttl():
+    def run(clock):
+        manager = es.SessionManager(weight_limit=600)
+        paper = manager.get('binance', 'paper')
+        assert manager.get('binance', 'PAPER') is paper and manager.market_data() is paper
+        assert manager.get('binance', 'live') is not paper
+        try:
+            manager.get('binance', 'demo')
+            assert False, "unknown mode accepted"
+        except ValueError:
+            pass
+
+        paper.call('fetch_ohlcv', 'ETH/USDT', '15m', limit=1000)
+        paper.call('fetch_ohlcv', 'ETH/USDT', '15m', limit=50)
+        assert paper.client.loads == [False]        # Markets loaded once
+        assert manager.budget.used_total == 1 + 5 + 1  # load_markets + 1000-candle page + small page
+
+        clock.now += es.MARKETS_TTL_SECONDS + 1
+        paper.markets()
+        assert paper.client.loads == [False, True]  # Reloaded after the TTL
+        # Every session draws from the one shared budget
+        manager.get('binance', 'live').markets()
+        assert manager.budget.used_total == 9
+    with_fakes(run)
+
+
+if __name__ == "__main__":
+    test_weight_budget_refills_and_blocks()
+    test_sessions_are_pooled_with_market_ttl()
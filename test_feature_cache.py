@@ -0,0 +1,41 @@
+from functools import partial
+import numpy as np
+import trading_tools as tools
+from feature_cache import FeatureCache, cached_indicators, cached_vpin
+from indicator_engine import IndicatorEngine
+import candle_fixtures
+
+
+make_frame = partial(candle_fixtures.make_frame, base=3000, step=5, wick=3)
+
+
+def test_forming_bar_carry_matches_full_pass():
+    cache = FeatureCache()
+    engine = IndicatorEngine(root=None)
+    df = make_frame(120, 3)
+
+    cached = cached_indicators('ETH/USDT', '15m', df.copy(), cache=cache, engine=engine)
+    full = tools.calculate_indicators(df.copy())
+    assert list(cached.index) == list(full.index)
+    for col in full.columns[1:]:
+        assert np.allclose(cached[col].to_numpy(), full[col].to_numpy()), col
+
+    # Same closed candle, new forming price: hit + exact forming row
+    df.loc[df.index[-1], ['close', 'high']] = [df['close'].iloc[-1] + 7, df['high'].iloc[-1] + 7]
+    cached = cached_indicators('ETH/USDT', '15m', df.copy(), cache=cache, engine=engine)
+    full = tools.calculate_indicators(df.copy())
+    for col in full.columns[1:]:
+        assert np.isclose(cached[col].iloc[-1], full[col].iloc[-1]), col
+
+    stats = cache.stats()
+    print(stats)
+    assert stats['features']['indicators'] == {'hits': 1, 'misses': 1}
+
+    # A new closed candle invalidates the entry
+    cached_vpin('ETH/USDT', '15m', df, cache=cache)
+    cached_vpin('ETH/USDT', '15m', make_frame(121, 3), cache=cache)
+    assert cache.stats()['features']['vpin'] == {'hits': 0, 'misses': 2}
+
+
+if __name__ == "__main__":
+    test_forming_bar_carry_matches_full_pass()
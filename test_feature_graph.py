@@ -0,0 +1,36 @@
+from functools import partial
+import numpy as np
+import trading_tools as tools
+from feature_graph import LazyFeatures, GATEKEEPER_COLUMNS, INDICATOR_COLUMNS
+import candle_fixtures
+
+
+make_frame = partial(candle_fixtures.make_frame, base=200, step=2)
+
+
+def test_gatekeeper_pulls_only_its_subgraph():
+    df = make_frame(100, 5)
+    lazy = LazyFeatures.from_frame(df)
+
+    gate = lazy.frame(GATEKEEPER_COLUMNS, stage='gatekeeper')
+    pulled = set(lazy.pulled['gatekeeper'])
+    print(lazy.pulled)
+    assert {'tr', 'ATR_14', 'ADX_14', 'RSI_14', 'BB_UPPER', 'BB_LOWER'} <= pulled
+    assert not pulled & {'EMA_200', 'EMA_50', 'MACD_12_26_9', 'MACDs_12_26_9', 'RES_20', 'SUP_20'}
+
+    # Second stage reuses shared intermediates (true range, ATR, Bollinger mid...)
+    lazy.require(INDICATOR_COLUMNS, stage='analysis')
+    analysis = set(lazy.pulled['analysis'])
+    assert not analysis & pulled
+    assert analysis == {'EMA_200', 'EMA_50', 'MACD_12_26_9', 'MACDs_12_26_9', 'RES_20', 'SUP_20'}
+
+    # Same numbers as the batch implementation
+    full = tools.calculate_indicators(df.copy())
+    for col in GATEKEEPER_COLUMNS:
+        assert np.isclose(gate[col].iloc[-1], full[col].iloc[-1]), col
+    for col in INDICATOR_COLUMNS:
+        assert np.allclose(lazy.arrays[col][0][full.index], full[col].to_numpy()), col
+
+
+if __name__ == "__main__":
+    test_gatekeeper_pulls_only_its_subgraph()
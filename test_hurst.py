@@ -0,0 +1,101 @@
+import numpy as np
+import hurst
+import trading_tools as tools
+from feature_cache import FeatureCache, cached_hurst_profile
+from candle_fixtures import make_frame
+
+
+def ar_frame(n, seed, phi=0.0):
+    """AR(1) returns: phi > 0 trends, phi < 0 mean-reverts."""
+    rng = np.random.default_rng(seed)
+    returns = np.zeros(n)
+    noise = rng.normal(0, 0.01, n)
+    for t in range(1, n):
+        returns[t] = phi * returns[t - 1] + noise[t]
+    return make_frame(seed=seed, close=3000 * np.exp(np.cumsum(returns)), wick=0, flat_open=True, freq='4h')
+
+
+def brute_rs(returns):
+    sizes = hurst._scales(len(returns) // 2)
+    log_rs = []
+    for n in sizes:
+        k = len(returns) // n
+        ratios = []
+        for block in returns[len(returns) - k * n:].reshape(k, n):
+            y = np.cumsum(block - block.mean())
+            ratios.append((y.max() - y.min()) / block.std())
+        log_rs.append(np.log(np.mean(ratios)))
+    return np.polyfit(np.log(sizes), log_rs, 1)[0]
+
+
+def brute_dfa(returns):
+    sizes = hurst._scales(len(returns) // 4)
+    profile = np.cumsum(returns - returns.mean())
+    log_f = []
+    for n in sizes:
+        k = len(profile) // n
+        t = np.arange(n)
+        residuals = [np.mean((b - np.polyval(np.polyfit(t, b, 1), t)) ** 2)
+                     for b in profile[len(profile) - k * n:].reshape(k, n)]
+        log_f.append(0.5 * np.log(np.mean(residuals)))
+    return np.polyfit(np.log(sizes), log_f, 1)[0]
+
+
+def test_estimators_match_reference():
+    logp = hurst.log_prices(ar_frame(250, 4))
+    returns = np.diff(logp)
+    assert np.isclose(hurst.rescaled_range(returns), brute_rs(returns))
+    assert np.isclose(hurst.dfa(returns), brute_dfa(returns))
+
+    # Legacy estimator, now on log prices
+    lags = range(2, 20)
+    tau = [np.sqrt(np.std(logp[lag:] - logp[:-lag])) for lag in lags]
+    assert np.isclose(tools.calculate_hurst(ar_frame(250, 4)), round(np.polyfit(np.log(lags), np.log(tau), 1)[0] * 2, 3))
+
+    # Rolling: every window equals a one-shot estimate
+    series = hurst.rolling(logp, 100)
+    assert np.isnan(series['rs'][98]) and np.isfinite(series['rs'][99])
+    for end in (99, 170, 249):
+        single = hurst.estimate(logp[end - 99:end + 1])
+        for key, values in single.items():
+            assert np.isclose(series[key][end], values), key
+
+
+def test_estimators_separate_regimes():
+    for phi, label in ((-0.4, "MEAN REVERTING"), (0.0, "RANDOM WALK"), (0.4, "TRENDING")):
+        frame = ar_frame(400, 11, phi)
+        values = {k: round(float(v), 3) for k, v in hurst.estimate(hurst.log_prices(frame)).items()}
+        print(f"{label}: {values}")
+        if phi < 0:
+            assert values['dfa'] < 0.45 and values['vr'] < 1 and values['vr_z'] < -2
+        elif phi > 0:
+            assert values['dfa'] > 0.55 and values['vr'] > 1 and values['vr_z'] > 2
+
+
+def test_tracker_is_incremental_and_cached():
+    df = ar_frame(300, 5)
+    cache = FeatureCache()
+    book = hurst.HurstBook()
+    for end in range(150, 301, 10):  # df includes a forming bar: closed = df.iloc[:-1]
+        first = cached_hurst_profile('ETH/USDT', '4h', df.iloc[:end], cache=cache, book=book)
+        again = cached_hurst_profile('ETH/USDT', '4h', df.iloc[:end], cache=cache, book=book)
+        assert first is again
+    assert cache.stats()['features']['hurst'] == {'hits': 16, 'misses': 16}
+
+    tracker = book.tracker('ETH/USDT', '4h')
+    history = tracker.history()
+    expected = hurst.rolling(hurst.log_prices(df.iloc[:299]), 100)
+    assert len(history) == 299 - 99
+    assert np.allclose([p['dfa'] for p in history], np.round(expected['dfa'][99:], 4))
+    snapshot = tracker.snapshot()
+    assert snapshot['hurst'] == round(history[-1]['vs'], 3) and snapshot['candles'] == 100
+    print(hurst.render_hurst(snapshot))
+
+    # Too little history: neutral default
+    assert hurst.HurstTracker().update(df.iloc[:20])['hurst'] == 0.5
+
+
+if __name__ == "__main__":
+    test_estimators_match_reference()
+    test_estimators_separate_regimes()
+    test_tracker_is_incremental_and_cached()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import numpy as np
+import trading_tools as tools
+from indicator_engine import IndicatorEngine, INDICATOR_COLUMNS
+from candle_fixtures import make_frame
+
+
+def assert_matches_batch(engine_df, batch_df):
+    assert list(engine_df.index) == list(batch_df.index)
+    for col in INDICATOR_COLUMNS:
+        assert np.allclose(engine_df[col].to_numpy(), batch_df[col].to_numpy()), col
+
+
+def test_streaming_matches_batch_and_persists():
+    df = make_frame(400, 11)
+    root = tempfile.mkdtemp()
+
+    # Warm up on the first 250 candles, then stream the rest one candle per pass
+    engine = IndicatorEngine(root=root)
+    engine.frame('BTC/USDT', '15m', make_frame(260, seed=3))
+    btc_file = os.path.join(root, "BTC_USDT_15m.json")
+    btc_written = os.stat(btc_file).st_mtime_ns
+    engine.frame('ETH/USDT', '15m', df.iloc[:251])
+    for end in range(252, 351):
+        out = engine.frame('ETH/USDT', '15m', df.iloc[:end])
+    assert_matches_batch(out, tools.calculate_indicators(df.iloc[:350].copy()).iloc[-len(out):])
+
+    # One file per series: ETH closes never rewrite the BTC file
+    assert sorted(os.listdir(root)) == ["BTC_USDT_15m.json", "ETH_USDT_15m.json"]
+    assert os.stat(btc_file).st_mtime_ns == btc_written
+
+    # Restart: state is restored from disk and keeps streaming without a reseed
+    restored = IndicatorEngine(root=root)
+    assert restored.state('ETH/USDT', '15m').last_ts == engine.state('ETH/USDT', '15m').last_ts
+    for end in range(351, 401):
+        out = restored.frame('ETH/USDT', '15m', df.iloc[end - 100:end])  # Only a 100-candle window
+    assert restored.state('ETH/USDT', '15m').n == 399
+    assert_matches_batch(out, tools.calculate_indicators(df.copy()).iloc[-len(out):])
+    print(out[INDICATOR_COLUMNS].tail(2))
+
+
+def test_gap_triggers_reseed():
+    df = make_frame(200, 11)
+    engine = IndicatorEngine(root=None)
+    engine.frame('ETH/USDT', '15m', df.iloc[:100])
+
+    # Candles 100-149 never seen (offline): the window jumps ahead -> reseed from the window
+    window = df.iloc[150:200].reset_index(drop=True)
+    out = engine.frame('ETH/USDT', '15m', window)
+    assert engine.state('ETH/USDT', '15m').n == 49
+    assert_matches_batch(out, tools.calculate_indicators(window.copy()))
+
+
+if __name__ == "__main__":
+    test_streaming_matches_batch_and_persists()
+    test_gap_triggers_reseed()
@@ -0,0 +1,79 @@
+from functools import partial
+import numpy as np
+from level_index import LevelIndex, ZONE_PCT
+from trading_tools import check_proximity_to_level
+import candle_fixtures
+
+
+make_frame = partial(candle_fixtures.make_frame, step=0.4, wick=0.3, min_volume=0, flat_open=True)
+
+
+def brute_nearest(index, price, side):
+    if side == 'resistance':
+        above = [k for k, c in enumerate(index.centres) if c > price]
+        return min(above, key=lambda k: index.centres[k]) if above else None
+    below = [k for k, c in enumerate(index.centres) if c < price]
+    return max(below, key=lambda k: index.centres[k]) if below else None
+
+
+def test_zones_sorted_and_queries_match_scan():
+    df = make_frame(2000, 5)
+    index = LevelIndex()
+    index.update('15m', df)
+    index.update('4h', make_frame(300, seed=9, freq='4h'))
+
+    assert index.centres == sorted(index.centres)
+    for a, b in zip(index.centres, index.centres[1:]):
+        assert b - a > b * ZONE_PCT / 100, "neighbouring zones should have been merged"
+    assert all(lo <= c <= hi for lo, c, hi in zip(index.lows, index.centres, index.highs))
+    assert max(index.touches) > 1
+
+    for price in np.linspace(min(index.centres) - 1, max(index.centres) + 1, 400):
+        for side in ('resistance', 'support'):
+            k = brute_nearest(index, price, side)
+            zone = index.nearest(price, side)
+            assert (zone is None) == (k is None)
+            if k is not None:
+                assert zone['level'] == index.centres[k]
+        inside = [k for k in range(len(index)) if index.lows[k] <= price <= index.highs[k]]
+        assert (index.zone_at(price) is not None) == bool(inside)
+
+    levels = index.sr_levels(float(df['close'].iloc[-1]))
+    print(f"{len(index)} zones | nearest R {levels['nearest_resistance']} | nearest S {levels['nearest_support']}")
+
+
+def test_incremental_updates_equal_single_pass():
+    df = make_frame(1500, seed=3)
+    full = LevelIndex()
+    full.update('15m', df)
+
+    live = LevelIndex()
+    live.update('15m', df.iloc[:100])
+    for end in range(101, 1501):
+        live.update('15m', df.iloc[max(end - 100, 0):end])
+    assert live.update('15m', df.iloc[-100:]) == 0  # Nothing confirmed since: no work
+    assert live.centres == full.centres
+    assert live.touches == full.touches
+
+
+def test_timeframe_strength_and_proximity():
+    index = LevelIndex()
+    index.add(100.0, '15m')
+    index.add(100.1, '4h')
+    index.add(110.0, '1h')
+    assert len(index) == 2
+    zone = index.zone_at(100.05)
+    assert zone['touches'] == 2 and zone['strength'] == 5 and zone['timeframes'] == ['15m', '4h']
+
+    near, level, dist = index.proximity(99.9, 'resistance', threshold_pct=0.20)
+    assert near and level == zone['level'] and abs(dist - 0.1 / 99.9 * 100) < 1e-9
+    assert index.proximity(105.0, 'support', threshold_pct=0.20)[0] is False
+
+    # The list-based check now returns the nearest level, not the first within range
+    assert check_proximity_to_level(100.0, [100.15, 100.05], threshold_pct=0.20)[1] == 100.05
+
+
+if __name__ == "__main__":
+    test_zones_sorted_and_queries_match_scan()
+    test_incremental_updates_equal_single_pass()
+    test_timeframe_strength_and_proximity()
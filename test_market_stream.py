@@ -0,0 +1,43 @@
+import os
+import time
+import tempfile
+import market_stream as ms
+from candle_store import CandleStore
+
+REPLAY_FILE = os.path.join(os.path.dirname(__file__), "replay", "binance_futures_sample.jsonl")
+
+
+def test_stream_replay_offline():
+
+    server = ms.ReplayServer(REPLAY_FILE).start()
+    table = ms.LiveMarketTable()
+    store = CandleStore(tempfile.mkdtemp())
+    stream = ms.MarketStream(['ETH/USDT'], ['15m'], url=server.url, table=table, store=store)
+    stream.start()
+
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline and stream.messages < 27:
+            time.sleep(0.05)
+    finally:
+        stream.stop()
+        server.stop()
+
+    print(f"Messages: {stream.messages} | Quote: {table.quote('ETH/USDT')}")
+
+    # Last message is a bookTicker: price is its mid
+    assert stream.messages == 27
+    assert abs(table.last_price('ETH/USDT') - 3006.25) < 1e-9
+
+    # Forming candle is the new 15m bar, the closed one landed in the store
+    forming = table.forming_candle('ETH/USDT', '15m')
+    assert forming['t'] == 1767225600000 + 900_000
+    assert forming['closed'] is False
+
+    assert store.count('ETH/USDT', '15m') == 1
+    assert store.last_timestamp('ETH/USDT', '15m') == 1767225600000
+    assert store.window('ETH/USDT', '15m')['close'].iloc[-1] == 3005.50
+
+
+if __name__ == "__main__":
+    test_stream_replay_offline()
@@ -0,0 +1,73 @@
+from functools import partial
+import json
+from market_structure import StructureTracker
+import candle_fixtures
+
+
+make_frame = partial(candle_fixtures.make_frame, base=2000, step=15, wick=10, min_volume=0, freq='4h')
+
+
+def test_incremental_matches_full_replay_and_persists():
+    df = make_frame(500, 21)
+
+    # One pass over the whole history
+    full = StructureTracker()
+    full.advance(df, '4h')
+
+    # Live: seed on 252 candles, then one new closed candle per 4h cycle (252-candle windows),
+    # restarting from the persisted dict halfway through
+    live = StructureTracker()
+    live.advance(df.iloc[:252], '4h')
+    for end in range(253, 376):
+        assert live.advance(df.iloc[end - 252:end], '4h') == 1
+    live = StructureTracker.from_dict(json.loads(json.dumps(live.to_dict())))
+    for end in range(376, 501):
+        live.advance(df.iloc[end - 252:end], '4h')
+    assert live.advance(df.iloc[248:500], '4h') == 0  # Nothing new: no work
+
+    assert live.to_dict() == full.to_dict()
+    assert full.events, "random walk should produce breaks"
+    print(f"Bias: {full.bias} | {len(full.events)} events | last: {full.timeline(1)}")
+
+    # BOS keeps the bias, CHoCH flips it
+    bias = 'NEUTRAL'
+    for event in full.timeline():
+        assert event['type'] == ('CHoCH' if bias not in ('NEUTRAL', event['direction']) else 'BOS')
+        bias = event['direction']
+    assert bias == full.bias
+
+
+def test_snapshot_live_checks():
+    tracker = StructureTracker()
+    tracker.advance(make_frame(300, seed=4), '4h')
+    snap = tracker.snapshot()
+    assert snap['structure_valid']
+    assert snap['last_event'] == tracker.timeline(1)[0]
+
+    # A live price through the open swing against the bias is a CHoCH (bias flips in the snapshot only)
+    far = 1e9 if tracker.bias == 'BEARISH' else 1e-9
+    opposite = 'BULLISH' if tracker.bias == 'BEARISH' else 'BEARISH'
+    level_open = (tracker.broken_high_ts != tracker.highs[-1]['ts'] if opposite == 'BULLISH'
+                  else tracker.broken_low_ts != tracker.lows[-1]['ts'])
+    live = tracker.snapshot(far)
+    if level_open:
+        assert live['choch_detected'] and live['bias'] == opposite
+    assert tracker.snapshot()['bias'] == tracker.bias
+
+
+def test_gap_reseeds():
+    df = make_frame(400, 21)
+    tracker = StructureTracker()
+    tracker.advance(df.iloc[:200], '4h')
+    window = df.iloc[300:400]
+    tracker.advance(window, '4h')
+
+    fresh = StructureTracker()
+    fresh.advance(window, '4h')
+    assert tracker.to_dict() == fresh.to_dict()
+
+
+if __name__ == "__main__":
+    test_incremental_matches_full_replay_and_persists()
+    test_snapshot_live_checks()
+    test_gap_reseeds()
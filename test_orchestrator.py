@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+import main
+import trading_tools as tools
+from candle_fixtures import make_frame
+from candle_frame import CandleFrame
+
+
+@contextmanager
+def patched(obj, **attrs):
+    saved = {name: getattr(obj, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(obj, name, value)
+
+
+def lock_is_free():
+    """True if another thread could take STATE_LOCK right now."""
+    free = []
+
+    def probe():
+        free.append(main.STATE_LOCK.acquire(blocking=False))
+        if free[0]:
+            main.STATE_LOCK.release()
+    thread = threading.Thread(target=probe)
+    thread.start()
+    thread.join()
+    return free[0]
+
+
+async def fake_fetch(pair, windows):
+    if pair == 'DEAD/USDT':
+        raise ConnectionError("exchange down")
+    await asyncio.sleep(0.01)
+    return {tf: pd.DataFrame() for tf in windows}
+
+
+async def fake_snapshot(symbols):
+    return {}
+
+
+def test_cycle_is_bounded_and_survives_failures():
+    pairs = [f"SYM{i}/USDT" for i in range(9)] + ['DEAD/USDT']
+    calls, active, peak = [], [0], [0]
+    counter = threading.Lock()
+
+    def fake_process_pair(symbol, btc, sentiment, state, df_micro, df_macro, gate):
+        with counter:
+            calls.append(symbol)
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            time.sleep(0.05)
+            if symbol == 'SYM3/USDT':
+                raise RuntimeError("boom")
+            return True
+        finally:
+            with counter:
+                active[0] -= 1
+
+    with patched(tools, fetch_timeframes_async=fake_fetch, refresh_price_snapshot_async=fake_snapshot,
+                 get_market_sentiment=lambda: "news"), \
+         patched(main, PAIRS=pairs, process_pair=fake_process_pair, refresh_book_mode=lambda symbols: None,
+                 scan_gatekeeper=lambda symbols: None):
+        asyncio.run(main.run_orchestrator({'current_positions': []}))
+
+    # Every fetched pair ran despite the failing pair and the failed fetch, never above the bound
+    assert sorted(calls) == sorted(pairs[:-1])
+    assert 1 < peak[0] <= main.MAX_CONCURRENT_PAIRS
+
+
+def test_notifications_and_saves_run_after_the_lock():
+    events = []
+
+    def fake_price(symbol):
+        events.append(('price', symbol, lock_is_free()))
+        return 3000.0
+
+    def fake_tick(state, symbol, outbox=None, price=None):
+        assert not lock_is_free() and price == 3000.0
+        if symbol == 'BAD/USDT':
+            raise RuntimeError("tick failed")
+        main.notify(outbox, f"moved {symbol}")
+        main.defer(outbox, lambda: events.append(('radiography', symbol, lock_is_free())))
+        state['current_positions'][0]['stop_loss'] = 1.0
+        return False
+
+    state = {'current_positions': [{'symbol': 'ETH/USDT', 'stop_loss': 0.5}]}
+    with patched(main, manage_position_tick=fake_tick), \
+         patched(tools, get_current_price=fake_price,
+                 send_telegram_message=lambda msg: events.append(('telegram', msg, lock_is_free())),
+                 write_state=lambda snapshot: events.append(('save', snapshot, lock_is_free())) or True):
+        main.run_micro_tick(state, ['BAD/USDT', 'ETH/USDT'])
+
+    # Prices before the lock; Telegram, file writes and the save after it
+    assert [e[0] for e in events] == ['price', 'price', 'telegram', 'radiography', 'save'] and all(e[2] for e in events)
+    assert events[2][1] == "moved ETH/USDT"
+    saved = events[-1][1]
+    assert saved is not state and saved['current_positions'][0]['stop_loss'] == 1.0  # A copy, taken after the tick
+
+
+def test_loops_keep_running_after_errors():
+    ticks, cycles = [], []
+
+    def fake_tick(state, symbols):
+        ticks.append(symbols)
+        if len(ticks) == 1:
+            raise RuntimeError("first tick fails")
+
+    async def fake_orchestrator(state):
+        cycles.append(1)
+        if len(cycles) == 1:
+            raise RuntimeError("first cycle fails")
+
+    async def run_for(seconds, *loops):
+        tasks = [asyncio.create_task(loop) for loop in loops]
+        await asyncio.sleep(seconds)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    state = {'current_positions': [{'symbol': 'ETH/USDT'}, {'symbol': 'AAVE/USDT'}]}
+    with patched(main, MICRO_LOOP_SECONDS=0.01, MACRO_LOOP_SECONDS=0.01, run_micro_tick=fake_tick,
+                 run_orchestrator=fake_orchestrator), \
+         patched(tools, refresh_price_snapshot_async=fake_snapshot):
+        asyncio.run(run_for(0.2, main.run_micro_loop(state), main.run_macro_loop(state)))
+
+    assert len(ticks) >= 3 and ticks[-1] == ['AAVE/USDT', 'ETH/USDT']
+    assert len(cycles) >= 3
+
+
+def test_wick_check_reads_candles_since_entry():
+    frame = CandleFrame.from_dataframe(make_frame(8, 1))  # 15m candles from 2026-01-01 00:00 UTC
+    # Entry stamps are UTC-6: 18:30 local is the 00:30 UTC candle
+    since = main.entry_candles(frame, "2025-12-31 18:30:00 UTC-6")
+    assert len(since) == 6 and since['timestamp'][0] == frame['timestamp'][2]
+    assert len(main.entry_candles(frame, "2026-01-01 01:00:00 UTC")) == 4
+    assert main.entry_candles(frame, "") is None and main.entry_candles(frame, "yesterday") is None
+
+
+if __name__ == "__main__":
+    test_cycle_is_bounded_and_survives_failures()
+    test_notifications_and_saves_run_after_the_lock()
+    test_loops_keep_running_after_errors()
+    test_wick_check_reads_candles_since_entry()
@@ -0,0 +1,64 @@
+import time
+import trading_tools as tools
+
+
+class FakeLiveTable:
+    def __init__(self):
+        self.prices = {}
+
+    def last_price(self, symbol, max_age=None):
+        return self.prices.get(symbol)
+
+
+class FakeTrading:
+    def __init__(self):
+        self.calls = []
+
+    def call(self, method, arg):
+        self.calls.append((method, arg))
+        now_ms = int(time.time() * 1000)
+        if method == 'fetch_tickers':
+            return {f"{s}:USDT": {'last': 100.0 + i, 'timestamp': now_ms} for i, s in enumerate(arg)}
+        return {'last': 42.0, 'timestamp': now_ms}
+
+
+def with_fakes(func):
+    live, trading = FakeLiveTable(), FakeTrading()
+    saved = tools.live_table, tools.session_manager.trading, dict(tools._price_snapshot)
+    tools.live_table, tools.session_manager.trading = live, (lambda: trading)
+    tools._price_snapshot.clear()
+    try:
+        return func(live, trading)
+    finally:
+        tools.live_table, tools.session_manager.trading = saved[:2]
+        tools._price_snapshot.clear()
+        tools._price_snapshot.update(saved[2])
+
+
+def test_stale_symbol_falls_back_to_rest():
+
+    def run(live, trading):
+        assert tools.refresh_price_snapshot(['ETH/USDT', 'SOL/USDT']) == {'ETH/USDT': 100.0, 'SOL/USDT': 101.0}
+        assert tools.get_current_price('SOL/USDT') == 101.0 and len(trading.calls) == 1
+
+        # Next cycle: SOL had a live quote so only ETH is refreshed; SOL's entry keeps aging
+        tools._price_snapshot['SOL/USDT']['taken_at'] -= 60
+        live.prices['SOL/USDT'] = 150.0
+        assert tools.refresh_price_snapshot(['ETH/USDT', 'SOL/USDT']) == {'ETH/USDT': 100.0}
+        assert trading.calls[-1] == ('fetch_tickers', ['ETH/USDT'])
+
+        # Stream drops: the stale SOL snapshot is not served, REST is used instead
+        live.prices.clear()
+        assert tools.get_snapshot_price('SOL/USDT') is None
+        assert tools.get_current_price('SOL/USDT') == 42.0
+        assert trading.calls[-1] == ('fetch_ticker', 'SOL/USDT')
+        assert tools.get_current_price('ETH/USDT') == 100.0
+
+        # A ticker the exchange stamped long ago is stale even if fetched just now
+        tools._price_snapshot['ETH/USDT']['timestamp'] -= 60_000
+        assert tools.get_snapshot_price('ETH/USDT') is None
+    with_fakes(run)
+
+
+if __name__ == "__main__":
+    test_stale_symbol_falls_back_to_rest()
@@ -0,0 +1,56 @@
+import tempfile
+import numpy as np
+import pandas as pd
+from candle_store import CandleStore
+from resample import resample_ohlcv, resampled_window
+
+T0 = 1767225600000  # 2026-01-01 00:00 UTC (4h and 1d aligned)
+M15 = 900_000
+
+
+def make_candles(start_ms, n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 3000 + np.cumsum(rng.normal(0, 4, n))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + rng.random(n)
+    low = np.minimum(open_, close) - rng.random(n)
+    volume = rng.random(n) * 50 + 1
+    ts = start_ms + np.arange(n) * M15
+    return [[int(t), o, h, l, c, v] for t, o, h, l, c, v in zip(ts, open_, high, low, close, volume)]
+
+
+def test_resample_matches_pandas_and_keeps_forming_bar():
+
+    # Starts mid-bar (3 candles before T0) and ends 5 candles into a new 4h bar (forming)
+    rows = make_candles(T0 - 3 * M15, 3 + 16 * 6 + 5)
+    store = CandleStore(tempfile.mkdtemp())
+    store.merge('ETH/USDT', '15m', rows)
+
+    bars = resampled_window('ETH/USDT', '4h', 500, store=store)
+    base = store.window('ETH/USDT', '15m')
+    expected = (base.set_index('timestamp')
+                .resample('4h')
+                .agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+                .iloc[1:]  # Partial leading bucket is dropped
+                .reset_index())
+
+    print(bars.tail(3))
+
+    # 6 complete bars + 1 forming bar; the partial leading bucket is gone
+    assert len(bars) == 7
+    assert bars['timestamp'].iloc[0] == pd.Timestamp(T0, unit='ms')
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        assert np.allclose(bars[col].to_numpy(), expected[col].to_numpy())
+
+    # Forming bar = the last 5 base candles so far
+    assert bars['close'].iloc[-1] == base['close'].iloc[-1]
+    assert np.isclose(bars['volume'].iloc[-1], base['volume'].iloc[-5:].sum())
+
+    # Windowed read returns only the newest bars, DataFrame helper agrees with the store path
+    assert len(resampled_window('ETH/USDT', '4h', 3, store=store)) == 3
+    assert resample_ohlcv(base, '4h').equals(bars)
+    assert len(resampled_window('ETH/USDT', '1h', 10, store=store)) == 10
+
+
+if __name__ == "__main__":
+    test_resample_matches_pandas_and_keeps_forming_bar()
@@ -0,0 +1,72 @@
+from functools import partial
+import tempfile
+import numpy as np
+import pandas as pd
+import market_profile as mp
+import session_profiles as sp
+from candle_frame import CandleFrame
+import candle_fixtures
+
+
+make_frame = partial(candle_fixtures.make_frame, base=3000, step=4, wick=3, min_volume=0)
+
+
+def test_sessions_match_batch_profiles():
+    df = make_frame(96 * 20, 6)
+    frame = CandleFrame.from_dataframe(df)
+    live = sp.SymbolSessions(bin_size=1.5)
+    for end in range(10, len(df) + 1, 7):  # Closed candles arrive a few at a time
+        live.update(frame.slice(0, end))
+    live.update(frame)
+
+    assert len(live.finished['daily']) == 19   # Day 20 is still developing
+    assert len(live.finished['weekly']) == 3   # Jan 1-4, 5-11, 12-18
+    assert live.finished['weekly'][1]['session'] == '2026-01-05'
+
+    # Every finished day equals a one-shot profile of that day's candles
+    days = df['timestamp'].dt.floor('D')
+    for session in live.finished['daily']:
+        day = df[days == pd.Timestamp(session['session'])]
+        first, hist = mp.distribute_volume(day['low'], day['high'], day['volume'], 1.5)
+        expected = mp.summarize_profile(first, hist, 1.5)
+        assert (session['POC'], session['VAH'], session['VAL']) == (expected['POC'], expected['VAH'], expected['VAL'])
+
+    context = live.context()
+    prior = live.finished['daily'][-1]
+    assert context['prior_daily']['POC'] == prior['POC']
+    assert context['composite']['days'] == sp.COMPOSITE_DAYS
+    assert context['developing_daily'] is not None
+
+    # Naked POCs: never touched by any later candle
+    for poc in context['naked_pocs']:
+        later = df[days > pd.Timestamp(poc['session'])]
+        assert not ((later['low'] <= poc['level']) & (later['high'] >= poc['level'])).any()
+    print(sp.render_sessions(context, float(df['close'].iloc[-1])))
+
+
+def test_persist_and_resume():
+    df = make_frame(96 * 10, seed=2)
+    frame = CandleFrame.from_dataframe(df)
+    root = tempfile.mkdtemp()
+
+    full = sp.SymbolSessions(bin_size=1.0)
+    full.update(frame)
+
+    book = sp.SessionProfileBook(root=root)
+    book.sessions('ETH/USDT').bin_size = 1.0
+    book.update('ETH/USDT', frame.slice(0, 96 * 6 + 5))  # Saved at the day-6 close
+
+    restarted = sp.SessionProfileBook(root=root)
+    resumed = restarted.update('ETH/USDT', frame)
+    got, expected = resumed.to_dict(), full.to_dict()
+    assert got['last_ts'] == expected['last_ts'] and got['naked_pocs'] == expected['naked_pocs']
+    for kind in sp.KINDS:  # Same sessions; histograms equal up to summation order
+        levels = lambda sessions: [(x['session'], x['POC'], x['VAH'], x['VAL']) for x in sessions]
+        assert levels(got['finished'][kind]) == levels(expected['finished'][kind])
+        assert np.allclose(got['developing'][kind]['hist'], expected['developing'][kind]['hist'])
+    assert restarted.context('ETH/USDT')['prior_daily'] == full.context()['prior_daily']
+
+
+if __name__ == "__main__":
+    test_sessions_match_batch_profiles()
+    test_persist_and_resume()
@@ -0,0 +1,84 @@
+from functools import partial
+import time
+import numpy as np
+import smart_money as smc
+from candle_frame import CandleFrame
+import candle_fixtures
+
+
+make_frame = partial(candle_fixtures.make_frame, wick=0.8, min_volume=0, flat_open=True)
+
+
+def brute_first(values, start, test):
+    for j in range(start, len(values)):
+        if test(values[j]):
+            return j
+    return -1
+
+
+def test_fvg_tracking_matches_brute_force():
+    df = make_frame(600, 13)
+    high, low = df['high'].to_numpy(), df['low'].to_numpy()
+    fvgs = smc.detect_fvgs(df)
+    assert len(fvgs['start']) > 10
+
+    for row, i in enumerate(fvgs['start'].tolist()):
+        bull = high[i] < low[i + 2]
+        assert fvgs['direction'][row] == (1 if bull else -1)
+        bottom, top = fvgs['bottom'][row], fvgs['top'][row]
+        if bull:
+            touched = brute_first(low, i + 3, lambda v: v <= top)
+            filled = brute_first(low, i + 3, lambda v: v <= bottom)
+        else:
+            touched = brute_first(high, i + 3, lambda v: v >= bottom)
+            filled = brute_first(high, i + 3, lambda v: v >= top)
+        assert fvgs['touched_at'][row] == touched
+        assert fvgs['filled_at'][row] == filled
+        assert (fvgs['fill_pct'][row] == 1.0) == (filled >= 0)
+
+    # Same records from a CandleFrame
+    from_frame = smc.detect_fvgs(CandleFrame.from_dataframe(df))
+    assert np.array_equal(from_frame['filled_at'], fvgs['filled_at'])
+    print(f"{len(fvgs['start'])} FVGs, {len(smc.open_fvgs({'fvgs': fvgs}))} still open")
+
+
+def test_pools_and_filters():
+    df = make_frame(400, seed=2, decimals=0)
+    data = smc.analyze(df)
+    pools = data['pools']
+    high, low = df['high'].to_numpy(), df['low'].to_numpy()
+    assert (pools['count'] >= 2).any(), "coarse ticks should produce equal highs/lows"
+    assert pools['count'].sum() == len(data['pivots']['high_idx']) + len(data['pivots']['low_idx'])
+
+    for r in range(len(pools['side'])):
+        level, after = pools['level'][r], pools['last_idx'][r] + 1
+        if pools['side'][r] == 1:
+            expected = brute_first(high, after, lambda v: v > level)
+        else:
+            expected = brute_first(low, after, lambda v: v < level)
+        assert pools['swept_at'][r] == expected
+
+    # Entry filter: a LONG right under an open bearish gap is flagged
+    bear = smc.open_fvgs(data, -1)
+    if len(bear):
+        row = bear[-1]
+        price = data['fvgs']['bottom'][row] * 0.9995
+        hit = smc.fvg_against(data, price, 'BUY', max_dist_pct=0.20)
+        assert hit is not None and hit['direction'] == -1
+    assert smc.fvg_against(data, 1e9, 'BUY') is None
+    print(smc.render_pools(data, df['close'].iloc[-1]))
+
+
+def test_scales_to_long_histories():
+    df = make_frame(200_000, seed=7)
+    start = time.perf_counter()
+    data = smc.analyze(CandleFrame.from_dataframe(df))
+    elapsed = time.perf_counter() - start
+    print(f"200k candles: {len(data['fvgs']['start'])} FVGs, {len(data['pools']['side'])} pools in {elapsed * 1000:.0f} ms")
+    assert elapsed < 5.0
+
+
+if __name__ == "__main__":
+    test_fvg_tracking_matches_brute_force()
+    test_pools_and_filters()
+    test_scales_to_long_histories()
@@ -0,0 +1,52 @@
+from functools import partial
+import time
+import numpy as np
+import trading_tools as tools
+from candle_frame import CandleFrame
+import candle_fixtures
+
+
+def reference_swing_points(df, lookback=5):
+    """The original per-index loop (O(n*w)), kept as the identity reference."""
+    swing_highs, swing_lows = [], []
+    for i in range(lookback, len(df) - lookback):
+        window = df.iloc[i - lookback: i + lookback + 1]
+        if df.iloc[i]['high'] == window['high'].max():
+            swing_highs.append({'index': i, 'price': float(df.iloc[i]['high']),
+                                'timestamp': str(df.iloc[i]['timestamp'])})
+        if df.iloc[i]['low'] == window['low'].min():
+            swing_lows.append({'index': i, 'price': float(df.iloc[i]['low']),
+                               'timestamp': str(df.iloc[i]['timestamp'])})
+    return swing_highs, swing_lows
+
+
+make_frame = partial(candle_fixtures.make_frame, freq='4h', flat_open=True, min_volume=0)
+
+
+def test_identical_to_reference():
+    for seed, decimals, lookback in [(1, None, 5), (2, 0, 5), (3, 0, 3), (4, 1, 2)]:
+        df = make_frame(252, seed, decimals=decimals)
+        expected = reference_swing_points(df, lookback)
+        assert tools.detect_swing_points(df, lookback) == expected
+        assert tools.detect_swing_points(CandleFrame.from_dataframe(df), lookback) == expected
+
+    # Ties and NaN follow the pandas window max/min semantics
+    df = make_frame(60, 5, decimals=0)
+    df.loc[[10, 31], 'high'] = np.nan
+    assert tools.detect_swing_points(df, 5) == reference_swing_points(df, 5)
+    assert tools.detect_swing_points(df.iloc[:8], 5) == ([], [])
+
+
+def test_scales_to_long_histories():
+    df = make_frame(200_000, 6)
+    start = time.perf_counter()
+    swings = tools.find_swing_points(df, lookback=5)
+    elapsed = time.perf_counter() - start
+    print(f"200k candles: {len(swings['high_idx'])} highs, {len(swings['low_idx'])} lows in {elapsed * 1000:.1f} ms")
+    assert elapsed < 2.0
+    assert np.array_equal(swings['high_price'], df['high'].to_numpy()[swings['high_idx']])
+
+
+if __name__ == "__main__":
+    test_identical_to_reference()
+    test_scales_to_long_histories()
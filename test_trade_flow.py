@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+import market_stream as ms
+import trade_flow as tf
+from candle_store import CandleStore
+
+REPLAY_FILE = os.path.join(os.path.dirname(__file__), "replay", "binance_aggtrade_sample.jsonl")
+
+
+def load_trades():
+    trades, seen = [], set()
+    with open(REPLAY_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            data = json.loads(line)['data']
+            if data['e'] == 'aggTrade' and data['a'] not in seen:
+                seen.add(data['a'])
+                trades.append((float(data['q']), bool(data['m']), int(data['T'])))
+    return trades
+
+
+def brute_buckets(trades, V):
+    """Cumulative-volume reference: buy volume at each multiple of V."""
+    qty = np.array([q for q, _, _ in trades])
+    buy = np.array([0.0 if m else q for q, m, _ in trades])
+    cum_vol = np.concatenate(([0.0], np.cumsum(qty)))
+    cum_buy = np.concatenate(([0.0], np.cumsum(buy)))
+    edges = np.arange(int(cum_vol[-1] // V + 1e-9) + 1) * V
+    bucket_buy = np.diff(np.interp(edges, cum_vol, cum_buy))
+    return np.abs(2 * bucket_buy - V) / V
+
+
+def test_replay_buckets_and_cvd():
+    trades = load_trades()
+    book = tf.TradeFlowBook(store=CandleStore(root=tempfile.mkdtemp()), vpin_buckets=10, bucket_volume=10.0)
+    fed = tf.replay_file(REPLAY_FILE, book, {'ETHUSDT': 'ETH/USDT'})
+    snap = book.snapshot('ETH/USDT')
+
+    assert fed == len(trades) + 1  # The reconnect duplicate is fed but ignored
+    assert snap['trades'] == len(trades)
+    assert np.isclose(snap['cvd'], sum(-q if m else q for q, m, _ in trades))
+
+    reference = brute_buckets(trades, 10.0)
+    assert snap['buckets'] == len(reference)
+    assert np.isclose(snap['vpin'], round(reference[-10:].mean(), 3), atol=1e-3)
+
+    # Intensity over the last 60 s of trade time
+    last_ts = trades[-1][2]
+    recent = [t for t in trades if t[2] > last_ts - 60_000]
+    assert np.isclose(snap['trades_per_sec'], len(recent) / 60.0)
+    print(snap)
+
+
+def test_ring_buffers_are_bounded():
+    flow = tf.TradeFlow(bucket_volume=1.0, vpin_buckets=5, max_buckets=8, max_trades=16)
+    for i in range(100):
+        flow.on_trade(100.0, 1.5, i % 3 == 0, 1_000 * i, trade_id=i)
+    assert len(flow.buckets) == 8 and len(flow.trades) == 16
+    assert flow.buckets.nbytes == 8 * 3 * 8
+    ts = flow.trades.last('ts')
+    assert list(ts) == [1_000 * i for i in range(84, 100)]
+    assert flow.snapshot()['ready']
+
+    # Without candle history the first bucket is sized by CALIBRATION_TRADES trades
+    calibrating = tf.TradeFlow()
+    for i in range(tf.CALIBRATION_TRADES):
+        calibrating.on_trade(100.0, 0.5, False, i)
+    assert calibrating.bucket_volume == 0.5 * tf.CALIBRATION_TRADES
+    assert len(calibrating.buckets) == 1 and calibrating.vpin() == 1.0
+
+
+def test_stream_feeds_trade_flow():
+    server = ms.ReplayServer(REPLAY_FILE).start()
+    book = tf.TradeFlowBook(store=CandleStore(root=tempfile.mkdtemp()), vpin_buckets=10, bucket_volume=10.0)
+    stream = ms.MarketStream(['ETH/USDT'], ['15m'], url=server.url, table=ms.LiveMarketTable(),
+                             store=CandleStore(root=tempfile.mkdtemp()), agg_trades=True, flow_book=book)
+    assert 'ethusdt@aggTrade' in stream.stream_url()
+    stream.start()
+    expected = len(load_trades())
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline and (book.snapshot('ETH/USDT') or {}).get('trades', 0) < expected:
+            time.sleep(0.05)
+    finally:
+        stream.stop()
+        server.stop()
+
+    offline = tf.TradeFlowBook(vpin_buckets=10, bucket_volume=10.0)
+    tf.replay_file(REPLAY_FILE, offline, {'ETHUSDT': 'ETH/USDT'})
+    assert book.snapshot('ETH/USDT') == offline.snapshot('ETH/USDT')
+
+
+def test_calibration_at_stream_start_outside_the_lock():
+    reads = []
+
+    class FakeStore:
+        def window(self, symbol, timeframe, candles):
+            reads.append((symbol, threading.current_thread().name, book._lock.locked()))
+            return pd.DataFrame({'volume': [50.0] * 96})
+
+    book = tf.TradeFlowBook(store=FakeStore(), vpin_buckets=10)
+    server = ms.ReplayServer(REPLAY_FILE).start()
+    stream = ms.MarketStream(['ETH/USDT', 'SOL/USDT'], ['15m'], url=server.url, table=ms.LiveMarketTable(),
+                             store=CandleStore(root=tempfile.mkdtemp()), agg_trades=True, flow_book=book)
+    stream.start()
+    stream.stop()
+    server.stop()
+
+    # Both pairs sized on the starting thread before any trade, never under the book lock
+    main_thread = threading.current_thread().name
+    assert reads[:2] == [('ETH/USDT', main_thread, False), ('SOL/USDT', main_thread, False)]
+    assert book.flow('SOL/USDT').bucket_volume == 50.0 * 96 / tf.BUCKETS_PER_DAY
+    book.on_agg_trade('BTC/USDT', {'p': '1', 'q': '1', 'm': False, 'T': 1, 'a': 1})  # Unconfigured symbol
+    assert reads[-1] == ('BTC/USDT', main_thread, False)
+
+
+if __name__ == "__main__":
+    test_replay_buckets_and_cvd()
+    test_ring_buffers_are_bounded()
+    test_stream_feeds_trade_flow()
+    test_calibration_at_stream_start_outside_the_lock()
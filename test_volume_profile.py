@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import market_profile as mp
+import candle_fixtures
+
+
+def make_frame(n, seed):
+    """Shared walk with some zero-range candles."""
+    df = candle_fixtures.make_frame(n, seed, base=3000, step=3, wick=3, min_volume=0)
+    df.loc[::17, 'low'] = df.loc[::17, 'high']
+    return df
+
+
+def brute_distribution(low, high, volume, bin_size, first, size):
+    """Per-candle, per-bin overlap of [low, high] with each bin."""
+    hist = np.zeros(size)
+    for l, h, v in zip(low, high, volume):
+        for k in range(size):
+            lo_edge, hi_edge = (first + k) * bin_size, (first + k + 1) * bin_size
+            if h == l:
+                hist[k] += v if lo_edge <= l < hi_edge else 0.0
+            else:
+                hist[k] += v * max(min(h, hi_edge) - max(l, lo_edge), 0.0) / (h - l)
+    return hist
+
+
+def test_range_distribution_matches_overlap():
+    df = make_frame(60, 2)
+    low, high, volume = (df[k].to_numpy() for k in ('low', 'high', 'volume'))
+    first, hist = mp.distribute_volume(low, high, volume, 1.5)
+    assert np.allclose(hist, brute_distribution(low, high, volume, 1.5, first, len(hist)))
+    assert np.isclose(hist.sum(), volume.sum())
+
+
+def test_value_area_expands_from_poc():
+    hist = np.array([1.0, 9.0, 2.0, 30.0, 5.0, 8.0, 1.0, 40.0])
+    poc, lo, hi = mp.value_area(hist)
+    assert poc == 7
+    # POC is the top bin: the area can only grow downward, one bin at a time
+    assert (lo, hi) == (3, 7) and hist[lo:hi + 1].sum() >= 0.7 * hist.sum()
+    assert hist[lo + 1:hi + 1].sum() < 0.7 * hist.sum()
+
+    profile = mp.calculate_volume_profile(make_frame(200, 2))
+    prices, volumes = np.array(profile['profile']['price']), np.array(profile['profile']['volume'])
+    inside = (prices >= profile['VAL']) & (prices <= profile['VAH'])
+    assert volumes[inside].sum() >= 0.7 * volumes.sum()
+    assert profile['VAL'] <= profile['POC'] <= profile['VAH']
+    print(profile['profile_str'])
+
+
+def test_rolling_matches_batch():
+    df = make_frame(1500, 5)
+    rolling = mp.RollingVolumeProfile(lookback=24, bin_size=1.0)
+    for end in range(100, len(df) + 1):
+        rolling.update(df.iloc[end - 100:end])
+        if end % 97 == 0 or end == len(df):
+            window = df.iloc[end - 24:end]
+            first, hist = mp.distribute_volume(window['low'], window['high'], window['volume'], 1.0)
+            expected = mp.summarize_profile(first, hist, 1.0)
+            summary = rolling.summary()
+            assert summary['POC'] == expected['POC'] and summary['VAH'] == expected['VAH']
+            assert np.allclose(summary['profile']['volume'], expected['profile']['volume'])
+
+    # Nothing new: no work. A gap reseeds from the new window.
+    assert len(rolling.update(df.iloc[-50:]).window) == 24
+    rolling.update(make_frame(30, 9).assign(timestamp=pd.date_range('2026-06-01', periods=30, freq='15min')))
+    assert len(rolling.window) == 24 and rolling.window[0][0] == pd.Timestamp('2026-06-01 01:30').value // 1_000_000
+
+
+if __name__ == "__main__":
+    test_range_distribution_matches_overlap()
+    test_value_area_expands_from_poc()
+    test_rolling_matches_batch()
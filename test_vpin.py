@@ -0,0 +1,77 @@
+import time
+import numpy as np
+import order_flow as flow
+from candle_frame import CandleFrame
+from candle_fixtures import make_frame
+
+
+def sparse_frame(n, seed):
+    """Shared walk with ~5% empty candles."""
+    df = make_frame(n, seed, flat_open=True, min_volume=0)
+    df.loc[np.random.default_rng(seed).random(n) < 0.05, 'volume'] = 0
+    return df
+
+
+def brute_buckets(df, V, from_end=False):
+    """Candle-by-candle bucket filling, splitting each candle's volume at bucket edges."""
+    high, low, close, volume = (df[k].to_numpy() for k in ('high', 'low', 'close', 'volume'))
+    price_range = high - low
+    price_range[price_range == 0] = 0.000001
+    buy_ratio = np.clip((close - low) / price_range, 0, 1)
+
+    order = range(len(volume) - 1, -1, -1) if from_end else range(len(volume))
+    imbalances, buy, filled = [], 0.0, 0.0
+    for i in order:
+        remaining = volume[i]
+        while remaining > 0:
+            take = min(remaining, V - filled)
+            buy += take * buy_ratio[i]
+            filled += take
+            remaining -= take
+            if filled >= V - 1e-9:
+                imbalances.append(abs(2 * buy - filled) / filled)
+                buy, filled = 0.0, 0.0
+    return np.array(imbalances[::-1] if from_end else imbalances)
+
+
+def test_series_matches_bucket_filling():
+    df = sparse_frame(3000, 3)
+    series = flow.vpin_series(CandleFrame.from_dataframe(df), n_buckets=5)
+    reference = brute_buckets(df, series['bucket_volume'])
+
+    assert np.allclose(series['imbalance'], reference[:len(series['imbalance'])])
+    assert np.isnan(series['vpin'][:4]).all()
+    assert np.isclose(series['vpin'][-1], reference[len(series['imbalance']) - 5:len(series['imbalance'])].mean())
+
+    # Each bucket completes on the candle where cumulative volume crosses its edge
+    cum_vol = np.cumsum(df['volume'].to_numpy())
+    edges = np.arange(1, len(series['imbalance']) + 1) * series['bucket_volume']
+    assert (cum_vol[series['end_idx']] >= edges - 1e-6).all()
+    assert len(series['candle_vpin']) == len(df)
+    assert series['candle_vpin'][-1] == series['vpin'][-1]
+
+
+def test_latest_value_and_bucket_config():
+    df = sparse_frame(500, 8)
+    V = df['volume'].mean()
+    expected = brute_buckets(df, V, from_end=True)[-10:].mean()
+    assert flow.calculate_vpin_pro(df) == round(expected, 3)
+
+    bigger = flow.calculate_vpin_pro(df, n_buckets=20, bucket_volume=V * 4)
+    assert bigger == round(brute_buckets(df, V * 4, from_end=True)[-20:].mean(), 3)
+    assert flow.calculate_vpin_pro(df.iloc[:0]) == 0.5
+
+
+def test_long_history_speed():
+    df = sparse_frame(200_000, 1)
+    start = time.perf_counter()
+    series = flow.vpin_series(df, n_buckets=50)
+    elapsed = time.perf_counter() - start
+    print(f"200k candles -> {len(series['imbalance'])} buckets in {elapsed * 1000:.1f} ms")
+    assert elapsed < 2.0
+
+
+if __name__ == "__main__":
+    test_series_matches_bucket_filling()
+    test_latest_value_and_bucket_config()
+    test_long_history_speed()
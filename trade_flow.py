@@ -0,0 +1,283 @@
+# trade_flow.py
+# Module: Trade Flow
+# Description: Trade-level order flow from Binance aggTrade streams. The aggressor side
+# comes from the buyer-maker flag (m=true -> the seller hit the bid). Volume is poured into
+# true equal-volume buckets (a trade straddling a boundary is split) kept in fixed-size
+# ring buffers, so memory per symbol is bounded. Publishes VPIN, cumulative volume delta
+# and trade intensity incrementally per symbol.
+#
+# Usage (offline, from a recorded combined-stream JSONL file):
+#   python trade_flow.py replay/binance_aggtrade_sample.jsonl --bucket-volume 50
+
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+import numpy as np
+
+from candle_store import candle_store, timeframe_to_ms
+
+logger = logging.getLogger("trade_flow")
+
+MAX_BUCKETS = 500          # Completed volume buckets kept per symbol
+MAX_TRADES = 5000          # Recent trades kept per symbol (intensity window)
+VPIN_BUCKETS = 50          # Buckets averaged per VPIN value
+BUCKETS_PER_DAY = 50       # Default bucket size: 1/50 of the average daily volume
+CALIBRATION_TRADES = 200   # Without candle history, the first bucket is sized by this many trades
+INTENSITY_SECONDS = 60.0   # Trade intensity window
+
+
+class RingBuffer:
+    """Fixed-capacity columnar ring buffer (NumPy). Oldest rows are overwritten."""
+
+    def __init__(self, capacity: int, columns: dict):
+        self.capacity = int(capacity)
+        self._cols = {name: np.zeros(self.capacity, dtype=dtype) for name, dtype in columns.items()}
+        self._head = 0   # Next write position
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, **values):
+        for name, value in values.items():
+            self._cols[name][self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def last(self, name: str, n: int = None) -> np.ndarray:
+        """Newest n values of a column, oldest first (a copy when the ring wraps)."""
+        n = self._count if n is None else min(int(n), self._count)
+        start = self._head - n
+        values = self._cols[name]
+        if start >= 0:
+            return values[start:self._head]
+        return np.concatenate((values[start:], values[:self._head]))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self._cols.values())
+
+
+def default_bucket_volume(symbol: str, store=None, timeframe: str = '15m', candles: int = 96 * 7):
+    """Average daily volume / BUCKETS_PER_DAY from the local candle store (None without history)."""
+    store = store or candle_store
+    window = store.window(symbol, timeframe, candles)
+    if window.empty:
+        return None
+    daily_volume = float(window['volume'].mean()) * 86_400_000 / timeframe_to_ms(timeframe)
+    return daily_volume / BUCKETS_PER_DAY if daily_volume > 0 else None
+
+
+class TradeFlow:
+    """
+    Order flow of one symbol. on_trade() is O(1) amortized (one loop step per bucket
+    boundary crossed); snapshot() reads the ring buffers only.
+    """
+
+    def __init__(self, bucket_volume: float = None, vpin_buckets: int = VPIN_BUCKETS,
+                 max_buckets: int = MAX_BUCKETS, max_trades: int = MAX_TRADES):
+        self.bucket_volume = bucket_volume
+        self.vpin_buckets = vpin_buckets
+        self.buckets = RingBuffer(max_buckets, {'buy': np.float64, 'sell': np.float64, 'end_ts': np.int64})
+        self.trades = RingBuffer(max_trades, {'ts': np.int64, 'qty': np.float64, 'signed': np.float64})
+        self.cvd = 0.0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.trade_count = 0
+        self.last_id = -1
+        self.last_price = None
+        self.last_ts = 0
+        self._cur_buy = 0.0
+        self._cur_sell = 0.0
+        self._cur_trades = 0
+        self._lock = threading.Lock()
+
+    def on_trade(self, price: float, qty: float, is_buyer_maker: bool, ts: int, trade_id: int = None):
+        """One aggregated trade. Duplicates (same or older aggregate id) are ignored."""
+        with self._lock:
+            if trade_id is not None:
+                if trade_id <= self.last_id:
+                    return
+                self.last_id = trade_id
+
+            # Buyer is maker -> the aggressor sold
+            signed = -qty if is_buyer_maker else qty
+            self.cvd += signed
+            if is_buyer_maker:
+                self.sell_volume += qty
+            else:
+                self.buy_volume += qty
+            self.trade_count += 1
+            self.last_price = price
+            self.last_ts = ts
+            self.trades.append(ts=ts, qty=qty, signed=signed)
+            self._fill(qty, is_buyer_maker, ts)
+
+    def _fill(self, qty: float, is_buyer_maker: bool, ts: int):
+        self._cur_trades += 1
+        if self.bucket_volume is None:
+            # Calibration: the first bucket is exactly the first CALIBRATION_TRADES trades
+            self._add_current(qty, is_buyer_maker)
+            if self._cur_trades >= CALIBRATION_TRADES:
+                self.bucket_volume = self._cur_buy + self._cur_sell
+                self._close_bucket(ts)
+            return
+
+        remaining = qty
+        while remaining > 0:
+            room = self.bucket_volume - (self._cur_buy + self._cur_sell)
+            take = min(remaining, room)
+            self._add_current(take, is_buyer_maker)
+            remaining -= take
+            if take >= room:
+                self._close_bucket(ts)
+
+    def _add_current(self, qty: float, is_buyer_maker: bool):
+        if is_buyer_maker:
+            self._cur_sell += qty
+        else:
+            self._cur_buy += qty
+
+    def _close_bucket(self, ts: int):
+        self.buckets.append(buy=self._cur_buy, sell=self._cur_sell, end_ts=ts)
+        self._cur_buy = self._cur_sell = 0.0
+        self._cur_trades = 0
+
+    # --- Metrics ---
+
+    def vpin(self, n_buckets: int = None):
+        """Mean |buy - sell| / V over the last n completed buckets (None before the first)."""
+        n = n_buckets or self.vpin_buckets
+        with self._lock:  # last() may return views of the live ring
+            buy, sell = self.buckets.last('buy', n), self.buckets.last('sell', n)
+            if not len(buy):
+                return None
+            return float(np.mean(np.abs(buy - sell) / (buy + sell)))
+
+    def intensity(self, seconds: float = INTENSITY_SECONDS) -> dict:
+        """Trades/s, volume/s and delta over the last `seconds` of trade time."""
+        with self._lock:
+            ts = self.trades.last('ts')
+            if not len(ts):
+                return {'trades_per_sec': 0.0, 'volume_per_sec': 0.0, 'delta': 0.0}
+            start = np.searchsorted(ts, self.last_ts - int(seconds * 1000), side='right')
+            qty, signed = self.trades.last('qty')[start:], self.trades.last('signed')[start:]
+            return {
+                'trades_per_sec': len(qty) / seconds,
+                'volume_per_sec': float(qty.sum()) / seconds,
+                'delta': float(signed.sum())
+            }
+
+    def snapshot(self) -> dict:
+        vpin = self.vpin()
+        with self._lock:
+            snap = {
+                'vpin': round(vpin, 3) if vpin is not None else None,
+                'ready': len(self.buckets) >= self.vpin_buckets,
+                'buckets': len(self.buckets),
+                'bucket_volume': self.bucket_volume,
+                'cvd': self.cvd,
+                'buy_volume': self.buy_volume,
+                'sell_volume': self.sell_volume,
+                'trades': self.trade_count,
+                'last_price': self.last_price,
+                'last_ts': self.last_ts,
+            }
+        snap.update(self.intensity())
+        return snap
+
+
+class TradeFlowBook:
+    """One TradeFlow per symbol. Bucket size: explicit, else the candle-store calibration."""
+
+    def __init__(self, store=None, vpin_buckets: int = VPIN_BUCKETS, bucket_volume: float = None):
+        self.store = store
+        self.bucket_volume = bucket_volume
+        self.vpin_buckets = vpin_buckets
+        self._flows = {}
+        self._lock = threading.Lock()
+
+    def flow(self, symbol: str, bucket_volume: float = None) -> TradeFlow:
+        with self._lock:
+            flow = self._flows.get(symbol)
+        if flow is not None:
+            return flow
+        # Calibration reads the candle store: outside the lock so other symbols' trades keep flowing
+        bucket_volume = bucket_volume or self.bucket_volume
+        if bucket_volume is None:
+            try:
+                bucket_volume = default_bucket_volume(symbol, self.store)
+            except Exception as e:
+                logger.warning(f"Bucket calibration failed for {symbol}: {e}")
+        with self._lock:
+            flow = self._flows.get(symbol)
+            if flow is None:  # First caller wins a race
+                flow = TradeFlow(bucket_volume, self.vpin_buckets)
+                self._flows[symbol] = flow
+                logger.info(f"🌊 Trade flow for {symbol}: bucket V = {bucket_volume or f'first {CALIBRATION_TRADES} trades'}")
+            return flow
+
+    def calibrate(self, symbols: list):
+        """Creates (and sizes) the flows up front, e.g. when the stream starts, not on the first trade."""
+        for symbol in symbols:
+            self.flow(symbol)
+
+    def on_agg_trade(self, symbol: str, data: dict):
+        """Binance aggTrade payload: p=price, q=qty, m=buyer is maker, T=trade time, a=aggregate id."""
+        self.flow(symbol).on_trade(float(data['p']), float(data['q']), bool(data['m']),
+                                   int(data['T']), int(data['a']) if 'a' in data else None)
+
+    def snapshot(self, symbol: str):
+        with self._lock:
+            flow = self._flows.get(symbol)
+        return flow.snapshot() if flow else None
+
+    def symbols(self) -> list:
+        with self._lock:
+            return list(self._flows)
+
+
+# Global Trade Flow Book (fed by MarketStream, read by the trading loop)
+trade_flow_book = TradeFlowBook()
+
+
+def replay_file(path: str, book: TradeFlowBook, symbol_map: dict = None) -> int:
+    """Feeds the aggTrade messages of a recorded combined-stream JSONL file. Returns trades fed."""
+    fed = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            data = data.get('data', data)
+            if data.get('e') != 'aggTrade':
+                continue
+            raw = str(data.get('s', '')).upper()
+            book.on_agg_trade(symbol_map.get(raw, raw) if symbol_map else raw, data)
+            fed += 1
+    return fed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trade-level VPIN / CVD from a recorded aggTrade stream")
+    parser.add_argument('input')
+    parser.add_argument('--bucket-volume', type=float, default=None)
+    parser.add_argument('--vpin-buckets', type=int, default=VPIN_BUCKETS)
+    args = parser.parse_args()
+
+    book = TradeFlowBook(vpin_buckets=args.vpin_buckets, bucket_volume=args.bucket_volume)
+
+    start = time.perf_counter()
+    fed = replay_file(args.input, book)
+    elapsed = time.perf_counter() - start
+    print(f"{fed} trades in {elapsed * 1000:.1f} ms")
+    for symbol in book.symbols():
+        print(f"{symbol}: {book.snapshot(symbol)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
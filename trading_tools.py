@@ -3,47 +3,31 @@
 # Description: Pure functions for market data, technical analysis, and file I/O.
 # Designed to be modular for future integration into Molt.bot.
 
-import ccxt
 import pandas as pd
 import numpy as np
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
 import feedparser
 import requests
 import json
 import logging
 import os
+import time
+import asyncio
 from datetime import datetime
+from candle_store import candle_store, timeframe_to_ms, plan_pages
+from candle_frame import col, row_at
+import smart_money
+import candle_patterns
+import hurst
+from resample import BASE_TIMEFRAME, base_candles_needed, resampled_window
+from exchange_session import session_manager
+from market_stream import live_table
 
 logger = logging.getLogger(__name__)
 
-# --- Exchange Verification ---
-def initialize_exchange():
-    """
-    Initializes CCXT Binance instance with API Keys if available.
-    Supports TESTNET sandbox mode.
-    """
-    api_key = os.getenv("BINANCE_API_KEY")
-    secret = os.getenv("BINANCE_SECRET")
-    mode = os.getenv("TRADING_MODE", "PAPER").upper()
-    
-    config = {
-        'options': {'defaultType': 'future'},
-        'enableRateLimit': True
-    }
-    
-    if api_key and secret:
-        config['apiKey'] = api_key
-        config['secret'] = secret
-        
-    exchange = ccxt.binance(config)
-    
-    if mode == "TESTNET" or mode == "LIVE_TESTNET":
-        exchange.set_sandbox_mode(True)
-        logger.info("⚠️ RUNNING IN BINANCE FUTURES TESTNET MODE ⚠️")
-    
-    return exchange
-
-# Global Exchange Instance
-exchange_client = initialize_exchange()
+# --- Exchange Sessions ---
+# Every exchange call goes through the shared SessionManager (pooled HTTP session,
+# cached market metadata, one request-weight budget). See exchange_session.py.
 
 # --- Execution Functions ---
 def execute_real_order(symbol: str, side: str, quantity: float, stop_loss: float = None, take_profit: float = None):
@@ -53,8 +37,10 @@ def execute_real_order(symbol: str, side: str, quantity: float, stop_loss: float
     For MVP: Market Order + independent Stop Market.
     """
     try:
+        session = session_manager.trading()
+        
         # 1. Market Order (Entry)
-        order = exchange_client.create_order(symbol, 'market', side.lower(), quantity)
+        order = session.call('create_order', symbol, 'market', side.lower(), quantity)
         logger.info(f"✅ REAL EXECUTION: {side} {quantity} {symbol} - ID: {order['id']}")
         
         # 2. Stop Loss (Trigger)
@@ -62,7 +48,7 @@ def execute_real_order(symbol: str, side: str, quantity: float, stop_loss: float
             # Determine SL side implies Opposite of Entry
             sl_side = 'sell' if side.lower() == 'buy' else 'buy'
             params = {'stopPrice': stop_loss}
-            exchange_client.create_order(symbol, 'STOP_MARKET', sl_side, quantity, params=params)
+            session.call('create_order', symbol, 'STOP_MARKET', sl_side, quantity, params=params)
             logger.info(f"🛡️ REAL SL SET: {stop_loss}")
             
         return order
@@ -146,43 +132,212 @@ def calculate_position_size(account_balance: float, risk_per_trade_pct: float, e
     
     return round(final_size, 6)
 
+# --- Per-Cycle Price Snapshot ---
+# One bulk fetch_tickers per cycle for the whole universe instead of one fetch_ticker per call.
+PRICE_SNAPSHOT_MAX_AGE = 10.0 # Seconds before a snapshot price is considered stale
+
+# symbol -> {'price', 'timestamp' (exchange ms), 'taken_at' (local epoch s)}. Each symbol
+# ages on its own: a refresh that skipped a symbol (live quote) never renews its entry.
+_price_snapshot = {}
+
+def _snapshot_missing(symbols: list) -> list:
+    """Symbols without a fresh WebSocket quote (the only ones worth a request)."""
+    return [s for s in dict.fromkeys(symbols) if not live_table.last_price(s)]
+
+def _store_snapshot(tickers: dict, missing: list) -> dict:
+    taken_at = time.time()
+    fetched = {}
+    for key, ticker in tickers.items():
+        # Futures tickers come back as 'ETH/USDT:USDT'
+        symbol = key if key in missing else key.split(':')[0]
+        if symbol not in missing or not ticker.get('last'):
+            continue
+        fetched[symbol] = float(ticker['last'])
+        _price_snapshot[symbol] = {
+            'price': fetched[symbol],
+            'timestamp': ticker.get('timestamp') or int(taken_at * 1000),
+            'taken_at': taken_at
+        }
+    
+    logger.info(f"Price snapshot: {len(fetched)}/{len(missing)} tickers in 1 request")
+    return fetched
+
+def refresh_price_snapshot(symbols: list) -> dict:
+    """
+    Refreshes the price snapshot with ONE bulk fetch_tickers call.
+    Symbols already covered by a fresh WebSocket quote are skipped (no request if all are live).
+    Returns: {symbol: price} for the symbols fetched.
+    """
+    missing = _snapshot_missing(symbols)
+    if not missing:
+        return {}
+    
+    try:
+        tickers = session_manager.trading().call('fetch_tickers', missing)
+        return _store_snapshot(tickers, missing)
+    except Exception as e:
+        logger.error(f"Error refreshing price snapshot: {e}")
+        return {}
+
+async def refresh_price_snapshot_async(symbols: list) -> dict:
+    """Async twin of refresh_price_snapshot."""
+    missing = _snapshot_missing(symbols)
+    if not missing:
+        return {}
+    
+    try:
+        tickers = await session_manager.trading_async().call('fetch_tickers', missing)
+        return _store_snapshot(tickers, missing)
+    except Exception as e:
+        logger.error(f"Error refreshing price snapshot: {e}")
+        return {}
+
+def get_snapshot_price(symbol: str, max_age: float = PRICE_SNAPSHOT_MAX_AGE):
+    """
+    Price from the last bulk snapshot of THIS symbol, or None if missing/stale.
+    Age counts from the older of the local fetch time and the exchange ticker timestamp,
+    so a ticker the exchange itself had not updated is not served as fresh.
+    """
+    entry = _price_snapshot.get(symbol)
+    if not entry or not entry['price']:
+        return None
+    as_of = min(entry['taken_at'], entry['timestamp'] / 1000)
+    if time.time() - as_of > max_age:
+        return None
+    return entry['price']
+
 def get_current_price(symbol: str) -> float:
     """
     Fetches the REAL-TIME current price (ticker) for execution accuracy.
     Avoids using 'Last Candle Close' which can be stale.
+    Order: Live WebSocket quote -> Per-cycle bulk snapshot -> single REST ticker.
     """
     try:
-        # Use GLOBAL exchange client (Reuse connection)
-        ticker = exchange_client.fetch_ticker(symbol)
+        # 1. Live WebSocket quote (no request at all)
+        live_price = live_table.last_price(symbol)
+        if live_price:
+            return float(live_price)
+        
+        # 2. Bulk snapshot taken at the start of the cycle
+        snapshot_price = get_snapshot_price(symbol)
+        if snapshot_price:
+            return float(snapshot_price)
+        
+        # 3. REST fallback: shared trading session (Reuse connection)
+        ticker = session_manager.trading().call('fetch_ticker', symbol)
         return float(ticker['last'])
     except Exception as e:
         logger.error(f"Error fetching ticker for {symbol}: {e}")
         return 0.0
 
+# (symbol, timeframe) -> deepest window already requested from REST. A store shorter than
+# that (new listing) but contiguous to now is up to date: only the tail is topped up.
+_history_depth = {}
+
+def _plan_ohlcv_fetch(symbol: str, timeframe: str, limit: int, now_ms: int) -> tuple:
+    """
+    Decides how to top up the candle store before serving a window.
+    Returns: (stream_rows, pages) - stream_rows when the WebSocket already covers it,
+    otherwise the fetch_ohlcv pages ([{'since', 'limit'}, ...], see candle_store.plan_pages):
+    forward from the last stored candle (never skipping a hole), plus the older part of
+    the window once if the store is shallower than `limit`.
+    """
+    last_ts = candle_store.last_timestamp(symbol, timeframe)
+    first_ts = candle_store.first_timestamp(symbol, timeframe)
+    stored = candle_store.count(symbol, timeframe)
+    tf_ms = timeframe_to_ms(timeframe)
+    deep_enough = stored >= limit or _history_depth.get((symbol, timeframe), 0) >= limit
+    
+    # Stream is live and the store already holds every closed candle: no request needed
+    forming = live_table.forming_candle(symbol, timeframe)
+    if forming and last_ts is not None and deep_enough and 0 <= forming['t'] - last_ts <= tf_ms:
+        return [[forming['t'], forming['open'], forming['high'],
+                 forming['low'], forming['close'], forming['volume']]], None
+    
+    now_open = now_ms - now_ms % tf_ms
+    window_start = now_open - (limit - 1) * tf_ms
+    if last_ts is None:
+        # Cold start: the whole window
+        ranges = [(window_start, now_open)]
+    else:
+        # Re-fetch from the last stored candle (it was still forming) onwards, however long we were away
+        ranges = [(last_ts, max(now_open, last_ts))]
+        if not deep_enough and window_start < first_ts:
+            ranges.insert(0, (window_start, first_ts - tf_ms))
+    return None, plan_pages(ranges, timeframe)
+
+def _merge_and_window(symbol: str, timeframe: str, limit: int, ohlcv: list, source: str) -> pd.DataFrame:
+    new_candles = candle_store.merge(symbol, timeframe, ohlcv)
+    if source == "rest": # Every page succeeded: this depth never needs the older part again
+        key = (symbol, timeframe)
+        _history_depth[key] = max(_history_depth.get(key, 0), limit)
+    df = candle_store.window(symbol, timeframe, limit)
+    if source == "rest":
+        logger.info(f"Fetched {len(ohlcv)} candles for {symbol} ({timeframe}) | +{new_candles} new | Window: {len(df)}")
+    return df
+
 def fetch_market_data(symbol: str, timeframe: str = '1h', limit: int = 500) -> pd.DataFrame:
     """
     Fetches OHLCV data from Binance using CCXT.
+    INCREMENTAL: Only candles since the last stored timestamp are downloaded;
+    the requested window is served from the local candle store.
     Returns a DataFrame with columns: ['timestamp', 'open', 'high', 'low', 'close', 'volume'].
     """
     try:
-        exchange = ccxt.binance({'options': {'defaultType': 'future'}})
-        # Fetch OHLCV data
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        session = session_manager.market_data()
+        stream_rows, pages = _plan_ohlcv_fetch(symbol, timeframe, limit, session.client.milliseconds())
         
-        # Convert to DataFrame
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        if stream_rows is not None:
+            return _merge_and_window(symbol, timeframe, limit, stream_rows, "stream")
         
-        logger.info(f"Fetched {len(df)} candles for {symbol} ({timeframe})")
-        return df
+        ohlcv = []
+        for page in pages:
+            ohlcv.extend(session.call('fetch_ohlcv', symbol, timeframe, **page))
+        return _merge_and_window(symbol, timeframe, limit, ohlcv, "rest")
+    except Exception as e:
+        logger.error(f"Error fetching market data for {symbol}: {e}")
+        raise
+
+async def fetch_market_data_async(symbol: str, timeframe: str = '1h', limit: int = 500) -> pd.DataFrame:
+    """Async twin of fetch_market_data (ccxt.async_support). Same store, same window."""
+    try:
+        session = session_manager.market_data_async()
+        stream_rows, pages = _plan_ohlcv_fetch(symbol, timeframe, limit, session.client.milliseconds())
+        
+        if stream_rows is not None:
+            return _merge_and_window(symbol, timeframe, limit, stream_rows, "stream")
+        
+        results = await asyncio.gather(*[session.call('fetch_ohlcv', symbol, timeframe, **page) for page in pages])
+        ohlcv = [row for rows in results for row in rows]
+        return _merge_and_window(symbol, timeframe, limit, ohlcv, "rest")
     except Exception as e:
         logger.error(f"Error fetching market data for {symbol}: {e}")
         raise
 
+def _base_limit(windows: dict, base_timeframe: str) -> int:
+    return max(base_candles_needed(tf, limit, base_timeframe) if tf != base_timeframe else limit
+               for tf, limit in windows.items())
+
+def fetch_timeframes(symbol: str, windows: dict, base_timeframe: str = BASE_TIMEFRAME) -> dict:
+    """
+    Fetches several timeframes for one symbol from ONE consistent source:
+    only the base timeframe is downloaded (incrementally), every other timeframe
+    is resampled from the local store.
+    windows: {'15m': 100, '4h': 252} -> returns {'15m': df, '4h': df}.
+    """
+    fetch_market_data(symbol, base_timeframe, limit=_base_limit(windows, base_timeframe))
+    return {tf: resampled_window(symbol, tf, limit, base_timeframe) for tf, limit in windows.items()}
+
+async def fetch_timeframes_async(symbol: str, windows: dict, base_timeframe: str = BASE_TIMEFRAME) -> dict:
+    """Async twin of fetch_timeframes."""
+    await fetch_market_data_async(symbol, base_timeframe, limit=_base_limit(windows, base_timeframe))
+    return {tf: resampled_window(symbol, tf, limit, base_timeframe) for tf, limit in windows.items()}
+
 def calculate_indicators(df: pd.DataFrame) -> pd.DataFrame:
     """
     Calculates technical indicators using pure pandas (Manual Implementation for Py3.14 Compatibility).
     Includes: RSI(14), EMA(200), MACD, Bollinger Bands(20,2), ADX(14).
+    Batch reference; the trading loop uses the incremental indicator_engine (same values).
     """
     try:
         close = df['close']
@@ -258,147 +413,62 @@ def calculate_indicators(df: pd.DataFrame) -> pd.DataFrame:
         logger.error(f"Error calculating indicators: {e}")
         raise
 
-def calculate_smart_money(df: pd.DataFrame) -> dict:
+def calculate_smart_money(df) -> dict:
     """
     detects Smart Money Concepts (FVG, Swing Points) for AI Context.
     Returns a dict with formatted strings of key levels.
+    Accepts a DataFrame or a CandleFrame. Structured records: smart_money.analyze().
     """
     try:
         if df.empty or len(df) < 5:
             return {"fvg_str": "No FVG Detected", "liquidity_str": "No Liquidity Levels"}
-            
-        # 1. Fair Value Gaps (FVG)
-        # Bullish FVG: Candle 1 High < Candle 3 Low
-        # Bearish FVG: Candle 1 Low > Candle 3 High
-        fvg_list = []
-        
-        # Check last 10 candles only for FRESH gaps (improving performance)
-        subset = df.iloc[-15:]
-        for i in range(len(subset) - 2):
-            idx = subset.index[i]
-            # Candle 1 (i), Candle 2 (i+1), Candle 3 (i+2)
-            c1_high = subset['high'].iloc[i]
-            c1_low = subset['low'].iloc[i]
-            c3_high = subset['high'].iloc[i+2]
-            c3_low = subset['low'].iloc[i+2]
-            
-            # Bullish FVG
-            if c1_high < c3_low:
-                fvg_list.append(f"🟢 Bullish FVG at {c1_high:.4f}-{c3_low:.4f} (Index -{len(subset)-i-2})")
-            
-            # Bearish FVG
-            if c1_low > c3_high:
-                fvg_list.append(f"🔴 Bearish FVG at {c3_high:.4f}-{c1_low:.4f} (Index -{len(subset)-i-2})")
-        
-        fvg_str = "\n".join(fvg_list[-3:]) if fvg_list else "None recently."
-        
-        # 2. Liquidity (Swing Highs/Lows) 
-        # Pivot High: Higher than 2 left and 2 right
-        # Pivot Low: Lower than 2 left and 2 right
-        swings = []
-        
-        # Need a bit more historical context for swings
-        # Analyze last 50 candles
-        swing_subset = df.iloc[-50:]
-        
-        # Simple local extrema
-        for i in range(2, len(swing_subset) - 2):
-            curr_low = swing_subset['low'].iloc[i]
-            curr_high = swing_subset['high'].iloc[i]
-            
-            # Swing Low
-            if (swing_subset['low'].iloc[i-1] > curr_low) and \
-               (swing_subset['low'].iloc[i-2] > curr_low) and \
-               (swing_subset['low'].iloc[i+1] > curr_low) and \
-               (swing_subset['low'].iloc[i+2] > curr_low):
-                 swings.append(f"💧 Sell-Side Liquidity (Low): {curr_low:.4f}")
-                 
-            # Swing High
-            if (swing_subset['high'].iloc[i-1] < curr_high) and \
-               (swing_subset['high'].iloc[i-2] < curr_high) and \
-               (swing_subset['high'].iloc[i+1] < curr_high) and \
-               (swing_subset['high'].iloc[i+2] < curr_high):
-                 swings.append(f"🔥 Buy-Side Liquidity (High): {curr_high:.4f}")
-        
-        liquidity_str = "\n".join(swings[-3:]) if swings else "None defined nearby."
-        
-        # 3. Candle Pattern Vision (NEW)
-        patterns_str = detect_candle_patterns(df)
         
+        smc = smart_money.analyze(df)
         return {
-            "fvg_str": fvg_str,
-            "liquidity_str": liquidity_str,
-            "patterns_str": patterns_str # Expose to AI
+            "fvg_str": smart_money.render_fvgs(smc),
+            "liquidity_str": smart_money.render_liquidity(smc),
+            "patterns_str": detect_candle_patterns(df) # Expose to AI
         }
 
     except Exception as e:
         logger.error(f"SMC/Pattern Error: {e}")
         return {"fvg_str": "Error", "liquidity_str": "Error", "patterns_str": "None"}
 
-def detect_candle_patterns(df: pd.DataFrame) -> str:
+def detect_candle_patterns(df) -> str:
     """
-    Scans the last 3 candles for classic Price Action patterns.
+    Classic Price Action patterns completed by the last candle (engulfing, pinbars,
+    doji, morning/evening star, inside bar). Same vectorized kernel as the
+    historical pattern backtest (candle_patterns.scan).
     Returns a descriptive string for the AI.
     """
     try:
-        if df.empty: return "No Data"
-        
-        last = df.iloc[-1]
-        prev = df.iloc[-2]
-        
-        patterns = []
-        
-        # Candle Properties
-        body_last = abs(last['close'] - last['open'])
-        range_last = last['high'] - last['low']
-        
-        # 1. ENGULFING (Strong Reversal)
-        # Bullish Engulfing: Prev RED, Last GREEN, Last Body engulfs Prev Body
-        if prev['close'] < prev['open']: # Red
-            if last['close'] > last['open']: # Green
-                if last['close'] > prev['open'] and last['open'] < prev['close']:
-                     patterns.append("🔥 BULLISH ENGULFING (Strong Reversal)")
-                     
-        # Bearish Engulfing: Prev GREEN, Last RED, Last Body engulfs Prev Body
-        if prev['close'] > prev['open']: # Green
-            if last['close'] < last['open']: # Red
-                if last['close'] < prev['open'] and last['open'] > prev['close']:
-                     patterns.append("🩸 BEARISH ENGULFING (Strong Reversal)")
-                     
-        # 2. PINBARS (Rejection)
-        # Hammer (Bullish): Small body, Long lower wick (>2x body), Little upper wick
-        lower_wick = min(last['open'], last['close']) - last['low']
-        upper_wick = last['high'] - max(last['open'], last['close'])
-        
-        if lower_wick > (body_last * 2) and upper_wick < (body_last * 0.5):
-            patterns.append("🔨 HAMMER / PINBAR (Bullish Rejection)")
-            
-        # Shooting Star (Bearish): Small body, Long upper wick (>2x body), Little lower wick
-        if upper_wick > (body_last * 2) and lower_wick < (body_last * 0.5):
-            patterns.append("☄️ SHOOTING STAR (Bearish Rejection)")
-            
-        # 3. DOJI (Indecision)
-        if range_last > 0 and body_last <= (range_last * 0.1): # Body is < 10% of total range
-            patterns.append("✨ DOJI (Indecision)")
-            
-        return "\n".join(patterns) if patterns else "No clear patterns."
-        
+        return candle_patterns.describe(df)
     except Exception as e:
         return f"Pattern Error: {e}"
 
-def get_market_regime(df: pd.DataFrame) -> dict:
+def _pct_rank_last(values: np.ndarray) -> float:
+    """Percentile rank of the last value (same as Series.rank(pct=True).iloc[-1])."""
+    current = values[-1]
+    if np.isnan(current):
+        return np.nan
+    valid = values[~np.isnan(values)]
+    below = np.count_nonzero(valid < current)
+    equal = np.count_nonzero(valid == current)
+    return (below + (equal + 1) / 2) / len(valid)
+
+def get_market_regime(df) -> dict:
     """
     Diagnoses the current market environment (Trend vs. Chop).
     Used to filter simple parameter tweaks vs. logic changes.
     """
     try:
-        last = df.iloc[-1]
+        last = row_at(df, -1)
         adx = last.get('ADX_14', 0)
         
         # Volatility Percentile (Are we in high or low vol relative to last 100 candles?)
-        atr_series = df['ATR_14']
-        current_atr = atr_series.iloc[-1]
-        atr_rank = atr_series.rank(pct=True).iloc[-1] * 100 # 0-100 score
+        atr_series = col(df, 'ATR_14')
+        current_atr = atr_series[-1]
+        atr_rank = _pct_rank_last(atr_series) * 100 # 0-100 score
         
         regime = "UNDEFINED"
         if adx > 25:
@@ -416,7 +486,7 @@ def get_market_regime(df: pd.DataFrame) -> dict:
         logger.error(f"Regime Error: {e}")
         return {"type": "ERROR", "adx": 0, "volatility_rank": 50}
 
-def calculate_vpin_lite(df: pd.DataFrame) -> float:
+def calculate_vpin_lite(df) -> float:
     """
     VPIN Proxy (Volume-Synchronized Probability of Informed Trading) - LITE VERSION.
     Uses Volume / PriceRange ratio to detect 'churn' or 'toxic flow'.
@@ -424,18 +494,18 @@ def calculate_vpin_lite(df: pd.DataFrame) -> float:
     """
     try:
         # Look at last 10 candles
-        subset = df.iloc[-10:].copy()
+        subset = df.tail(10)
         
         # Calculate Range (High - Low)
-        subset['range'] = subset['high'] - subset['low']
-        subset['range'] = subset['range'].replace(0, 0.000001) # Avoid div by zero
+        candle_range = col(subset, 'high') - col(subset, 'low')
+        candle_range[candle_range == 0] = 0.000001 # Avoid div by zero
         
         # Metric: Volume per unit of movement
-        subset['vol_per_move'] = subset['volume'] / subset['range']
+        vol_per_move = col(subset, 'volume') / candle_range
         
         # Normalize relative to recent history (z-score-ish)
-        avg_vpm = subset['vol_per_move'].mean()
-        curr_vpm = subset['vol_per_move'].iloc[-1]
+        avg_vpm = np.nanmean(vol_per_move)
+        curr_vpm = vol_per_move[-1]
         
         # Ratio: Current / Average
         # If Current > 2.0 * Average -> Massive volume for candle size -> Toxic/Fighting
@@ -518,7 +588,7 @@ def get_latest_market_snippet(df: pd.DataFrame, label: str = "") -> str:
         logger.error(f"Snippet Error for {label}: {e}")
         return f"{label} Snippet Error"
 
-def calculate_hurst(df: pd.DataFrame, max_lag=20) -> float:
+def calculate_hurst(df, max_lag=20) -> float:
     """
     Calculates the Hurst Exponent (H) to diagnose Market State.
     H > 0.5: Persistent (Trend) - Use Trend Following.
@@ -526,16 +596,11 @@ def calculate_hurst(df: pd.DataFrame, max_lag=20) -> float:
     H = 0.5: Random Walk (Noise) - DO NOT TRADE.
     """
     try:
-        # Use log-prices
-        lags = range(2, max_lag)
-        # Calculate standard deviation of differences
-        tau = [np.sqrt(np.std(np.subtract(df['close'].values[lag:], df['close'].values[:-lag]))) for lag in lags]
-        
-        # Polyfit log(lags) vs log(tau)
-        m = np.polyfit(np.log(lags), np.log(tau), 1)
-        hurst = m[0] * 2.0
-        
-        return round(hurst, 3)
+        # Std of q-period LOG returns ~ q^H, all lags in one pass (see hurst.py)
+        h = float(hurst.variance_scaling(hurst.log_prices(df), range(2, max_lag)))
+        if not np.isfinite(h):
+            raise ValueError("not enough finite prices")
+        return round(h, 3)
     except Exception as e:
         logger.error(f"Hurst Calc Error: {e}")
         return 0.5 # Default to Neutral (Random)
@@ -665,7 +730,8 @@ def read_state(path: str = 'state.json') -> dict:
         },
         "account_balance": 10000.0,
         "last_run": "",
-        "latest_analysis": {}
+        "latest_analysis": {},
+        "market_structure": {}
     }
 
     try:
@@ -699,7 +765,47 @@ def write_state(state: dict, path: str = 'state.json') -> bool:
 # MARKET STRUCTURE FUNCTIONS (BOS, CHoCH, S/R)
 # =============================================================================
 
-def detect_swing_points(df: pd.DataFrame, lookback: int = 5) -> tuple:
+def find_swing_points(df, lookback: int = 5) -> dict:
+    """
+    Vectorized fractal detector (O(n): centered rolling max/min via scipy.ndimage).
+    Same rule as detect_swing_points, as compact arrays for long histories:
+    {'high_idx', 'high_price', 'high_ts', 'low_idx', 'low_price', 'low_ts'}.
+    Timestamps are the raw column values (None if there is no 'timestamp' column).
+    """
+    high = col(df, 'high')
+    low = col(df, 'low')
+    size = lookback * 2 + 1
+    interior = np.zeros(len(high), dtype=bool)
+    interior[lookback:len(high) - lookback] = True
+
+    # NaN never wins a window (pandas max/min skip it) and is never a swing itself
+    high_max = maximum_filter1d(np.where(np.isnan(high), -np.inf, high), size, mode='nearest')
+    low_min = minimum_filter1d(np.where(np.isnan(low), np.inf, low), size, mode='nearest')
+    high_idx = np.flatnonzero(interior & (high == high_max))
+    low_idx = np.flatnonzero(interior & (low == low_min))
+
+    ts = np.asarray(df['timestamp']) if 'timestamp' in df else None
+    return {
+        'high_idx': high_idx,
+        'high_price': high[high_idx],
+        'high_ts': ts[high_idx] if ts is not None else None,
+        'low_idx': low_idx,
+        'low_price': low[low_idx],
+        'low_ts': ts[low_idx] if ts is not None else None
+    }
+
+
+def _swing_dicts(idx: np.ndarray, prices: np.ndarray, ts) -> list:
+    if ts is None:
+        labels = [str(i) for i in idx.tolist()]
+    else:
+        # int64 ms (CandleFrame) or datetime64 (DataFrame) -> same str() as a pandas Timestamp
+        labels = [str(t) for t in pd.to_datetime(ts, unit='ms' if ts.dtype.kind in 'iu' else None)]
+    return [{'index': i, 'price': p, 'timestamp': t}
+            for i, p, t in zip(idx.tolist(), prices.tolist(), labels)]
+
+
+def detect_swing_points(df, lookback: int = 5) -> tuple:
     """
     Detects Swing Highs and Swing Lows using fractal method.
     A Swing High requires 'lookback' candles with lower highs on each side.
@@ -707,34 +813,13 @@ def detect_swing_points(df: pd.DataFrame, lookback: int = 5) -> tuple:
     
     Returns: (swing_highs, swing_lows) - Lists of dicts with index, price, timestamp
     """
-    swing_highs = []
-    swing_lows = []
-    
     if len(df) < (lookback * 2 + 1):
         logger.warning(f"Not enough data for swing detection. Need {lookback * 2 + 1}, got {len(df)}")
-        return swing_highs, swing_lows
-    
-    for i in range(lookback, len(df) - lookback):
-        # Get the window of candles around position i
-        window = df.iloc[i - lookback : i + lookback + 1]
-        current_high = df.iloc[i]['high']
-        current_low = df.iloc[i]['low']
-        
-        # Swing High: current high is the highest in the window
-        if current_high == window['high'].max():
-            swing_highs.append({
-                'index': i,
-                'price': float(current_high),
-                'timestamp': str(df.iloc[i]['timestamp']) if 'timestamp' in df.columns else str(i)
-            })
-        
-        # Swing Low: current low is the lowest in the window
-        if current_low == window['low'].min():
-            swing_lows.append({
-                'index': i,
-                'price': float(current_low),
-                'timestamp': str(df.iloc[i]['timestamp']) if 'timestamp' in df.columns else str(i)
-            })
+        return [], []
+    
+    swings = find_swing_points(df, lookback)
+    swing_highs = _swing_dicts(swings['high_idx'], swings['high_price'], swings['high_ts'])
+    swing_lows = _swing_dicts(swings['low_idx'], swings['low_price'], swings['low_ts'])
     
     logger.info(f"📊 Swing Detection: {len(swing_highs)} highs, {len(swing_lows)} lows found")
     return swing_highs, swing_lows
@@ -823,7 +908,7 @@ def detect_market_structure(swing_highs: list, swing_lows: list, current_price:
     return result
 
 
-def calculate_sr_levels(df: pd.DataFrame, num_levels: int = 5, lookback: int = 3) -> dict:
+def calculate_sr_levels(df, num_levels: int = 5, lookback: int = 3) -> dict:
     """
     Calculates Support and Resistance levels based on recent swing points.
     
@@ -834,18 +919,18 @@ def calculate_sr_levels(df: pd.DataFrame, num_levels: int = 5, lookback: int = 3
         'nearest_support': float or None
     }
     """
-    swing_highs, swing_lows = detect_swing_points(df, lookback=lookback)
+    swings = find_swing_points(df, lookback=lookback)
     
     # Get last N swing levels
-    resistances = [s['price'] for s in swing_highs[-num_levels:]] if swing_highs else []
-    supports = [s['price'] for s in swing_lows[-num_levels:]] if swing_lows else []
+    resistances = swings['high_price'][-num_levels:].tolist()
+    supports = swings['low_price'][-num_levels:].tolist()
     
     # Sort: resistances descending (highest first), supports ascending (lowest first)
     resistances = sorted(resistances, reverse=True)
     supports = sorted(supports)
     
     # Get nearest to current price
-    current_price = float(df.iloc[-1]['close']) if not df.empty else 0
+    current_price = float(col(df, 'close')[-1]) if not df.empty else 0
     
     # Nearest resistance: smallest value above current price
     nearest_res = None
@@ -875,7 +960,7 @@ def calculate_sr_levels(df: pd.DataFrame, num_levels: int = 5, lookback: int = 3
 
 def check_proximity_to_level(price: float, levels: list, threshold_pct: float = 0.15) -> tuple:
     """
-    Checks if price is near any S/R level.
+    Checks if price is near any S/R level (the nearest one, not the first in the list).
     
     Args:
         price: Current price
@@ -887,35 +972,48 @@ def check_proximity_to_level(price: float, levels: list, threshold_pct: float =
     if not levels or price <= 0:
         return False, None, None
     
-    for level in levels:
-        if level <= 0:
-            continue
-        distance_pct = abs(price - level) / price * 100
-        if distance_pct <= threshold_pct:
-            logger.info(f"📍 Price {price:.2f} is {distance_pct:.3f}% from level {level:.2f}")
-            return True, level, distance_pct
+    valid = [level for level in levels if level > 0]
+    if not valid:
+        return False, None, None
+    level = min(valid, key=lambda l: abs(price - l))
+    distance_pct = abs(price - level) / price * 100
+    if distance_pct <= threshold_pct:
+        logger.info(f"📍 Price {price:.2f} is {distance_pct:.3f}% from level {level:.2f}")
+        return True, level, distance_pct
     
     return False, None, None
 
 
+def _fmt_level(value) -> str:
+    return f"${value:.2f}" if value else "N/A"
+
+
 def get_structure_context_string(structure: dict, sr_levels: dict) -> str:
     """
     Formats market structure and S/R data for AI context.
     """
     bias_emoji = "🔼" if structure['bias'] == 'BULLISH' else "🔽" if structure['bias'] == 'BEARISH' else "➡️"
+    last_event = structure.get('last_event')
+    last_break = (f"{last_event['type']} {last_event['direction']} @ {_fmt_level(last_event['level'])} ({last_event['time']})"
+                  if last_event else "None")
+    zones = sr_levels.get('zones', [])
+    zones_str = ", ".join(f"${z['level']:.2f} x{z['touches']} ({'/'.join(z['timeframes'])})"
+                          for z in sorted(zones, key=lambda z: -z['strength'])[:4]) or "N/A"
     
     context = f"""
 === MARKET STRUCTURE (4H) ===
 Bias: {bias_emoji} {structure['bias']}
-Last Swing High: ${structure.get('last_swing_high', 0):.2f}
-Last Swing Low: ${structure.get('last_swing_low', 0):.2f}
+Last Swing High: {_fmt_level(structure.get('last_swing_high'))}
+Last Swing Low: {_fmt_level(structure.get('last_swing_low'))}
 BOS Detected: {structure.get('bos_detected', False)}
 CHoCH Detected: {structure.get('choch_detected', False)}
+Last Break: {last_break}
 
-=== S/R LEVELS (15m) ===
+=== S/R LEVELS (15m/1h/4h) ===
 Resistances: {[f'${r:.2f}' for r in sr_levels.get('resistances', [])[:3]]}
 Supports: {[f'${s:.2f}' for s in sr_levels.get('supports', [])[:3]]}
-Nearest Resistance: ${sr_levels.get('nearest_resistance', 0):.2f if sr_levels.get('nearest_resistance') else 'N/A'}
-Nearest Support: ${sr_levels.get('nearest_support', 0):.2f if sr_levels.get('nearest_support') else 'N/A'}
+Nearest Resistance: {_fmt_level(sr_levels.get('nearest_resistance'))}
+Nearest Support: {_fmt_level(sr_levels.get('nearest_support'))}
+Strongest Zones: {zones_str}
 """
     return context